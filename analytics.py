@@ -1,8 +1,5 @@
 import sqlite3
 import pandas as pd
-import matplotlib
-matplotlib.use('QtAgg')  # Для PySide6 или PyQt5/6 GUI
-import matplotlib.pyplot as plt
 import datetime
 import logging
 from typing import List, Dict, Any, Optional
@@ -10,20 +7,46 @@ from typing import List, Dict, Any, Optional
 DB_FILE = "office.db"
 logging.basicConfig(level=logging.ERROR)
 
-def get_cartridge_usage_by_month() -> pd.DataFrame:
-    """Возвращает DataFrame с расходом картриджей по месяцам."""
+def _pyplot():
+    """matplotlib загружается только для графиков: его импорт — заметная часть запуска."""
+    import matplotlib
+    matplotlib.use('QtAgg')  # Для PySide6 или PyQt5/6 GUI
+    import matplotlib.pyplot as plt
+    return plt
+
+def _monthly_usage(column: str, model_type: Optional[str] = None,
+                   model_name: Optional[str] = None) -> pd.Series:
+    """Помесячный расход из агрегата writeoff_monthly.
+
+    column — writeoff_cartridge или writeoff_drum. Без model_type берутся только
+    месяцы с ненулевым расходом; с model_type ('cartridge'/'drum') — все месяцы,
+    в которые были списания с принтеров этой модели. Индекс — месяц (Period).
+    """
+    if model_type:
+        where, params = f"{model_type} = ?", (model_name,)
+    else:
+        where, params = f"{column} > 0", ()
     conn = sqlite3.connect(DB_FILE)
     df = pd.read_sql_query(
-        "SELECT datetime, writeoff_cartridge FROM writeoff_history WHERE writeoff_cartridge > 0",
-        conn
+        f"""
+        SELECT month, SUM({column}) AS total
+        FROM writeoff_monthly
+        WHERE {where}
+        GROUP BY month
+        ORDER BY month
+        """,
+        conn, params=params
     )
     conn.close()
-    if df.empty:
+    index = pd.to_datetime(df["month"], format="%Y-%m").dt.to_period("M")
+    return pd.Series(df["total"].values, index=pd.PeriodIndex(index, name="date"), name=column)
+
+def get_cartridge_usage_by_month() -> pd.DataFrame:
+    """Возвращает DataFrame с расходом картриджей по месяцам."""
+    usage = _monthly_usage("writeoff_cartridge")
+    if usage.empty:
         return pd.DataFrame(columns=["month", "usage"])
-    df["month"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S").dt.to_period("M")
-    usage = df.groupby("month")["writeoff_cartridge"].sum().reset_index()
-    usage.rename(columns={"writeoff_cartridge": "usage"}, inplace=True)
-    return usage
+    return pd.DataFrame({"month": usage.index, "usage": usage.values})
 
 def get_top5_cartridge_models() -> pd.DataFrame:
     """Возвращает DataFrame с топ-5 моделей картриджей по расходу."""
@@ -45,21 +68,9 @@ def get_top5_cartridge_models() -> pd.DataFrame:
 
 def get_cartridge_forecast(model_name: str) -> Optional[Dict[str, Any]]:
     """Прогноз расхода картриджа по модели на следующий месяц."""
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql_query(
-        """
-        SELECT w.datetime, w.writeoff_cartridge
-        FROM writeoff_history w
-        JOIN printers p ON w.printer_id = p.id
-        WHERE p.cartridge = ?
-        """,
-        conn, params=(model_name,)
-    )
-    conn.close()
-    if df.empty:
+    monthly = _monthly_usage("writeoff_cartridge", "cartridge", model_name)
+    if monthly.empty:
         return None
-    df["month"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S").dt.to_period("M")
-    monthly = df.groupby("month")["writeoff_cartridge"].sum()
     avg = monthly.tail(3).mean()
     return {
         "model": model_name,
@@ -67,50 +78,62 @@ def get_cartridge_forecast(model_name: str) -> Optional[Dict[str, Any]]:
         "recommended_stock": round(avg * 1.2) if avg else 0
     }
 
-def get_cartridge_change_report() -> List[Dict[str, Any]]:
-    """Отчёт по заменам картриджей: кабинет, принтер, модель, дата последней замены, дней с замены, всего замен."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-        SELECT p.id, p.name, p.cartridge, c.name as cabinet
-        FROM printers p
-        LEFT JOIN cabinets c ON p.cabinet_id = c.id
-        ORDER BY cabinet, p.name
-    """)
-    printers = c.fetchall()
-    report = []
-    for pid, pname, cartr, cab in printers:
-        c.execute("""
-            SELECT datetime FROM writeoff_history
-            WHERE printer_id=? AND writeoff_cartridge>0
-            ORDER BY datetime DESC LIMIT 1
-        """, (pid,))
-        last_row = c.fetchone()
-        c.execute("""
-            SELECT COUNT(*) FROM writeoff_history
-            WHERE printer_id=? AND writeoff_cartridge>0
-        """, (pid,))
-        total_changes = c.fetchone()[0]
-        last_date_str = last_row[0] if last_row else None
+CHANGE_REPORT_QUERY = """
+    SELECT p.name, p.cartridge, c.name AS cabinet,
+           (SELECT COUNT(*) FROM writeoff_history w
+            WHERE w.printer_id = p.id AND w.writeoff_cartridge > 0) AS total_changes,
+           (SELECT MAX(w.datetime) FROM writeoff_history w
+            WHERE w.printer_id = p.id AND w.writeoff_cartridge > 0) AS last_change
+    FROM printers p
+    LEFT JOIN cabinets c ON p.cabinet_id = c.id
+    ORDER BY cabinet, p.name, p.id
+"""
+
+def _cartridge_change_rows(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Общий движок отчёта по заменам: один запрос вместо 2N+1.
+
+    Подзапросы по принтеру читают только покрывающий индекс
+    idx_writeoff_printer_datetime, поэтому это быстрее, чем GROUP BY по всей истории.
+
+    Возвращает для каждого принтера кабинет, имя, модель картриджа, число замен,
+    дату последней замены (или None) и число дней с неё (или None).
+    """
+    now = datetime.datetime.now()
+    rows = []
+    for pname, cartr, cab, total_changes, last_date_str in conn.execute(CHANGE_REPORT_QUERY):
         if last_date_str:
             last_date = datetime.datetime.strptime(last_date_str, "%Y-%m-%d %H:%M:%S")
-            days_ago = (datetime.datetime.now() - last_date).days
+            days_ago = (now - last_date).days
         else:
             days_ago = None
-        report.append({
-            "cabinet": cab or "-",
+        rows.append({
+            "cabinet": cab,
             "printer": pname,
-            "cartridge": cartr or "-",
+            "cartridge": cartr,
             "total_changes": total_changes,
-            "last_change": last_date_str or "-",
-            "days_since_last": days_ago if days_ago is not None else "-"
+            "last_change": last_date_str,
+            "days_since_last": days_ago,
         })
+    return rows
+
+def get_cartridge_change_report() -> List[Dict[str, Any]]:
+    """Отчёт по заменам картриджей: кабинет, принтер, модель, дата последней замены, дней с замены, всего замен."""
+    conn = sqlite3.connect(DB_FILE)
+    rows = _cartridge_change_rows(conn)
     conn.close()
-    return report
+    return [{
+        "cabinet": row["cabinet"] or "-",
+        "printer": row["printer"],
+        "cartridge": row["cartridge"] or "-",
+        "total_changes": row["total_changes"],
+        "last_change": row["last_change"] or "-",
+        "days_since_last": row["days_since_last"] if row["days_since_last"] is not None else "-"
+    } for row in rows]
 
 def plot_cartridge_usage(usage_df: pd.DataFrame):
     if usage_df.empty:
         return None
+    plt = _pyplot()
     usage_df.plot(x="month", y="usage", kind="bar", legend=False)
     plt.title("Расход картриджей по месяцам")
     plt.ylabel("Штук")
@@ -125,17 +148,11 @@ def export_cartridge_usage_to_excel(usage_df: pd.DataFrame, filename: str = "car
 def plot_drum_usage():
     """Построить график расхода драмов по месяцам."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query(
-            "SELECT datetime, writeoff_drum FROM writeoff_history WHERE writeoff_drum > 0",
-            conn
-        )
-        conn.close()
-        if df.empty:
+        usage = _monthly_usage("writeoff_drum")
+        if usage.empty:
             print("Нет данных о списании драмов.")
             return
-        df["date"] = pd.to_datetime(df["datetime"]).dt.to_period("M")
-        usage = df.groupby("date")["writeoff_drum"].sum()
+        plt = _pyplot()
         usage.plot(kind="bar", title="Расход драмов по месяцам", ylabel="Штук", xlabel="Месяц")
         plt.tight_layout()
         plt.show()
@@ -193,23 +210,11 @@ def forecast_next_month(model_name, type_):
     Прогноз расхода расходника model_name (type_ = 'cartridge' или 'drum') на следующий месяц.
     """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query(
-            f"""
-            SELECT w.datetime, w.writeoff_cartridge, w.writeoff_drum
-            FROM writeoff_history w
-            JOIN printers p ON w.printer_id = p.id
-            WHERE p.{type_} = ?
-            """,
-            conn, params=(model_name,)
-        )
-        conn.close()
-        if df.empty:
+        col = "writeoff_cartridge" if type_ == "cartridge" else "writeoff_drum"
+        monthly = _monthly_usage(col, "cartridge" if type_ == "cartridge" else "drum", model_name)
+        if monthly.empty:
             print(f"Нет списаний по {model_name} ({type_}).")
             return
-        col = "writeoff_cartridge" if type_ == "cartridge" else "writeoff_drum"
-        df["date"] = pd.to_datetime(df["datetime"]).dt.to_period("M")
-        monthly = df.groupby("date")[col].sum()
         avg = monthly.tail(3).mean()
         print(f"Средний расход {model_name} за месяц: {avg:.1f}")
         print(f"Рекомендуемый запас на 1 месяц: {round(avg * 1.2)} (с запасом)")
@@ -219,17 +224,10 @@ def forecast_next_month(model_name, type_):
 def export_drum_usage_to_excel():
     """Экспортировать помесячную статистику расхода драмов в Excel."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query(
-            "SELECT datetime, writeoff_drum FROM writeoff_history WHERE writeoff_drum > 0",
-            conn
-        )
-        conn.close()
-        if df.empty:
+        usage = _monthly_usage("writeoff_drum")
+        if usage.empty:
             print("Нет данных для экспорта.")
             return
-        df["date"] = pd.to_datetime(df["datetime"]).dt.to_period("M")
-        usage = df.groupby("date")["writeoff_drum"].sum()
         usage.to_excel("drum_usage.xlsx")
         print("Готово! Файл drum_usage.xlsx сохранён.")
     except Exception as e:
@@ -238,17 +236,11 @@ def export_drum_usage_to_excel():
 def save_cartridge_usage_plot():
     """Сохранить график расхода картриджей в PNG."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query(
-            "SELECT datetime, writeoff_cartridge FROM writeoff_history WHERE writeoff_cartridge > 0",
-            conn
-        )
-        conn.close()
-        if df.empty:
+        usage = _monthly_usage("writeoff_cartridge")
+        if usage.empty:
             print("Нет данных.")
             return
-        df["date"] = pd.to_datetime(df["datetime"]).dt.to_period("M")
-        usage = df.groupby("date")["writeoff_cartridge"].sum()
+        plt = _pyplot()
         usage.plot(kind="bar", title="Расход картриджей по месяцам", ylabel="Штук", xlabel="Месяц")
         plt.tight_layout()
         plt.savefig("cartridge_usage.png")
@@ -260,17 +252,11 @@ def save_cartridge_usage_plot():
 def save_drum_usage_plot():
     """Сохранить график расхода драмов в PNG."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query(
-            "SELECT datetime, writeoff_drum FROM writeoff_history WHERE writeoff_drum > 0",
-            conn
-        )
-        conn.close()
-        if df.empty:
+        usage = _monthly_usage("writeoff_drum")
+        if usage.empty:
             print("Нет данных.")
             return
-        df["date"] = pd.to_datetime(df["datetime"]).dt.to_period("M")
-        usage = df.groupby("date")["writeoff_drum"].sum()
+        plt = _pyplot()
         usage.plot(kind="bar", title="Расход драмов по месяцам", ylabel="Штук", xlabel="Месяц")
         plt.tight_layout()
         plt.savefig("drum_usage.png")
@@ -288,43 +274,19 @@ def cartridge_change_report():
     - Всего замен за всю историю
     """
     conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    # Получаем все принтеры с их кабинетами и моделями картриджей
-    c.execute("""
-        SELECT p.id, p.name, p.cartridge, c.name as cabinet
-        FROM printers p
-        LEFT JOIN cabinets c ON p.cabinet_id = c.id
-        ORDER BY cabinet, p.name
-    """)
-    printers = c.fetchall()
+    rows = _cartridge_change_rows(conn)
+    conn.close()
 
     print("{:20} | {:20} | {:15} | {:10} | {:20} | {:10}".format(
         "Кабинет", "Принтер", "Картридж", "Замен", "Последняя замена", "Дней прошло"
     ))
     print("-"*110)
-    for pid, pname, cartr, cab in printers:
-        c.execute("""
-            SELECT datetime FROM writeoff_history
-            WHERE printer_id=? AND writeoff_cartridge>0
-            ORDER BY datetime DESC LIMIT 1
-        """, (pid,))
-        last_row = c.fetchone()
-        c.execute("""
-            SELECT COUNT(*) FROM writeoff_history
-            WHERE printer_id=? AND writeoff_cartridge>0
-        """, (pid,))
-        total_changes = c.fetchone()[0]
-
-        last_date_str = last_row[0] if last_row else "—"
-        if last_date_str != "—":
-            last_date = datetime.datetime.strptime(last_date_str, "%Y-%m-%d %H:%M:%S")
-            days_ago = (datetime.datetime.now() - last_date).days
-        else:
-            days_ago = "—"
+    for row in rows:
+        days_ago = row["days_since_last"] if row["days_since_last"] is not None else "—"
         print("{:20} | {:20} | {:15} | {:10} | {:20} | {:10}".format(
-            cab or "-", pname, cartr or "-", total_changes, last_date_str, days_ago
+            row["cabinet"] or "-", row["printer"], row["cartridge"] or "-",
+            row["total_changes"], row["last_change"] or "—", days_ago
         ))
-    conn.close()
 
 if __name__ == "__main__":
     print("Аналитика:\n1. График картриджей\n2. График драмов\n3. Топ-5 картриджей\n4. Топ-5 драмов\n5. Прогноз\n6. Экспорт в Excel\n7. Сохранить график\n8. Отчет по заменам картриджей")
@@ -2,50 +2,652 @@ import sys
 import os
 import requests
 import zipfile
-import io
+import hashlib
+import json
+import re
+import shutil
+import struct
+import tempfile
+import time
+import zlib
 import logging
 
+try:
+    import bsdiff4  # необязательно: бинарные патчи вместо целых файлов
+except ImportError:
+    bsdiff4 = None
+
 GITHUB_REPO = "Sausage1337/printersbux"  # Замените на свой репозиторий, если нужно
 APP_FILENAME = "BotPrinters.exe"
 VERSION = "1.0.0"  # Меняйте при каждом релизе
+RELEASES_API = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
+
+# Манифест релиза: JSON с размером и SHA-256 архива, прикладывается к релизу
+# отдельным файлом (см. build_manifest / python autoupdate.py manifest ...)
+MANIFEST_NAME = "manifest.json"
+# Недокачанные архивы живут здесь между запусками и докачиваются через Range
+UPDATE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "PrintGuard-update")
+CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = (10, 60)  # соединение, чтение, секунд
+DOWNLOAD_RETRIES = 5
+RETRY_DELAY = 1.0  # пауза перед повтором, умножается на номер попытки
+# Проверка версии не должна ждать долго: при медленной сети она просто не состоится
+CHECK_TIMEOUT = (3, 5)  # соединение, чтение, секунд
+# Ответ GitHub о последнем релизе хранится на диске; в пределах срока сеть не нужна,
+# после него запрос идёт с If-None-Match и ответ 304 не тратит лимит API
+RELEASE_CACHE_FILE = os.path.join(UPDATE_CACHE_DIR, "latest-release.json")
+RELEASE_CACHE_TTL = 6 * 3600  # секунд
+# Если изменившиеся файлы весят больше этой доли архива, выгоднее скачать архив целиком
+DELTA_MAX_RATIO = 0.6
+# Зеркало обновлений в локальной сети: общая папка (\\server\updates) или адрес
+# HTTP-сервера с той же раскладкой <тег релиза>/<файл>. Общую папку заполняет
+# первый клиент, скачавший проверенный файл с GitHub; остальные читают из неё
+UPDATE_MIRROR = os.environ.get("PRINTGUARD_UPDATE_MIRROR", "")
 
 logging.basicConfig(level=logging.ERROR)
 
-def get_latest_release():
-    """Получить информацию о последнем релизе с GitHub."""
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
-    resp = requests.get(url)
+
+class UpdateError(Exception):
+    """Обновление нельзя скачать, проверить или установить."""
+
+
+class DownloadCancelled(UpdateError):
+    """Пользователь отменил загрузку."""
+
+
+def app_dir():
+    """Каталог установленного приложения, в который распаковывается обновление."""
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+_VERSION_RE = re.compile(r"^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$")
+
+def parse_version(tag):
+    """
+    Ключ сравнения версий по semver: "v1.10.0" > "1.9.0", "2.0.0-rc.1" < "2.0.0".
+
+    Недостающие части считаются нулями, метаданные сборки (+...) не учитываются.
+    """
+    match = _VERSION_RE.match(tag.strip())
+    if not match:
+        raise ValueError(f"Неверный номер версии: {tag!r}")
+    major, minor, patch, pre = match.groups()
+    release = (int(major), int(minor or 0), int(patch or 0))
+    if pre is None:
+        return release + ((1,),)
+    # Числовые идентификаторы сравниваются как числа и идут раньше строковых
+    return release + ((0,) + tuple((0, int(p), "") if p.isdigit() else (1, 0, p) for p in pre.split(".")),)
+
+def is_newer(tag, current=VERSION):
+    """True, если версия tag новее current."""
+    return parse_version(tag) > parse_version(current)
+
+def _read_release_cache(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if "release" in cache and "checked_at" in cache else None
+    except (OSError, ValueError):
+        return None
+
+def _write_release_cache(path, cache):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.warning(f"Не удалось сохранить сведения о релизе: {e}")
+
+def get_latest_release(ttl=RELEASE_CACHE_TTL, timeout=CHECK_TIMEOUT, cache_file=None):
+    """
+    Получить информацию о последнем релизе с GitHub.
+
+    Ответ кэшируется в RELEASE_CACHE_FILE: моложе ttl секунд он возвращается
+    без обращения к сети, старше — перепроверяется условным запросом
+    (If-None-Match). Если GitHub недоступен, возвращается сохранённый ответ,
+    а без него исключение requests.
+    """
+    cache_file = cache_file or RELEASE_CACHE_FILE
+    cache = _read_release_cache(cache_file)
+    if cache and 0 <= time.time() - cache["checked_at"] < ttl:
+        return cache["release"]
+    headers = {"Accept": "application/vnd.github+json"}
+    if cache and cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    try:
+        resp = requests.get(RELEASES_API, headers=headers, timeout=timeout)
+        if resp.status_code == 304 and cache:
+            release, etag = cache["release"], cache.get("etag")
+        else:
+            resp.raise_for_status()
+            release, etag = resp.json(), resp.headers.get("ETag")
+    except requests.RequestException as e:
+        if cache:
+            logging.warning(f"GitHub недоступен ({e}), используются сохранённые сведения о релизе")
+            return cache["release"]
+        raise
+    _write_release_cache(cache_file, {"checked_at": time.time(), "etag": etag, "release": release})
+    return release
+
+def check_new_version(ttl=RELEASE_CACHE_TTL, timeout=CHECK_TIMEOUT):
+    """Проверить, есть ли новая версия приложения; вызывается из фонового потока."""
+    rel = get_latest_release(ttl, timeout)
+    try:
+        newer = is_newer(rel["tag_name"])
+    except ValueError as e:
+        logging.error(f"Ошибка проверки обновления: {e}")
+        return None
+    return rel if newer else None
+
+def sha256_file(path):
+    """SHA-256 файла, читаемого блоками."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _check_member_name(name):
+    path = os.path.normpath(name)
+    if os.path.isabs(path) or path.split(os.sep)[0] == "..":
+        raise UpdateError(f"Недопустимый путь в архиве: {name}")
+
+def _archive_entries(archive_path):
+    """
+    Файлы архива для манифеста: SHA-256 и размер содержимого, а также где
+    в архиве лежат их сжатые данные — чтобы скачать один файл запросом Range.
+    """
+    entries = {}
+    with zipfile.ZipFile(archive_path) as z, open(archive_path, "rb") as raw:
+        for info in z.infolist():
+            if info.is_dir():
+                continue
+            # Длина локального заголовка берётся из него самого: поле extra
+            # в нём может отличаться от центрального каталога
+            raw.seek(info.header_offset)
+            name_len, extra_len = struct.unpack("<HH", raw.read(30)[26:30])
+            digest = hashlib.sha256()
+            with z.open(info) as f:
+                for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(block)
+            entries[info.filename] = {
+                "sha256": digest.hexdigest(),
+                "size": info.file_size,
+                "offset": info.header_offset + 30 + name_len + extra_len,
+                "compressed_size": info.compress_size,
+                "method": info.compress_type,
+            }
+    return entries
+
+def _build_patches(archive_path, files, previous, patch_dir):
+    """bsdiff-патчи от файлов предыдущих релизов; патч сохраняется, только если он меньше сжатого файла."""
+    patches = {}
+    with zipfile.ZipFile(archive_path) as new:
+        for old_path in previous:
+            with zipfile.ZipFile(old_path) as old:
+                for info in old.infolist():
+                    entry = files.get(info.filename)
+                    if info.is_dir() or not entry:
+                        continue
+                    old_data = old.read(info)
+                    old_sha = hashlib.sha256(old_data).hexdigest()
+                    known = patches.get(info.filename, [])
+                    if old_sha == entry["sha256"] or any(p["from"] == old_sha for p in known):
+                        continue
+                    patch = bsdiff4.diff(old_data, new.read(info.filename))
+                    if len(patch) >= entry["compressed_size"]:
+                        continue
+                    name = f"patch-{old_sha[:16]}-{entry['sha256'][:16]}.bsdiff"
+                    with open(os.path.join(patch_dir, name), "wb") as f:
+                        f.write(patch)
+                    patches.setdefault(info.filename, []).append({
+                        "from": old_sha,
+                        "name": name,
+                        "size": len(patch),
+                        "sha256": hashlib.sha256(patch).hexdigest(),
+                    })
+    return patches
+
+def build_manifest(archive_path, version, previous=(), patch_dir=None):
+    """
+    Манифест для архива релиза; сохраняется рядом с архивом как manifest.json.
+
+    previous — архивы прежних релизов: если установлен bsdiff4, для
+    изменившихся файлов в patch_dir пишутся бинарные патчи, которые
+    прикладываются к релизу вместе с манифестом.
+    """
+    files = _archive_entries(archive_path)
+    manifest = {
+        "version": version,
+        "archive": {
+            "name": os.path.basename(archive_path),
+            "size": os.path.getsize(archive_path),
+            "sha256": sha256_file(archive_path),
+        },
+        "files": files,
+    }
+    if previous:
+        if bsdiff4 is None:
+            raise UpdateError("Для патчей нужен пакет bsdiff4")
+        manifest["patches"] = _build_patches(archive_path, files, previous,
+                                             patch_dir or os.path.dirname(os.path.abspath(archive_path)))
+    return manifest
+
+def fetch_manifest(rel, session=None):
+    """Скачать манифест релиза; None, если его нет среди файлов релиза."""
+    asset = next((a for a in rel["assets"] if a["name"] == MANIFEST_NAME), None)
+    if not asset:
+        return None
+    resp = (session or requests).get(asset["browser_download_url"], timeout=DOWNLOAD_TIMEOUT)
     resp.raise_for_status()
     return resp.json()
 
-def check_new_version():
-    """Проверить, есть ли новая версия приложения."""
-    rel = get_latest_release()
-    latest_version = rel["tag_name"]
-    if latest_version > VERSION:
-        return rel
-    return None
+def expected_digest(asset, manifest):
+    """(sha256, размер) архива: из манифеста или из поля digest, которое отдаёт GitHub."""
+    archive = (manifest or {}).get("archive") or {}
+    if archive.get("name") == asset["name"] and archive.get("sha256"):
+        return archive["sha256"].lower(), archive.get("size")
+    digest = asset.get("digest") or ""
+    if digest.startswith("sha256:"):
+        return digest[len("sha256:"):].lower(), asset.get("size")
+    return None, asset.get("size")
+
+def _retryable(error):
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, requests.RequestException)
+
+def _is_url(location):
+    return location.startswith(("http://", "https://"))
+
+def download_file(url, dest, sha256=None, size=None, progress=None, session=None,
+                  chunk_size=CHUNK_SIZE, retries=DOWNLOAD_RETRIES):
+    """
+    Скачать url в dest потоком, не держа файл в памяти.
+
+    Данные пишутся в dest + ".part"; при обрыве соединения (и при следующем
+    вызове после закрытия программы) загрузка продолжается с места остановки
+    запросом Range. progress(скачано, всего) вызывается после каждого блока,
+    всего может быть None; исключение из progress прерывает загрузку, а
+    недокачанный файл остаётся для докачки. Готовый файл сверяется с size
+    и sha256 и только после этого переименовывается в dest.
+    """
+    if sha256 and os.path.exists(dest) and sha256_file(dest) == sha256:
+        if progress:
+            progress(os.path.getsize(dest), os.path.getsize(dest))
+        return dest
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    part = dest + ".part"
+    session = session or requests.Session()
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if size is not None and offset > size:
+            os.remove(part)
+            offset = 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as resp:
+                if resp.status_code == 416 and offset:
+                    # Файл уже скачан целиком, если размер совпадает; иначе начинаем заново
+                    if size is None or offset == size:
+                        break
+                    os.remove(part)
+                    continue
+                resp.raise_for_status()
+                if offset and resp.status_code != 206:
+                    offset = 0  # сервер не поддерживает Range и отдаёт файл с начала
+                length = resp.headers.get("Content-Length")
+                total = size if size is not None else (offset + int(length) if length else None)
+                done = offset
+                with open(part, "ab" if offset else "wb") as f:
+                    if progress:
+                        progress(done, total)
+                    for chunk in resp.iter_content(chunk_size):
+                        f.write(chunk)
+                        done += len(chunk)
+                        if progress:
+                            progress(done, total)
+                if total is not None and done < total:
+                    raise requests.ConnectionError(f"соединение закрыто на {done} из {total} байт")
+            break
+        except requests.RequestException as e:
+            attempt += 1
+            if not _retryable(e) or attempt > retries:
+                raise UpdateError(f"Не удалось скачать {url}: {e}") from e
+            logging.warning(f"Загрузка обновления прервана ({e}), повтор {attempt} из {retries}")
+            time.sleep(RETRY_DELAY * attempt)
+    actual_size = os.path.getsize(part)
+    if size is not None and actual_size != size:
+        os.remove(part)
+        raise UpdateError(f"Размер архива {actual_size} байт, ожидалось {size}")
+    if sha256 and sha256_file(part) != sha256:
+        os.remove(part)
+        raise UpdateError("Контрольная сумма архива не совпадает с манифестом релиза")
+    os.replace(part, dest)
+    return dest
+
+def mirror_location(rel, name):
+    """Путь или адрес файла релиза на зеркале; None, если зеркало не настроено."""
+    if not UPDATE_MIRROR:
+        return None
+    if _is_url(UPDATE_MIRROR):
+        return f"{UPDATE_MIRROR.rstrip('/')}/{rel['tag_name']}/{name}"
+    return os.path.join(UPDATE_MIRROR, rel["tag_name"], name)
+
+def copy_verified(src, dest, sha256, size=None, progress=None):
+    """Скопировать файл из общей папки в dest, сверив размер и SHA-256."""
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    part = dest + ".part"
+    digest = hashlib.sha256()
+    done = 0
+    with open(src, "rb") as fin, open(part, "wb") as fout:
+        for block in iter(lambda: fin.read(CHUNK_SIZE), b""):
+            fout.write(block)
+            digest.update(block)
+            done += len(block)
+            if progress:
+                progress(done, size)
+    if (size is not None and done != size) or digest.hexdigest() != sha256:
+        os.remove(part)
+        raise UpdateError(f"Файл {src} на зеркале повреждён")
+    os.replace(part, dest)
+    return dest
+
+def _publish_to_mirror(path, location):
+    """Положить проверенный файл в общую папку; остальные клиенты увидят его только целиком."""
+    try:
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        tmp = f"{location}.{os.getpid()}.part"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, location)
+    except OSError as e:
+        logging.warning(f"Не удалось положить {os.path.basename(path)} на зеркало обновлений: {e}")
+
+def fetch_artifact(rel, name, url, sha256, size=None, progress=None, session=None):
+    """
+    Получить проверенный файл релиза в UPDATE_CACHE_DIR.
+
+    Сначала файл берётся с зеркала (UPDATE_MIRROR); если зеркала нет, файла
+    на нём нет или он не сходится с SHA-256, файл скачивается с GitHub и,
+    если зеркало — общая папка, кладётся в неё.
+    """
+    dest = os.path.join(UPDATE_CACHE_DIR, name)
+    location = mirror_location(rel, name)
+    if location:
+        try:
+            if _is_url(location):
+                return download_file(location, dest, sha256, size, progress, session, retries=1)
+            if os.path.isfile(location):
+                return copy_verified(location, dest, sha256, size, progress)
+        except DownloadCancelled:
+            raise
+        except (UpdateError, OSError) as e:
+            logging.warning(f"Зеркало обновлений не помогло ({e}), загрузка с GitHub")
+    path = download_file(url, dest, sha256, size, progress, session)
+    if location and not _is_url(location):
+        _publish_to_mirror(path, location)
+    return path
+
+def cleanup_previous_update(target_dir=None):
+    """Удалить каталоги, оставшиеся от прошлых установок (на Windows запущенный exe не удалить сразу)."""
+    target_dir = target_dir or app_dir()
+    for name in os.listdir(target_dir):
+        if name.startswith((".update-", ".previous-")):
+            shutil.rmtree(os.path.join(target_dir, name), ignore_errors=True)
+
+def _swap_in(staging, target_dir):
+    """
+    Поставить файлы из staging на место в target_dir.
 
-def download_and_replace(rel, parent_widget=None):
-    """Скачать и заменить файлы приложения из релиза."""
+    Каждый файл ставится через os.replace, а прежний переносится в резервный
+    каталог. Если замена какого-то файла не удалась, уже заменённые
+    возвращаются обратно.
+    """
+    backup = tempfile.mkdtemp(prefix=".previous-", dir=target_dir)
+    try:
+        files = [
+            os.path.relpath(os.path.join(root, name), staging)
+            for root, _, names in os.walk(staging)
+            for name in names
+        ]
+        replaced = []
+        try:
+            for rel in files:
+                dst = os.path.join(target_dir, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                saved = None
+                if os.path.exists(dst):
+                    saved = os.path.join(backup, rel)
+                    os.makedirs(os.path.dirname(saved), exist_ok=True)
+                    os.replace(dst, saved)
+                replaced.append((dst, saved))
+                os.replace(os.path.join(staging, rel), dst)
+        except OSError:
+            for dst, saved in reversed(replaced):
+                if saved:
+                    os.replace(saved, dst)
+                elif os.path.exists(dst):
+                    os.remove(dst)
+            raise
+        return len(files)
+    finally:
+        shutil.rmtree(backup, ignore_errors=True)
+
+def install_archive(archive_path, target_dir=None):
+    """
+    Распаковать архив обновления поверх target_dir.
+
+    Архив целиком распаковывается во временный каталог рядом с приложением
+    (та же файловая система), затем файлы ставятся на место через _swap_in.
+    """
+    target_dir = target_dir or app_dir()
+    cleanup_previous_update(target_dir)
+    staging = tempfile.mkdtemp(prefix=".update-", dir=target_dir)
+    try:
+        with zipfile.ZipFile(archive_path) as z:
+            for name in z.namelist():
+                _check_member_name(name)
+            z.extractall(staging)
+        return _swap_in(staging, target_dir)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def plan_delta(manifest, target_dir):
+    """Файлы релиза, отличающиеся от установленных: [(путь, запись манифеста, патч или None)]."""
+    changes = []
+    for name, entry in manifest["files"].items():
+        _check_member_name(name)
+        path = os.path.join(target_dir, name)
+        installed = sha256_file(path) if os.path.isfile(path) else None
+        if installed == entry["sha256"]:
+            continue
+        patch = None
+        if bsdiff4 is not None and installed:
+            patch = next((p for p in manifest.get("patches", {}).get(name, []) if p["from"] == installed), None)
+        changes.append((name, entry, patch))
+    return changes
+
+def _read_range(session, source, start, length):
+    """Байты [start, start + length) архива: из файла в общей папке или запросом Range."""
+    if not _is_url(source):
+        with open(source, "rb") as f:
+            f.seek(start)
+            while length > 0:
+                block = f.read(min(CHUNK_SIZE, length))
+                if not block:
+                    raise UpdateError(f"Архив {source} короче, чем указано в манифесте")
+                length -= len(block)
+                yield block
+        return
+    headers = {"Range": f"bytes={start}-{start + length - 1}"}
+    with session.get(source, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as resp:
+        resp.raise_for_status()
+        if resp.status_code != 206:
+            raise UpdateError("Сервер не поддерживает загрузку частей файла (Range)")
+        yield from resp.iter_content(CHUNK_SIZE)
+
+def _fetch_member(session, source, name, entry, dest, report):
+    """Прочитать сжатые данные одного файла из архива релиза (source — адрес или путь) и распаковать в dest."""
+    if entry["method"] == zipfile.ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    elif entry["method"] == zipfile.ZIP_STORED:
+        decompressor = None
+    else:
+        raise UpdateError(f"Неподдерживаемое сжатие {entry['method']} у {name}")
+    digest = hashlib.sha256()
+    with open(dest, "wb") as f:
+        if entry["compressed_size"]:
+            for chunk in _read_range(session, source, entry["offset"], entry["compressed_size"]):
+                report(len(chunk))
+                data = decompressor.decompress(chunk) if decompressor else chunk
+                digest.update(data)
+                f.write(data)
+            if decompressor:
+                data = decompressor.flush()
+                digest.update(data)
+                f.write(data)
+    if digest.hexdigest() != entry["sha256"]:
+        raise UpdateError(f"Контрольная сумма {name} не совпадает с манифестом релиза")
+
+def install_delta(rel, asset, manifest, target_dir=None, progress=None, session=None, source=None):
+    """
+    Обновить только файлы, которые отличаются от установленных.
+
+    Изменившийся файл читается из архива релиза по смещению из манифеста —
+    запросом Range к source (по умолчанию архив на GitHub) или из файла,
+    если source — путь в общей папке, — либо, если есть подходящий патч
+    и bsdiff4, собирается из установленного файла и патча. Готовые файлы
+    сверяются с SHA-256 из манифеста и ставятся на место так же, как при
+    установке архива. Возвращает False, если частичное обновление не
+    выгоднее архива.
+    """
+    target_dir = target_dir or app_dir()
+    changes = plan_delta(manifest, target_dir)
+    cost = sum(patch["size"] if patch else entry["compressed_size"] for _, entry, patch in changes)
+    if cost > manifest["archive"]["size"] * DELTA_MAX_RATIO:
+        return False
+    urls = {a["name"]: a["browser_download_url"] for a in rel["assets"]}
+    source = source or urls[asset["name"]]
+    session = session or requests.Session()
+    transferred = 0
+
+    def report(n):
+        nonlocal transferred
+        transferred += n
+        if progress:
+            progress(transferred, cost)
+
+    cleanup_previous_update(target_dir)
+    staging = tempfile.mkdtemp(prefix=".update-", dir=target_dir)
+    try:
+        for name, entry, patch in changes:
+            staged = os.path.join(staging, name)
+            os.makedirs(os.path.dirname(staged), exist_ok=True)
+            if patch:
+                base = transferred
+                patch_file = fetch_artifact(rel, patch["name"], urls[patch["name"]], patch["sha256"], patch["size"],
+                                            lambda done, total: report(base + done - transferred), session)
+                bsdiff4.file_patch(os.path.join(target_dir, name), staged, patch_file)
+                os.remove(patch_file)
+                if sha256_file(staged) != entry["sha256"]:
+                    raise UpdateError(f"После наложения патча {name} не совпадает с манифестом релиза")
+            else:
+                _fetch_member(session, source, name, entry, staged, report)
+        _swap_in(staging, target_dir)
+        return True
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def _delta_sources(rel, asset, size):
+    """Откуда читать файлы архива при частичном обновлении: сначала зеркало, затем GitHub."""
+    sources = []
+    location = mirror_location(rel, asset["name"])
+    if location:
+        if _is_url(location) or (os.path.isfile(location) and os.path.getsize(location) == size):
+            sources.append(location)
+        elif os.path.isdir(UPDATE_MIRROR):
+            # Общая папка доступна, но архива в ней ещё нет: выгоднее один раз
+            # скачать его целиком и положить туда для остальных клиентов
+            return []
+    sources.append(asset["browser_download_url"])
+    return sources
+
+def install_update(rel, progress=None, target_dir=None):
+    """
+    Скачать и установить релиз.
+
+    True — установлен, False — загрузка отменена (из progress пришёл
+    DownloadCancelled, следующая попытка её продолжит). Ошибки
+    передаются исключением: их показывает вызывающий.
+    """
     asset = next((a for a in rel["assets"] if a["name"].endswith(".zip")), None)
     if not asset:
-        if parent_widget:
-            from PySide6.QtWidgets import QMessageBox
-            QMessageBox.critical(parent_widget, "Обновление", "В релизе нет zip-архива!")
-        return False
+        raise UpdateError("В релизе нет zip-архива")
     try:
-        r = requests.get(asset["browser_download_url"])
-        z = zipfile.ZipFile(io.BytesIO(r.content))
-        z.extractall(".")
+        manifest = fetch_manifest(rel)
+        sha256, size = expected_digest(asset, manifest)
+        if not sha256:
+            raise UpdateError("В релизе нет контрольной суммы архива (manifest.json)")
+        if manifest and manifest.get("files"):
+            for source in _delta_sources(rel, asset, size):
+                try:
+                    if install_delta(rel, asset, manifest, target_dir, progress, source=source):
+                        return True
+                    break  # частичное обновление невыгодно
+                except DownloadCancelled:
+                    raise
+                except Exception as e:
+                    logging.warning(f"Частичное обновление из {source} не удалось ({e})")
+        archive = fetch_artifact(rel, asset["name"], asset["browser_download_url"], sha256, size, progress)
+        install_archive(archive, target_dir)
+        os.remove(archive)
         return True
+    except DownloadCancelled:
+        return False
+
+def download_and_replace(rel, progress=None, target_dir=None):
+    """Скачать и заменить файлы приложения из релиза; ошибка пишется в журнал, результат — True/False."""
+    try:
+        return install_update(rel, progress, target_dir)
     except Exception as e:
         logging.error(f"Ошибка при загрузке и распаковке обновления: {e}")
-        if parent_widget:
-            from PySide6.QtWidgets import QMessageBox
-            QMessageBox.critical(parent_widget, "Обновление", f"Ошибка загрузки: {e}")
         return False
 
+def _progress_dialog(parent_widget, task_progress):
+    """Окно прогресса загрузки, связанное с TaskProgress фоновой задачи."""
+    from PySide6.QtCore import Qt
+    from PySide6.QtWidgets import QProgressDialog
+    dialog = QProgressDialog("Загрузка обновления...", "Отмена", 0, 100, parent_widget)
+    dialog.setWindowTitle("Обновление")
+    dialog.setWindowModality(Qt.WindowModal)
+    dialog.setMinimumDuration(0)
+    dialog.setAutoClose(False)
+    dialog.setAutoReset(False)
+
+    def show(done, total):
+        if total:
+            dialog.setRange(0, 100)
+            dialog.setValue(int(done * 100 / total))
+            dialog.setLabelText(f"Загрузка обновления: {done / 1048576:.1f} из {total / 1048576:.1f} МБ")
+        else:
+            dialog.setRange(0, 0)
+
+    task_progress.changed.connect(show)
+    dialog.canceled.connect(task_progress.cancel)
+    return dialog
+
+def _progress_callback(task_progress):
+    """Функция progress для install_update: выполняется в фоновом потоке."""
+    def progress(done, total):
+        if task_progress.cancelled:
+            raise DownloadCancelled()
+        task_progress.report(done, total)
+    return progress
+
 def restart():
     """Перезапустить приложение."""
     if sys.platform == "win32":
@@ -53,28 +655,65 @@ def restart():
     else:
         os.execl(sys.executable, sys.executable, *sys.argv)
 
-def check_and_update_gui(parent_widget=None):
-    """Проверить обновления и запустить процесс обновления через GUI."""
+def offer_update(parent_widget, rel, tasks, on_finished=None):
+    """
+    Предложить установить найденный релиз и установить его через GUI.
+
+    Сама проверка (check_new_version) выполняется в фоновом потоке,
+    сюда передаётся её результат. Загрузка и установка тоже идут в фоне
+    через tasks (TaskRunner), окно не блокируется. Возвращает TaskProgress
+    начатой установки (через него её можно отменить) или None, если
+    пользователь отказался; on_finished() вызывается, когда установка
+    завершилась, отменена или не удалась.
+    """
     from PySide6.QtWidgets import QMessageBox
-    try:
-        rel = check_new_version()
-    except Exception as e:
-        logging.error(f"Ошибка проверки обновления: {e}")
-        QMessageBox.critical(parent_widget, "Ошибка обновления", f"Ошибка проверки обновления:\n{e}")
-        return
-    if rel:
-        res = QMessageBox.question(
-            parent_widget,
-            "Обновление",
-            f"Найдена новая версия: {rel['tag_name']}\nОбновить сейчас?",
-            QMessageBox.Yes | QMessageBox.No
-        )
-        if res == QMessageBox.Yes:
-            ok = download_and_replace(rel, parent_widget)
-            if ok:
-                QMessageBox.information(parent_widget, "Обновление", "Обновление установлено. Приложение будет перезапущено.")
-                restart()
-            else:
-                QMessageBox.critical(parent_widget, "Обновление", "Обновление не удалось.")
-    else:
-        QMessageBox.information(parent_widget, "Обновление", "У вас уже последняя версия.")
\ No newline at end of file
+    from src.workers import TaskProgress
+    res = QMessageBox.question(
+        parent_widget,
+        "Обновление",
+        f"Найдена новая версия: {rel['tag_name']}\nОбновить сейчас?",
+        QMessageBox.Yes | QMessageBox.No
+    )
+    if res != QMessageBox.Yes:
+        return None
+    task_progress = TaskProgress(parent_widget)
+    dialog = _progress_dialog(parent_widget, task_progress)
+
+    def finish():
+        dialog.close()
+        if on_finished:
+            on_finished()
+
+    def done(installed):
+        finish()
+        if installed:
+            QMessageBox.information(parent_widget, "Обновление", "Обновление установлено. Приложение будет перезапущено.")
+            restart()
+        else:
+            QMessageBox.information(parent_widget, "Обновление", "Загрузка прервана, при следующем обновлении она продолжится.")
+
+    def failed(message):
+        # Единственное место, где пользователь видит ошибку установки
+        finish()
+        QMessageBox.critical(parent_widget, "Обновление", f"Обновление не удалось: {message}")
+
+    tasks.submit("update-install", install_update, done, failed, rel, _progress_callback(task_progress))
+    return task_progress
+
+if __name__ == "__main__":
+    # Подготовка релиза:
+    #   python autoupdate.py manifest dist/PrintGuard-2.1.0.zip 2.1.0 --previous old/PrintGuard-2.0.0.zip
+    # manifest.json и патчи пишутся рядом с архивом и прикладываются к релизу
+    import argparse
+    parser = argparse.ArgumentParser(prog="autoupdate.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+    manifest_cmd = commands.add_parser("manifest", help="манифест (и патчи) для архива релиза")
+    manifest_cmd.add_argument("archive")
+    manifest_cmd.add_argument("version")
+    manifest_cmd.add_argument("--previous", action="append", default=[],
+                              help="архив прежнего релиза для бинарных патчей (нужен bsdiff4)")
+    args = parser.parse_args()
+    manifest_path = os.path.join(os.path.dirname(os.path.abspath(args.archive)), MANIFEST_NAME)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(build_manifest(args.archive, args.version, args.previous), f, indent=2)
+    print(manifest_path)
@@ -0,0 +1 @@
+"""Замеры производительности и нагрузочные проверки PrinterGuard (запуск — см. README)."""
@@ -0,0 +1,94 @@
+"""
+Сравнение отчёта по заменам картриджей: старый вариант (2N+1 запросов)
+против одного запроса из analytics.
+
+Генерирует синтетическую базу (по умолчанию 2000 принтеров и 500 000
+списаний) и печатает время обоих вариантов. Совпадение нового отчёта
+со старым построчно (эталонное сравнение) проверяет tests/test_change_report.py.
+
+    python -m benchmarks.bench_change_report [--printers 2000] [--writeoffs 500000]
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import analytics
+from .datagen import build_office_db
+
+
+def legacy_change_report(db_file):
+    """Прежняя реализация get_cartridge_change_report (эталон)."""
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute("""
+        SELECT p.id, p.name, p.cartridge, c.name as cabinet
+        FROM printers p
+        LEFT JOIN cabinets c ON p.cabinet_id = c.id
+        ORDER BY cabinet, p.name
+    """)
+    printers = c.fetchall()
+    report = []
+    for pid, pname, cartr, cab in printers:
+        c.execute("""
+            SELECT datetime FROM writeoff_history
+            WHERE printer_id=? AND writeoff_cartridge>0
+            ORDER BY datetime DESC LIMIT 1
+        """, (pid,))
+        last_row = c.fetchone()
+        c.execute("""
+            SELECT COUNT(*) FROM writeoff_history
+            WHERE printer_id=? AND writeoff_cartridge>0
+        """, (pid,))
+        total_changes = c.fetchone()[0]
+        last_date_str = last_row[0] if last_row else None
+        if last_date_str:
+            last_date = datetime.datetime.strptime(last_date_str, "%Y-%m-%d %H:%M:%S")
+            days_ago = (datetime.datetime.now() - last_date).days
+        else:
+            days_ago = None
+        report.append({
+            "cabinet": cab or "-",
+            "printer": pname,
+            "cartridge": cartr or "-",
+            "total_changes": total_changes,
+            "last_change": last_date_str or "-",
+            "days_since_last": days_ago if days_ago is not None else "-"
+        })
+    conn.close()
+    return report
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--printers", type=int, default=2000)
+    parser.add_argument("--writeoffs", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "office.db")
+        build_office_db(db_file, args.printers, args.writeoffs)
+        analytics.DB_FILE = db_file
+
+        _, legacy_time = timed(legacy_change_report, db_file)
+        actual, new_time = timed(analytics.get_cartridge_change_report)
+
+        print(f"принтеров: {args.printers}, списаний: {args.writeoffs}, строк отчёта: {len(actual)}")
+        print(f"старый отчёт (2N+1 запросов): {legacy_time * 1000:9.1f} мс")
+        print(f"один запрос:                  {new_time * 1000:9.1f} мс")
+        print(f"ускорение:                    {legacy_time / new_time:9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Замер накладных расходов на получение соединения с office.db.
+
+Сравнивает старую схему (sqlite3.connect/close на каждый вызов) с пулом
+соединений из src.database. Запуск из корня проекта:
+
+    python -m benchmarks.bench_db_connection [--calls 2000] [--db путь/к/office.db]
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from src import database
+
+
+def per_call_connect(db_file, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        conn = sqlite3.connect(db_file)
+        conn.row_factory = sqlite3.Row
+        conn.execute("SELECT id, login, role FROM users ORDER BY login").fetchall()
+        conn.close()
+    return (time.perf_counter() - start) / calls
+
+
+def pooled(calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        database.UserManager.get_all_users()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--db", help="существующая база (по умолчанию временная)")
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.db:
+        database.DB_FILE = args.db
+    else:
+        tmpdir = tempfile.TemporaryDirectory()
+        database.DB_FILE = os.path.join(tmpdir.name, "office.db")
+    database.init_db()
+
+    before = per_call_connect(database.DB_FILE, args.calls)
+    after = pooled(args.calls)
+    print(f"connect/close на вызов: {before * 1e6:8.1f} мкс")
+    print(f"пул соединений:         {after * 1e6:8.1f} мкс")
+    print(f"ускорение:              {before / after:8.1f}x")
+
+    database.close_pool()
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Объём загрузки при частичном (delta) обновлении autoupdate.
+
+Собирает два релиза: во втором изменились analytics.py и несколько байт
+одной DLL, остальное (в том числе крупный exe) прежнее. Ставит первый
+релиз в каталог приложения и обновляет его до второго через локальный
+сервер-заменитель GitHub, считая переданные байты: архив целиком, только
+изменившиеся файлы (Range по манифесту) и бинарные патчи (если установлен
+bsdiff4). Откат на архив целиком, проверку файлов по манифесту и
+восстановление испорченных файлов проверяет tests/test_delta_update.py.
+Запуск из корня проекта:
+
+    python -m benchmarks.bench_delta_update [--exe-mb 24] [--max-ratio 0.05]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import autoupdate
+from .release_server import ReleaseServer, make_archive
+
+
+def releases(exe_mb):
+    rnd = random.Random(7)
+    old = {
+        "BotPrinters.exe": rnd.randbytes(exe_mb * 1024 * 1024),
+        "analytics.py": b"".join(b"# analytics v1, line %d\n" % i for i in range(2000)),
+        "lib/Qt6Core.dll": rnd.randbytes(4 * 1024 * 1024),
+        "lib/helper.dll": rnd.randbytes(1024 * 1024),
+    }
+    old.update({f"data/template_{i}.xlsx": rnd.randbytes(20 * 1024) for i in range(30)})
+    new = dict(old)
+    new["analytics.py"] = old["analytics.py"].replace(b"v1", b"v2")
+    helper = bytearray(old["lib/helper.dll"])
+    helper[1000:1016] = rnd.randbytes(16)
+    new["lib/helper.dll"] = bytes(helper)
+    return old, new
+
+
+def publish(server, tmp, tag, payload, previous=()):
+    """Архив, манифест и патчи релиза — как их выкладывают на GitHub."""
+    release_dir = os.path.join(tmp, tag)
+    os.makedirs(release_dir, exist_ok=True)
+    archive_path = os.path.join(release_dir, f"PrintGuard-{tag}.zip")
+    make_archive(archive_path, payload)
+    manifest = autoupdate.build_manifest(archive_path, tag, previous, release_dir)
+    names = [os.path.basename(archive_path), autoupdate.MANIFEST_NAME]
+    for name in os.listdir(release_dir):
+        with open(os.path.join(release_dir, name), "rb") as f:
+            server.files[name] = f.read()
+        if name.endswith(".bsdiff"):
+            names.append(name)
+    server.files[autoupdate.MANIFEST_NAME] = json.dumps(manifest).encode()
+    return archive_path, server.release(tag, names)
+
+
+def installed_matches(app, payload):
+    for name, data in payload.items():
+        with open(os.path.join(app, name), "rb") as f:
+            if f.read() != data:
+                return False
+    return True
+
+
+def update(server, app, old_archive, release, payload, corrupt=None):
+    """Поставить старый релиз, обновить его и вернуть (успех, передано байт)."""
+    shutil.rmtree(app, ignore_errors=True)
+    os.makedirs(app)
+    autoupdate.install_archive(old_archive, app)
+    if corrupt:
+        with open(os.path.join(app, corrupt), "r+b") as f:
+            f.write(b"\0" * 64)
+    server.reset_counters()
+    ok = autoupdate.download_and_replace(release, target_dir=app)
+    return ok and installed_matches(app, payload), server.sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--exe-mb", type=int, default=24)
+    parser.add_argument("--max-ratio", type=float, default=0.05,
+                        help="допустимая доля от архива для частичного обновления")
+    args = parser.parse_args()
+    autoupdate.RETRY_DELAY = 0
+
+    old, new = releases(args.exe_mb)
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp, ReleaseServer() as server:
+        autoupdate.UPDATE_CACHE_DIR = os.path.join(tmp, "cache")
+        app = os.path.join(tmp, "app")
+        old_archive, _ = publish(server, tmp, "v2.0.0", old)
+        patches = [old_archive] if autoupdate.bsdiff4 is not None else []
+        new_archive, release = publish(server, tmp, "v2.1.0", new, previous=patches)
+        full = os.path.getsize(new_archive)
+        manifest = json.loads(server.files[autoupdate.MANIFEST_NAME])
+        rows = []
+
+        def serve_manifest(*keys):
+            server.files[autoupdate.MANIFEST_NAME] = json.dumps({k: manifest[k] for k in keys}).encode()
+
+        # Способ задаётся составом манифеста: без списка файлов (как у релизов до
+        # delta-обновлений) ставится архив целиком
+        methods = [("архив целиком", ("version", "archive")),
+                   ("изменившиеся файлы (Range)", ("version", "archive", "files"))]
+        if patches:
+            methods.append(("бинарные патчи (bsdiff4)", ("version", "archive", "files", "patches")))
+        else:
+            print("пропуск  бинарные патчи: bsdiff4 не установлен")
+        for name, keys in methods:
+            serve_manifest(*keys)
+            ok, sent = update(server, app, old_archive, release, new)
+            if not ok:
+                failed.append(name)
+            rows.append((name, sent))
+
+        print()
+        print(f"{'способ':30} {'передано, байт':>15} {'доля архива':>12}")
+        for name, sent in rows:
+            print(f"{name:30} {sent:15} {sent / full:12.2%}")
+    if failed:
+        print(f"ОШИБКА: обновление не установлено: {', '.join(failed)}")
+        return 1
+    if rows[1][1] > full * args.max_ratio:
+        print(f"ОШИБКА: частичное обновление больше {args.max_ratio:.0%} архива")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
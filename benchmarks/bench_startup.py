@@ -0,0 +1,140 @@
+"""
+Замер холодного запуска настольного клиента до появления окна входа.
+
+Два замера в отдельных процессах, как при настоящем запуске:
+  * python -X importtime для src.botsprinter — суммарное время импорта,
+    самые тяжёлые модули и проверка, что pandas, matplotlib, requests,
+    analytics и autoupdate не загружаются до входа;
+  * время от старта интерпретатора до показанного LoginDialog
+    (botsprinter.main() с временной базой; диалог закрывается сразу).
+
+Запуск из корня проекта (без дисплея — QT_QPA_PLATFORM=offscreen):
+
+    python -m benchmarks.bench_startup [--runs 5] [--max-import-ms 500] [--max-startup-ms 2000]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Модули, которые нужны только аналитике и обновлениям
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib", "requests", "analytics", "autoupdate")
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+
+def measure_imports():
+    """(мс на импорт, [(мс, модуль)] его прямых зависимостей, загруженные тяжёлые модули)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.botsprinter"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    # Вложенные импорты печатаются до родителя с отступом на два пробела больше
+    total, children, pending, loaded = 0, [], [], set()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)) / 1000, len(match.group(3)), match.group(4)
+        loaded.add(name.split(".")[0])
+        if depth == 3:
+            pending.append((cumulative, name))
+        elif depth == 1:
+            if name == "src.botsprinter":
+                total, children = cumulative, pending
+            pending = []
+    return total, sorted(children, reverse=True), sorted(loaded & set(HEAVY_MODULES))
+
+
+def child(db_file):
+    """Запуск приложения до окна входа; печатает метку, когда диалог показан."""
+    from src import database
+    database.DB_FILE = db_file
+    from PySide6.QtWidgets import QApplication, QDialog
+    from src import botsprinter
+
+    def exec_shown(dialog):
+        dialog.show()
+        QApplication.processEvents()
+        heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+        print("LOGIN_SHOWN", ",".join(heavy), flush=True)
+        return QDialog.Rejected
+
+    botsprinter.LoginDialog.exec = exec_shown
+    return botsprinter.main()
+
+
+def measure_startup(db_file):
+    """Мс от запуска процесса до показанного LoginDialog и тяжёлые модули на этот момент."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child", db_file],
+        cwd=ROOT, env=_env(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    for line in process.stdout:
+        if line.startswith("LOGIN_SHOWN"):
+            elapsed = (time.perf_counter() - start) * 1000
+            process.wait()
+            parts = line.split()
+            return elapsed, parts[1].split(",") if len(parts) > 1 else []
+    process.wait()
+    raise RuntimeError(f"окно входа не показано, код выхода {process.returncode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=500,
+                        help="допустимое время импорта src.botsprinter")
+    parser.add_argument("--max-startup-ms", type=float, default=2000,
+                        help="допустимое время до окна входа (медиана)")
+    parser.add_argument("--child", metavar="DB", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    ok = True
+    import_runs = [measure_imports() for _ in range(args.runs)]
+    import_ms = statistics.median(run[0] for run in import_runs)
+    print(f"импорт src.botsprinter: {import_ms:.0f} мс (медиана из {args.runs})")
+    for ms, name in import_runs[-1][1][:8]:
+        print(f"  {ms:8.1f} мс  {name}")
+    heavy = import_runs[-1][2]
+    if heavy:
+        print(f"ОШИБКА: до окна входа импортируются {', '.join(heavy)}")
+        ok = False
+    if import_ms > args.max_import_ms:
+        print(f"ОШИБКА: импорт дольше {args.max_import_ms:.0f} мс")
+        ok = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "office.db")
+        measure_startup(db_file)  # первая база создаётся миграциями, в замер не входит
+        startup = [measure_startup(db_file) for _ in range(args.runs)]
+    startup_ms = statistics.median(ms for ms, _ in startup)
+    print(f"до окна входа: медиана {startup_ms:.0f} мс, минимум {min(ms for ms, _ in startup):.0f} мс")
+    heavy = sorted({name for _, names in startup for name in names})
+    if heavy:
+        print(f"ОШИБКА: к показу окна входа загружены {', '.join(heavy)}")
+        ok = False
+    if startup_ms > args.max_startup_ms:
+        print(f"ОШИБКА: запуск дольше {args.max_startup_ms:.0f} мс")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
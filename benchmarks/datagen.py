@@ -0,0 +1,191 @@
+"""
+Детерминированный генератор синтетической office.db для замеров.
+
+Одинаковые параметры и seed дают одинаковое содержимое базы, поэтому
+результаты замеров на разных коммитах сравнимы. Готовые масштабы:
+
+    1k    —   1 000 принтеров,   200 000 списаний,   100 000 перемещений
+    10k   —  10 000 принтеров, 1 000 000 списаний,   500 000 перемещений
+    100k  — 100 000 принтеров, 5 000 000 списаний, 2 000 000 перемещений
+
+    python -m benchmarks.datagen office_10k.db --scale 10k
+    python -m benchmarks.datagen small.db --printers 500 --writeoffs 20000 --transfers 5000
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from src import database
+from src.migrations import backfill_writeoff_models, rebuild_writeoff_monthly
+
+# масштаб: (принтеры, списания, перемещения)
+SCALES = {
+    "1k": (1_000, 200_000, 100_000),
+    "10k": (10_000, 1_000_000, 500_000),
+    "100k": (100_000, 5_000_000, 2_000_000),
+}
+
+HISTORY_START = datetime.datetime(2022, 1, 1)
+HISTORY_END = datetime.datetime(2025, 6, 1)
+BATCH = 50_000
+
+
+def _models(prefix, printers):
+    return [f"{prefix}-{i:03d}" for i in range(max(40, printers // 250))]
+
+
+def _timestamps(rnd, count):
+    """Случайные моменты в окне истории, как строки 'YYYY-MM-DD HH:MM:SS'."""
+    span = int((HISTORY_END - HISTORY_START).total_seconds())
+    for _ in range(count):
+        yield (HISTORY_START + datetime.timedelta(seconds=rnd.randrange(span))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _insert_batched(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def build_office_db(db_file, printers, writeoffs, transfers=0, seed=42):
+    """Создать office.db с заданным числом принтеров и записей истории.
+
+    Схема создаётся через database.init_db(), поэтому совпадает с рабочей,
+    включая индексы миграций; агрегат writeoff_monthly пересобирается в конце.
+    Примерно 10% принтеров не имеют ни одного списания, 2% — без кабинета,
+    6% — без модели картриджа.
+    """
+    if os.path.exists(db_file):
+        raise FileExistsError(db_file)
+    previous = database.DB_FILE
+    database.DB_FILE = db_file
+    try:
+        database.init_db()
+    finally:
+        database.close_pool()
+        database.DB_FILE = previous
+
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("BEGIN")
+
+    users = [f"operator{i:02d}" for i in range(20)]
+    conn.executemany(
+        "INSERT INTO users (login, password, role) VALUES (?, ?, ?)",
+        [(login, database.hash_password(login), "operator") for login in users]
+    )
+    cabinets = max(1, printers // 10)
+    conn.executemany("INSERT INTO cabinets (name) VALUES (?)",
+                     [(f"Кабинет {i:05d}",) for i in range(cabinets)])
+
+    cartridges = _models("CRG", printers)
+    drums = _models("DRM", printers)
+    printer_rows = []
+    for i in range(printers):
+        min_cart = rnd.choice((0, 1, 2, 3))
+        min_drum = rnd.choice((0, 0, 1))
+        printer_rows.append((
+            rnd.randint(1, cabinets) if i % 50 else None,
+            f"Принтер {i:06d}",
+            rnd.choice(cartridges) if i % 17 else None,
+            rnd.choice(drums),
+            rnd.randint(-1, 5) if i % 97 == 0 else rnd.randint(0, 5),
+            rnd.randint(0, 3),
+            min_cart,
+            min_drum,
+        ))
+    conn.executemany('''
+        INSERT INTO printers (cabinet_id, name, cartridge, drum, cartridge_amount,
+                              drum_amount, min_cartridge_amount, min_drum_amount)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', printer_rows)
+
+    conn.executemany(
+        "INSERT INTO storage (model, type, amount) VALUES (?, ?, ?)",
+        [(m, "cartridge", rnd.randint(0, 50)) for m in cartridges]
+        + [(m, "drum", rnd.randint(0, 20)) for m in drums]
+    )
+
+    # Часть принтеров без единой замены — для проверки LEFT JOIN в отчётах
+    active = max(1, printers * 9 // 10)
+    _insert_batched(conn, '''
+        INSERT INTO writeoff_history (printer_id, writeoff_cartridge, writeoff_drum, datetime, username)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        (rnd.randint(1, active), rnd.choice((0, 1, 1, 2)), rnd.choice((0, 0, 0, 1)),
+         ts, rnd.choice(users))
+        for ts in _timestamps(rnd, writeoffs)
+    ))
+
+    def transfer_rows():
+        for ts in _timestamps(rnd, transfers):
+            item_type = "cartridge" if rnd.random() < 0.75 else "drum"
+            model = rnd.choice(cartridges if item_type == "cartridge" else drums)
+            if rnd.random() < 0.3:
+                places = ("внешние поставки", "склад")
+            else:
+                places = ("склад", printer_rows[rnd.randrange(printers)][1])
+            yield (ts, rnd.choice(users), model, item_type, rnd.randint(1, 10)) + places
+
+    _insert_batched(conn, '''
+        INSERT INTO storage_transfer_history
+            (datetime, username, model, type, amount, from_place, to_place)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', transfer_rows())
+
+    backfill_writeoff_models(conn)
+    rebuild_writeoff_monthly(conn)
+    conn.commit()
+    conn.close()
+
+
+def dataset_info(db_file):
+    """Размеры таблиц готовой базы — для шапки отчёта."""
+    conn = sqlite3.connect(db_file)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("printers", "cabinets", "storage", "writeoff_history",
+                              "storage_transfer_history", "writeoff_monthly")}
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", help="путь к создаваемой базе")
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--printers", type=int)
+    parser.add_argument("--writeoffs", type=int)
+    parser.add_argument("--transfers", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    printers, writeoffs, transfers = SCALES[args.scale]
+    printers = args.printers if args.printers is not None else printers
+    writeoffs = args.writeoffs if args.writeoffs is not None else writeoffs
+    transfers = args.transfers if args.transfers is not None else transfers
+
+    start = time.perf_counter()
+    try:
+        build_office_db(args.output, printers, writeoffs, transfers, seed=args.seed)
+    except FileExistsError:
+        print(f"ОШИБКА: {args.output} уже существует")
+        return 1
+    print(f"{args.output}: {dataset_info(args.output)}")
+    print(f"создано за {time.perf_counter() - start:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
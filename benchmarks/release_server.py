@@ -0,0 +1,134 @@
+"""
+Локальная замена GitHub для тестов и замеров autoupdate.
+
+ReleaseServer отдаёт файлы релиза по HTTP с поддержкой Range и ETag и
+умеет обрывать соединение посреди файла, игнорировать Range и отвечать
+медленно; make_archive собирает zip-архив релиза. Используется в
+tests/ (фикстура release_server) и в benchmarks/bench_delta_update.py.
+"""
+
+import hashlib
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ReleaseServer:
+    """
+    Локальная замена GitHub: отдаёт файлы из files по /files/<имя>.
+
+    drop_after — сколько байт отдать до обрыва соединения (для следующих
+    drops запросов), ignore_range — отвечать 200 на запросы с Range,
+    delay — задержка ответа в секундах. Счётчики sent и requests
+    показывают, сколько реально передано.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.drop_after = None
+        self.drops = 0
+        self.ignore_range = False
+        self.delay = 0
+        self.sent = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self._httpd.server_port}/files/{name}"
+
+    def release(self, tag, names):
+        """JSON релиза в формате GitHub API для перечисленных файлов."""
+        return {
+            "tag_name": tag,
+            "assets": [
+                {"name": name, "size": len(self.files[name]), "browser_download_url": self.url(name)}
+                for name in names
+            ],
+        }
+
+    def reset_counters(self):
+        with self._lock:
+            self.sent = 0
+            self.requests = []
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                name = self.path.rpartition("/")[2]
+                data = server.files.get(name)
+                range_header = self.headers.get("Range")
+                with server._lock:
+                    server.requests.append((name, range_header))
+                if server.delay:
+                    time.sleep(server.delay)
+                if data is None:
+                    self.send_error(404)
+                    return
+                etag = '"%s"' % hashlib.sha1(data).hexdigest()[:16]
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                start, end = 0, len(data) - 1
+                if range_header and not server.ignore_range:
+                    first, _, last = range_header.split("=")[1].partition("-")
+                    start = int(first)
+                    end = min(int(last), end) if last else end
+                    if start >= len(data):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(data)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                else:
+                    self.send_response(200)
+                body = data[start:end + 1]
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                with server._lock:
+                    drop = server.drops > 0 and server.drop_after is not None
+                    if drop:
+                        server.drops -= 1
+                if drop:
+                    body = body[:server.drop_after]
+                    self.close_connection = True
+                try:
+                    for offset in range(0, len(body), 64 * 1024):
+                        chunk = body[offset:offset + 64 * 1024]
+                        self.wfile.write(chunk)
+                        with server._lock:
+                            server.sent += len(chunk)
+                except ConnectionError:
+                    self.close_connection = True  # клиент сам прервал загрузку
+
+        return Handler
+
+
+def make_archive(path, files):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, data in files.items():
+            z.writestr(name, data)
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,367 @@
+"""
+Набор замеров для всех методов менеджеров src.database и функций analytics.
+
+Генерирует (или берёт готовую) синтетическую office.db, прогоняет каждый
+сценарий несколько раз и сохраняет JSON-отчёт; два отчёта с разных
+коммитов можно сравнить:
+
+    python -m benchmarks.run_suite --scale 10k --output bench_10k.json
+    python -m benchmarks.run_suite --db office_10k.db --only "HistoryManager.*"
+    python -m benchmarks.run_suite --compare old.json new.json [--threshold 0.10]
+
+Кэш запросов по умолчанию выключен (измеряется сам SQL); --cache включает
+его, тогда повторные чтения показывают время попадания в кэш. Сценарии
+analytics пропускаются, если pandas/matplotlib не установлены; графики
+строятся с бэкендом Agg (без Qt и дисплея). Ошибка, которую функция
+analytics перехватила и записала в журнал, считается ошибкой сценария.
+"""
+
+import argparse
+import contextlib
+import datetime
+import fnmatch
+import io
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from src import database
+from src.database import UserManager, CabinetManager, PrinterManager, StorageManager, HistoryManager
+from .datagen import SCALES, build_office_db, dataset_info
+
+REPORT_FORMAT = 1
+
+
+class Scenario:
+    """Замеряемый вызов; setup() готовит аргументы и в замер не входит."""
+
+    def __init__(self, name, fn, setup=None, skip=None):
+        self.name = name
+        self.fn = fn
+        self.setup = setup or (lambda: ())
+        self.skip = skip
+
+
+def _sample(db_file):
+    """Реальные значения из базы для параметров сценариев."""
+    conn = sqlite3.connect(db_file)
+    try:
+        printer_id, cartridge = conn.execute(
+            "SELECT id, cartridge FROM printers WHERE cartridge IS NOT NULL ORDER BY id LIMIT 1"
+        ).fetchone()
+        cabinet_id = conn.execute("SELECT MIN(id) FROM cabinets").fetchone()[0]
+        return {"printer_id": printer_id, "cartridge": cartridge, "cabinet_id": cabinet_id}
+    finally:
+        conn.close()
+
+
+def manager_scenarios(sample):
+    counter = itertools.count()
+
+    def unique(prefix):
+        return f"{prefix} bench {next(counter)}"
+
+    def new_user():
+        login = unique("user")
+        UserManager.add_user(login, "secret", "viewer")
+        return next(u["id"] for u in UserManager.get_all_users.uncached() if u["login"] == login),
+
+    def new_cabinet():
+        name = unique("cabinet")
+        CabinetManager.add_cabinet(name)
+        return next(c["id"] for c in CabinetManager.get_all_cabinets.uncached() if c["name"] == name),
+
+    def printer_to_delete():
+        name = unique("printer")
+        PrinterManager.add_printer(sample["cabinet_id"], name)
+        with database.get_db_connection() as conn:
+            return conn.execute("SELECT id FROM printers WHERE name = ?", (name,)).fetchone()[0],
+
+    def stocked():
+        StorageManager.add_to_storage(sample["cartridge"], "cartridge", 1, "bench")
+        return sample["cartridge"], "cartridge", 1, sample["printer_id"], "bench"
+
+    last_page = lambda rows: (rows[-1]["datetime"], rows[-1]["id"])
+
+    return [
+        Scenario("UserManager.authenticate", UserManager.authenticate, lambda: ("admin", "admin")),
+        Scenario("UserManager.get_all_users", UserManager.get_all_users),
+        Scenario("UserManager.add_user", UserManager.add_user, lambda: (unique("user"), "secret", "viewer")),
+        Scenario("UserManager.update_user", UserManager.update_user,
+                 lambda: new_user() + (unique("user"), "secret", "operator")),
+        Scenario("UserManager.delete_user", UserManager.delete_user, new_user),
+        Scenario("CabinetManager.get_all_cabinets", CabinetManager.get_all_cabinets),
+        Scenario("CabinetManager.add_cabinet", CabinetManager.add_cabinet, lambda: (unique("cabinet"),)),
+        Scenario("CabinetManager.update_cabinet", CabinetManager.update_cabinet,
+                 lambda: new_cabinet() + (unique("cabinet"),)),
+        Scenario("CabinetManager.delete_cabinet", CabinetManager.delete_cabinet, new_cabinet),
+        Scenario("PrinterManager.get_all_printers", PrinterManager.get_all_printers),
+        Scenario("PrinterManager.add_printer", PrinterManager.add_printer,
+                 lambda: (sample["cabinet_id"], unique("printer"), sample["cartridge"], "")),
+        Scenario("PrinterManager.update_printer",
+                 lambda pid: PrinterManager.update_printer(pid, min_cartridge_amount=2),
+                 lambda: (sample["printer_id"],)),
+        Scenario("PrinterManager.delete_printer", PrinterManager.delete_printer, printer_to_delete),
+        Scenario("PrinterManager.get_low_stock_warnings", PrinterManager.get_low_stock_warnings),
+        Scenario("StorageManager.get_all_storage", StorageManager.get_all_storage),
+        Scenario("StorageManager.add_to_storage", StorageManager.add_to_storage,
+                 lambda: (sample["cartridge"], "cartridge", 1, "bench")),
+        Scenario("StorageManager.transfer_to_printer", StorageManager.transfer_to_printer, stocked),
+        Scenario("StorageManager.get_compatible_printers", StorageManager.get_compatible_printers,
+                 lambda: (sample["cartridge"], "cartridge")),
+        Scenario("StorageManager.get_storage_summary", StorageManager.get_storage_summary),
+        Scenario("StorageManager.set_storage_amount", StorageManager.set_storage_amount,
+                 lambda: (sample["cartridge"], "cartridge", 10)),
+        Scenario("StorageManager.add_writeoff_record", StorageManager.add_writeoff_record,
+                 lambda: (sample["printer_id"], 1, 0, "bench")),
+        Scenario("HistoryManager.get_transfer_history", HistoryManager.get_transfer_history),
+        Scenario("HistoryManager.get_writeoff_history", HistoryManager.get_writeoff_history),
+        Scenario("HistoryManager.get_transfer_history_page", HistoryManager.get_transfer_history_page),
+        Scenario("HistoryManager.get_transfer_history_page[deep]",
+                 lambda after: HistoryManager.get_transfer_history_page(after=after),
+                 lambda: (last_page(HistoryManager.get_transfer_history_page(limit=5000)),)),
+        Scenario("HistoryManager.get_writeoff_history_page", HistoryManager.get_writeoff_history_page),
+        Scenario("HistoryManager.get_writeoff_history_page[filtered]",
+                 lambda: HistoryManager.get_writeoff_history_page(
+                     date_from="2024-01-01", date_to="2024-12-31", model=sample["cartridge"])),
+        Scenario("HistoryManager.iter_transfer_history",
+                 lambda: sum(1 for _ in HistoryManager.iter_transfer_history())),
+        Scenario("HistoryManager.iter_writeoff_history",
+                 lambda: sum(1 for _ in HistoryManager.iter_writeoff_history())),
+        Scenario("database.rebuild_monthly_usage", database.rebuild_monthly_usage),
+    ]
+
+
+def analytics_scenarios(sample, workdir):
+    try:
+        import analytics
+    except ImportError as e:
+        reason = f"analytics недоступна: {e}"
+        return [Scenario(f"analytics.{name}", None, skip=reason) for name in (
+            "get_cartridge_usage_by_month", "get_top5_cartridge_models", "get_cartridge_forecast",
+            "get_cartridge_change_report", "export_cartridge_usage_to_excel", "plot_cartridge_usage",
+            "plot_drum_usage", "top5_cartridge_models", "top5_drum_models", "forecast_next_month",
+            "export_drum_usage_to_excel", "save_cartridge_usage_plot", "save_drum_usage_plot",
+            "cartridge_change_report",
+        )]
+    analytics.DB_FILE = database.DB_FILE
+    # Графики только сохраняются в файл: Agg не требует Qt и дисплея, и замер
+    # одинаков на любой машине (analytics выбирает QtAgg для окна приложения)
+    analytics._pyplot = _pyplot_agg
+    interactive = "открывает окно (plt.show)"
+    usage = lambda: (analytics.get_cartridge_usage_by_month(),)
+    return [
+        Scenario("analytics.get_cartridge_usage_by_month", analytics.get_cartridge_usage_by_month),
+        Scenario("analytics.get_top5_cartridge_models", analytics.get_top5_cartridge_models),
+        Scenario("analytics.get_cartridge_forecast", analytics.get_cartridge_forecast,
+                 lambda: (sample["cartridge"],)),
+        Scenario("analytics.get_cartridge_change_report", analytics.get_cartridge_change_report),
+        Scenario("analytics.export_cartridge_usage_to_excel",
+                 lambda df: analytics.export_cartridge_usage_to_excel(df, os.path.join(workdir, "usage.xlsx")),
+                 usage),
+        Scenario("analytics.plot_cartridge_usage", None, skip=interactive),
+        Scenario("analytics.plot_drum_usage", None, skip=interactive),
+        Scenario("analytics.top5_cartridge_models", analytics.top5_cartridge_models),
+        Scenario("analytics.top5_drum_models", analytics.top5_drum_models),
+        Scenario("analytics.forecast_next_month", analytics.forecast_next_month,
+                 lambda: (sample["cartridge"], "cartridge")),
+        Scenario("analytics.export_drum_usage_to_excel", analytics.export_drum_usage_to_excel),
+        Scenario("analytics.save_cartridge_usage_plot", analytics.save_cartridge_usage_plot),
+        Scenario("analytics.save_drum_usage_plot", analytics.save_drum_usage_plot),
+        Scenario("analytics.cartridge_change_report", analytics.cartridge_change_report),
+    ]
+
+
+def _pyplot_agg():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+class _ErrorLog(logging.Handler):
+    """Ошибки, которые сценарий записал в журнал вместо исключения."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def run_scenario(scenario, repeat, warmup):
+    if scenario.skip:
+        return {"skipped": scenario.skip}
+    timings = []
+    # CLI-функции analytics перехватывают исключения и пишут их в журнал:
+    # такой вызов — ошибка, а не замер
+    errors = _ErrorLog()
+    logging.getLogger().addHandler(errors)
+    try:
+        for round_ in range(warmup + repeat):
+            args = scenario.setup()
+            # CLI-функции analytics печатают результат — в замер вывод не попадает
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                scenario.fn(*args)
+                elapsed = time.perf_counter() - start
+            if errors.messages:
+                return {"error": errors.messages[0]}
+            if round_ >= warmup:
+                timings.append(elapsed * 1000)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        logging.getLogger().removeHandler(errors)
+    return {
+        "rounds": len(timings),
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    workdir = tempfile.mkdtemp(prefix="printerguard-bench-")
+    try:
+        db_file = os.path.join(workdir, "office.db")
+        if args.db:
+            if not os.path.exists(args.db):
+                print(f"генерация {args.db} ({args.scale})…")
+                build_office_db(args.db, *SCALES[args.scale], seed=args.seed)
+            # Сценарии записи меняют базу — работаем с копией
+            shutil.copyfile(args.db, db_file)
+            source = os.path.abspath(args.db)
+        else:
+            print(f"генерация базы ({args.scale})…")
+            build_office_db(db_file, *SCALES[args.scale], seed=args.seed)
+            source = None
+
+        database.DB_FILE = db_file
+        database.init_db()
+        database.configure_cache(enabled=args.cache)
+        sample = _sample(db_file)
+        scenarios = manager_scenarios(sample) + analytics_scenarios(sample, workdir)
+        if args.only:
+            scenarios = [s for s in scenarios if any(fnmatch.fnmatch(s.name, p) for p in args.only)]
+        if args.skip:
+            scenarios = [s for s in scenarios if not any(fnmatch.fnmatch(s.name, p) for p in args.skip)]
+
+        report = {
+            "format": REPORT_FORMAT,
+            "meta": {
+                "commit": _git_commit(),
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "scale": None if source else args.scale,
+                "source_db": source,
+                "seed": args.seed,
+                "dataset": dataset_info(db_file),
+                "repeat": args.repeat,
+                "warmup": args.warmup,
+                "cache": args.cache,
+            },
+            "results": {},
+        }
+        # Текущий каталог — временный: CLI-функции analytics пишут файлы в cwd
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for scenario in scenarios:
+                result = run_scenario(scenario, args.repeat, args.warmup)
+                report["results"][scenario.name] = result
+                print(f"{scenario.name:55} {_format_result(result)}")
+        finally:
+            os.chdir(cwd)
+        return report
+    finally:
+        database.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _format_result(result):
+    if "skipped" in result:
+        return f"пропущен: {result['skipped']}"
+    if "error" in result:
+        return f"ОШИБКА: {result['error']}"
+    return f"{result['median_ms']:10.2f} мс (min {result['min_ms']:.2f}, max {result['max_ms']:.2f})"
+
+
+def compare(old_file, new_file, threshold):
+    """Сравнить медианы двух отчётов; код возврата 1 при замедлении больше порога."""
+    with open(old_file, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_file, encoding="utf-8") as f:
+        new = json.load(f)
+    if old["meta"].get("dataset") != new["meta"].get("dataset"):
+        print("Внимание: отчёты сняты на разных наборах данных")
+    print(f"{'сценарий':55} {old['meta'].get('commit') or 'old':>12} {new['meta'].get('commit') or 'new':>12}  изменение")
+    regressions = 0
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        before = old["results"].get(name, {}).get("median_ms")
+        after = new["results"].get(name, {}).get("median_ms")
+        if before is None or after is None:
+            cell = lambda v: f"{v:12.2f}" if v is not None else f"{'—':>12}"
+            print(f"{name:55} {cell(before)} {cell(after)}")
+            continue
+        change = (after - before) / before if before else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  ЗАМЕДЛЕНИЕ"
+            regressions += 1
+        print(f"{name:55} {before:12.2f} {after:12.2f}  {change:+8.1%}{mark}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--db", help="база для замеров; создаётся, если её нет (исходный файл не меняется)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="не выключать кэш запросов")
+    parser.add_argument("--only", action="append", help="шаблон имён сценариев (fnmatch)")
+    parser.add_argument("--skip", action="append", help="исключить сценарии по шаблону")
+    parser.add_argument("--output", help="куда записать JSON-отчёт")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два отчёта")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="допустимое замедление медианы при --compare (доля)")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+
+    report = run_suite(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"отчёт сохранён в {args.output}")
+    return 1 if any("error" in r for r in report["results"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
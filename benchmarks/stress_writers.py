@@ -0,0 +1,106 @@
+"""
+Нагрузочная проверка конкурентной записи в один файл office.db.
+
+Запускает N процессов-писателей (списание и выдача со склада, как делают
+операторы) и один читающий процесс, затем проверяет, что ни одна операция
+не упала с "database is locked" и что итоговые остатки сходятся.
+
+    python -m benchmarks.stress_writers [--writers 8] [--ops 200] [--journal-mode WAL]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from src import database
+
+MODEL = "Stress 725"
+
+
+def _setup(db_file, journal_mode):
+    database.DB_FILE = db_file
+    database.configure_pragmas(journal_mode=journal_mode)
+
+
+def writer(db_file, journal_mode, printer_id, ops, results):
+    _setup(db_file, journal_mode)
+    failures = 0
+    for _ in range(ops):
+        if not database.StorageManager.transfer_to_printer(MODEL, "cartridge", 1, printer_id, "stress"):
+            failures += 1
+        if not database.StorageManager.add_writeoff_record(printer_id, 1, 0, "stress"):
+            failures += 1
+    results.put(failures)
+
+
+def reader(db_file, journal_mode, stop, results):
+    _setup(db_file, journal_mode)
+    reads = 0
+    errors = 0
+    while not stop.is_set():
+        try:
+            database.PrinterManager.get_all_printers()
+            database.StorageManager.get_storage_summary()
+            reads += 1
+        except database.DatabaseError:
+            errors += 1
+    results.put((reads, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200, help="операций на писателя")
+    parser.add_argument("--journal-mode", default=database.PRAGMA_PROFILE["journal_mode"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "office.db")
+        _setup(db_file, args.journal_mode)
+        database.init_db()
+        database.CabinetManager.add_cabinet("Stress")
+        cabinet_id = database.CabinetManager.get_all_cabinets()[0]["id"]
+        for i in range(args.writers):
+            database.PrinterManager.add_printer(cabinet_id, f"P{i}", MODEL, "")
+        printer_ids = [p["id"] for p in database.PrinterManager.get_all_printers()]
+        stock = args.writers * args.ops
+        database.StorageManager.add_to_storage(MODEL, "cartridge", stock, "stress")
+        database.close_pool()
+
+        results = multiprocessing.Queue()
+        reader_results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=writer,
+                                         args=(db_file, args.journal_mode, pid, args.ops, results))
+                 for pid in printer_ids]
+        rd = multiprocessing.Process(target=reader, args=(db_file, args.journal_mode, stop, reader_results))
+        start = time.perf_counter()
+        rd.start()
+        for p in procs:
+            p.start()
+        failures = sum(results.get() for _ in procs)
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        reads, read_errors = reader_results.get()
+        rd.join()
+
+        summary = database.StorageManager.get_storage_summary()
+        total_ops = 2 * args.writers * args.ops
+        print(f"journal_mode:     {args.journal_mode}")
+        print(f"писателей:        {args.writers}, операций: {total_ops} за {elapsed:.2f} с "
+              f"({total_ops / elapsed:.0f} оп/с)")
+        print(f"ошибок записи:    {failures}")
+        print(f"чтений:           {reads}, ошибок чтения: {read_errors}")
+        print(f"остаток на складе: {summary['cartridges']} (ожидалось 0)")
+        database.close_pool()
+        ok = failures == 0 and read_errors == 0 and summary["cartridges"] == 0
+        return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,9 @@ PyInstaller.__main__.run([
     '--windowed',
     '--name=ver1.0.B5',
     '--add-data=office.db;.',  # база данных (для Windows, для Linux замените ; на :)
+    # analytics и autoupdate импортируются внутри функций (ленивая загрузка)
+    '--hidden-import=analytics',
+    '--hidden-import=autoupdate',
     '--hidden-import=openpyxl',
     '--hidden-import=xlsxwriter',
     '--hidden-import=matplotlib',
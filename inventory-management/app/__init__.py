@@ -1,5 +1,6 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from config import Config
@@ -8,11 +9,48 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 migrate = Migrate()
 
+def engine_options(config):
+    """Параметры движка SQLAlchemy из настроек DB_* и SQLITE_*.
+
+    Значения из SQLALCHEMY_ENGINE_OPTIONS имеют приоритет.
+    """
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options = {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT']}}
+    else:
+        options = {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': True
+        }
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+def configure_sqlite(app):
+    """Включить WAL для файловой базы SQLite на каждом новом соединении"""
+    with app.app_context():
+        engine = db.engine
+    if engine.url.get_backend_name() != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if app.config['SQLITE_WAL']:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            # В режиме WAL NORMAL не теряет согласованность, но реже делает fsync
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(app.config["SQLITE_BUSY_TIMEOUT"] * 1000)}')
+        cursor.close()
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     
     db.init_app(app)
+    configure_sqlite(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
     
@@ -21,6 +59,15 @@ def create_app(config_class=Config):
     
     from app.models import User, Room, Printer, Supply, Stock, Movement, History
     
+    from app import audit, cache, notifications
+    audit.init_app(app)
+    cache.init_app(app)
+    notifications.init_app(app)
+    
+    if app.config['METRICS_ENABLED']:
+        from app import metrics
+        metrics.init_app(app)
+    
     from app.auth import bp as auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
     
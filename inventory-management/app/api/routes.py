@@ -1,15 +1,42 @@
-from flask import jsonify, request, current_app
+import json
+import time
+from flask import jsonify, request, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from app import db
+from app import audit
 from app.api import bp
+from app.cache import ALL_GROUPS, cached_response, mark_changed
+from app.pagination import (PaginationError, date_range, int_arg, is_paged_request,
+                            keyset_page, page_json)
+from app.notifications import get_feed, low_stock_snapshot, notify_stock_changed
 from app.auth.routes import operator_required, admin_required
 from app.models import (User, Room, Printer, PrinterModel, Supply, Stock, 
                        Movement, History, PrinterSupply, MovementType, SupplyType)
+from collections import defaultdict
 from datetime import datetime
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+# Кэшированные списки, которые устаревают после действия
+ACTION_CHANGES = {
+    'create_room': ('rooms',),
+    'create_printer_model': ('printer-models',),
+    'create_printer': ('printers', 'rooms', 'printer-models'),
+    'create_supply': ('supplies',),
+    'receipt_stock': ('stock', 'supplies'),
+    'install_supply': ('stock', 'supplies', 'printers'),
+    'dispose_stock': ('stock', 'supplies', 'printers'),
+}
 
 def log_action(action, entity_type=None, entity_id=None, description=None):
-    """Вспомогательная функция для логирования действий"""
-    history = History(
+    """Вспомогательная функция для логирования действий.
+
+    Заодно отмечает кэшированные списки, которые станут неактуальны после
+    коммита (для неизвестного действия — все).
+    """
+    mark_changed(ACTION_CHANGES.get(action, ALL_GROUPS))
+    audit.record(
         user_id=current_user.id,
         action=action,
         entity_type=entity_type,
@@ -17,21 +44,33 @@ def log_action(action, entity_type=None, entity_id=None, description=None):
         description=description,
         ip_address=request.remote_addr
     )
-    db.session.add(history)
+
+@bp.errorhandler(PaginationError)
+def pagination_error(error):
+    return jsonify({'error': str(error)}), 400
+
+def printer_counts(column):
+    """Подзапрос: число принтеров, сгруппированное по column (room_id, model_id)"""
+    return db.session.query(
+        column.label('key'), func.count(Printer.id).label('printer_count')
+    ).group_by(column).subquery()
 
 # API для кабинетов
 @bp.route('/rooms', methods=['GET'])
 @login_required
+@cached_response('rooms')
 def get_rooms():
-    rooms = Room.query.all()
+    counts = printer_counts(Printer.room_id)
+    rooms = db.session.query(Room, func.coalesce(counts.c.printer_count, 0)) \
+        .outerjoin(counts, counts.c.key == Room.id).all()
     return jsonify([{
         'id': r.id,
         'number': r.number,
         'name': r.name,
         'floor': r.floor,
         'building': r.building,
-        'printer_count': r.printers.count()
-    } for r in rooms])
+        'printer_count': printer_count
+    } for r, printer_count in rooms])
 
 @bp.route('/rooms', methods=['POST'])
 @operator_required
@@ -51,14 +90,17 @@ def create_room():
 # API для моделей принтеров
 @bp.route('/printer-models', methods=['GET'])
 @login_required
+@cached_response('printer-models')
 def get_printer_models():
-    models = PrinterModel.query.all()
+    counts = printer_counts(Printer.model_id)
+    models = db.session.query(PrinterModel, func.coalesce(counts.c.printer_count, 0)) \
+        .outerjoin(counts, counts.c.key == PrinterModel.id).all()
     return jsonify([{
         'id': m.id,
         'manufacturer': m.manufacturer,
         'model': m.model,
-        'printer_count': m.printers.count()
-    } for m in models])
+        'printer_count': printer_count
+    } for m, printer_count in models])
 
 @bp.route('/printer-models', methods=['POST'])
 @operator_required
@@ -77,9 +119,36 @@ def create_printer_model():
 # API для принтеров
 @bp.route('/printers', methods=['GET'])
 @login_required
+@cached_response('printers')
 def get_printers():
-    printers = Printer.query.all()
-    return jsonify([{
+    query = Printer.query.options(
+        joinedload(Printer.printer_model), joinedload(Printer.room)
+    )
+    if request.args.get('status'):
+        query = query.filter(Printer.status == request.args['status'])
+    for arg, column in (('room', Printer.room_id), ('model', Printer.model_id)):
+        value = int_arg(arg)
+        if value is not None:
+            query = query.filter(column == value)
+    
+    if is_paged_request():
+        page = keyset_page(query, [Printer.id])
+        return jsonify(page_json(page, serialize_printers(page.items)))
+    return jsonify(serialize_printers(query.order_by(Printer.id).all()))
+
+def serialize_printers(printers):
+    # current_supplies — dynamic-связь, её нельзя подгрузить через options();
+    # установленные расходники принтеров читаются одним запросом
+    supplies_by_printer = defaultdict(list)
+    supplies = PrinterSupply.query.options(
+        joinedload(PrinterSupply.stock).joinedload(Stock.supply)
+    ).order_by(PrinterSupply.id)
+    # Для страницы — только её принтеры; полный список читает таблицу целиком
+    if len(printers) <= current_app.config['API_MAX_PAGE_SIZE']:
+        supplies = supplies.filter(PrinterSupply.printer_id.in_([p.id for p in printers]))
+    for ps in supplies:
+        supplies_by_printer[ps.printer_id].append(ps)
+    return [{
         'id': p.id,
         'inventory_number': p.inventory_number,
         'serial_number': p.serial_number,
@@ -91,8 +160,8 @@ def get_printers():
             'id': ps.id,
             'supply': ps.stock.supply.name,
             'installed_date': ps.installed_date.isoformat()
-        } for ps in p.current_supplies]
-    } for p in printers])
+        } for ps in supplies_by_printer[p.id]]
+    } for p in printers]
 
 @bp.route('/printers', methods=['POST'])
 @operator_required
@@ -117,6 +186,7 @@ def create_printer():
 # API для расходников
 @bp.route('/supplies', methods=['GET'])
 @login_required
+@cached_response('supplies')
 def get_supplies():
     supplies = Supply.query.all()
     return jsonify([{
@@ -150,50 +220,139 @@ def create_supply():
 # API для склада
 @bp.route('/stock', methods=['GET'])
 @login_required
+@cached_response('stock')
 def get_stock():
-    stock = Stock.query.filter_by(status='available').all()
-    return jsonify([{
+    # По умолчанию — только единицы на складе; status=all — все
+    status = request.args.get('status', 'available')
+    query = Stock.query.options(joinedload(Stock.supply))
+    if status != 'all':
+        query = query.filter(Stock.status == status)
+    supply_id = int_arg('supply')
+    if supply_id is not None:
+        query = query.filter(Stock.supply_id == supply_id)
+    query = query.filter(*date_range(Stock.receipt_date))
+    
+    if is_paged_request():
+        page = keyset_page(query, [Stock.receipt_date, Stock.id], descending=True)
+        return jsonify(page_json(page, serialize_stock(page.items)))
+    return jsonify(serialize_stock(query.order_by(Stock.id).all()))
+
+def serialize_stock(stock):
+    return [{
         'id': s.id,
         'supply': s.supply.name,
         'supply_code': s.supply.code,
         'serial_number': s.serial_number,
+        'status': s.status,
         'receipt_date': s.receipt_date.isoformat(),
         'notes': s.notes
-    } for s in stock])
+    } for s in stock]
 
-@bp.route('/stock/receipt', methods=['POST'])
-@operator_required
-def receipt_stock():
-    data = request.get_json()
-    items = []
+def expand_receipt_lines(lines):
+    """Развернуть строки прихода в список единиц (supply_id, serial_number, notes).
+
+    Строка задаёт supply_id и одно из: quantity (без серийных номеров),
+    serials (список номеров) или serial_range {prefix, start, end, width} —
+    номера prefix + start..end, дополненные нулями до width цифр.
+    """
+    units = []
+    for line in lines:
+        supply_id = int(line['supply_id'])
+        notes = line.get('notes')
+        if 'serial_range' in line:
+            r = line['serial_range']
+            start, end = int(r['start']), int(r['end'])
+            if end < start:
+                raise ValueError(f'Пустой диапазон серийных номеров: {start}-{end}')
+            prefix, width = r.get('prefix', ''), int(r.get('width', 0))
+            units.extend((supply_id, f'{prefix}{n:0{width}d}', notes) for n in range(start, end + 1))
+        elif 'serials' in line:
+            units.extend((supply_id, serial, notes) for serial in line['serials'])
+        else:
+            quantity = int(line.get('quantity', 1))
+            if quantity < 1:
+                raise ValueError(f'Некорректное количество: {quantity}')
+            units.extend((supply_id, None, notes) for _ in range(quantity))
+    return units
+
+def insert_receipt(units):
+    """Принять единицы на склад пакетной вставкой; возвращает id новых Stock.
+
+    Stock вставляются пакетами с RETURNING id (insertmanyvalues, нужен
+    SQLAlchemy 2.0), Movement — одним executemany, счётчики остатков —
+    одним UPDATE на расходник. Порядок строк RETURNING
+    не важен: у каждой новой единицы ровно одно движение прихода.
+    Фиксация транзакции — за вызывающим.
+    """
+    now = datetime.utcnow()
+    stock_ids = db.session.scalars(
+        insert(Stock).returning(Stock.id),
+        [{'supply_id': supply_id, 'serial_number': serial, 'notes': notes,
+          'status': 'available', 'receipt_date': now}
+         for supply_id, serial, notes in units]
+    ).all()
+    db.session.execute(insert(Movement), [{
+        'stock_id': stock_id,
+        'type': MovementType.RECEIPT,
+        'user_id': current_user.id,
+        'timestamp': now,
+        'notes': 'Поступление на склад'
+    } for stock_id in stock_ids])
     
-    for item_data in data['items']:
-        stock = Stock(
-            supply_id=item_data['supply_id'],
-            serial_number=item_data.get('serial_number'),
-            notes=item_data.get('notes')
-        )
-        db.session.add(stock)
-        items.append(stock)
-        
-        # Создаем движение
-        movement = Movement(
-            stock_id=stock.id,
-            type=MovementType.RECEIPT,
-            user_id=current_user.id,
-            notes=f"Поступление на склад"
-        )
-        db.session.add(movement)
+    received = defaultdict(int)
+    for supply_id, _, _ in units:
+        received[supply_id] += 1
+    for supply_id, count in received.items():
+        Supply.adjust_available(supply_id, count)
+    return stock_ids
+
+def receive_units(units):
+    """Общая часть эндпоинтов прихода: проверки, вставка, журнал, ответ"""
+    if not units:
+        return jsonify({'error': 'Нет позиций для прихода'}), 400
+    limit = current_app.config['RECEIPT_MAX_ITEMS']
+    if len(units) > limit:
+        return jsonify({'error': f'Слишком много позиций за один приход (максимум {limit})'}), 413
+    supply_ids = {supply_id for supply_id, _, _ in units}
+    known = {id_ for (id_,) in db.session.query(Supply.id).filter(Supply.id.in_(supply_ids))}
+    if supply_ids - known:
+        return jsonify({'error': f'Неизвестные расходники: {sorted(supply_ids - known)}'}), 400
     
-    log_action('receipt_stock', None, None, 
-               f'Поступление на склад: {len(items)} позиций')
-    db.session.commit()
+    try:
+        stock_ids = insert_receipt(units)
+        log_action('receipt_stock', None, None, 
+                   f'Поступление на склад: {len(stock_ids)} позиций')
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Серийный номер уже есть на складе'}), 409
+    notify_stock_changed()
     
     return jsonify({
-        'message': f'Принято на склад {len(items)} позиций',
-        'items': [item.id for item in items]
+        'message': f'Принято на склад {len(stock_ids)} позиций',
+        'items': stock_ids
     }), 201
 
+@bp.route('/stock/receipt', methods=['POST'])
+@operator_required
+def receipt_stock():
+    data = request.get_json()
+    return receive_units([
+        (int(item['supply_id']), item.get('serial_number'), item.get('notes'))
+        for item in data['items']
+    ])
+
+@bp.route('/stock/receipt/bulk', methods=['POST'])
+@operator_required
+def receipt_stock_bulk():
+    """Приход партиями: {"lines": [{"supply_id": 1, "serial_range": {...}}, ...]}"""
+    data = request.get_json()
+    try:
+        units = expand_receipt_lines(data['lines'])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Некорректная строка прихода: {e}'}), 400
+    return receive_units(units)
+
 # API для установки расходника в принтер
 @bp.route('/printers/<int:printer_id>/install-supply', methods=['POST'])
 @operator_required
@@ -206,8 +365,9 @@ def install_supply(printer_id):
     if stock.status != 'available':
         return jsonify({'error': 'Расходник недоступен'}), 400
     
-    # Обновляем статус расходника
-    stock.status = 'installed'
+    # Обновляем статус расходника (и счётчик остатка)
+    if not stock.set_status('installed'):
+        return jsonify({'error': 'Расходник недоступен'}), 400
     
     # Создаем связь принтер-расходник
     printer_supply = PrinterSupply(
@@ -229,6 +389,7 @@ def install_supply(printer_id):
     log_action('install_supply', 'Printer', printer_id, 
                f'Установлен расходник {stock.supply.name} в принтер {printer.inventory_number}')
     db.session.commit()
+    notify_stock_changed()
     
     return jsonify({'message': 'Расходник установлен'}), 200
 
@@ -243,7 +404,9 @@ def dispose_stock(stock_id):
     if stock.status == 'installed':
         PrinterSupply.query.filter_by(stock_id=stock_id).delete()
     
-    stock.status = 'used'
+    if stock.status != 'used' and not stock.set_status('used'):
+        db.session.rollback()
+        return jsonify({'error': 'Расходник изменён другим пользователем, повторите'}), 409
     
     # Создаем движение
     movement = Movement(
@@ -257,6 +420,7 @@ def dispose_stock(stock_id):
     log_action('dispose_stock', 'Stock', stock_id, 
                f'Списан расходник {stock.supply.name}')
     db.session.commit()
+    notify_stock_changed()
     
     return jsonify({'message': 'Расходник списан'}), 200
 
@@ -264,8 +428,38 @@ def dispose_stock(stock_id):
 @bp.route('/movements', methods=['GET'])
 @login_required
 def get_movements():
-    movements = Movement.query.order_by(Movement.timestamp.desc()).limit(100).all()
-    return jsonify([{
+    query = Movement.query.options(
+        joinedload(Movement.stock_item).joinedload(Stock.supply),
+        joinedload(Movement.responsible_user),
+        joinedload(Movement.printer)
+    )
+    if request.args.get('type'):
+        try:
+            query = query.filter(Movement.type == MovementType(request.args['type']))
+        except ValueError:
+            raise PaginationError('Неизвестный тип движения')
+    printer_id = int_arg('printer')
+    if printer_id is not None:
+        query = query.filter(Movement.printer_id == printer_id)
+    room_id = int_arg('room')
+    if room_id is not None:
+        query = query.filter(Movement.printer_id.in_(
+            db.session.query(Printer.id).filter(Printer.room_id == room_id)))
+    supply_id = int_arg('supply')
+    if supply_id is not None:
+        query = query.filter(Movement.stock_id.in_(
+            db.session.query(Stock.id).filter(Stock.supply_id == supply_id)))
+    query = query.filter(*date_range(Movement.timestamp))
+    
+    if is_paged_request():
+        page = keyset_page(query, [Movement.timestamp, Movement.id], descending=True)
+        return jsonify(page_json(page, serialize_movements(page.items)))
+    # Без limit/cursor — как раньше, 100 последних движений списком
+    movements = query.order_by(Movement.timestamp.desc(), Movement.id.desc()).limit(100).all()
+    return jsonify(serialize_movements(movements))
+
+def serialize_movements(movements):
+    return [{
         'id': m.id,
         'stock': {
             'id': m.stock_item.id,
@@ -277,51 +471,137 @@ def get_movements():
         'printer': m.printer.inventory_number if m.printer else None,
         'timestamp': m.timestamp.isoformat(),
         'notes': m.notes
-    } for m in movements])
+    } for m in movements]
 
 # API для получения уведомлений о низких остатках
+# ?since=<версия> превращает запрос в long-poll: ответ приходит, когда версия
+# ленты сменится (или через NOTIFICATIONS_KEEPALIVE секунд)
 @bp.route('/notifications/low-stock', methods=['GET'])
 @login_required
 def get_low_stock_notifications():
-    low_stock_supplies = Supply.query.all()
-    notifications = []
+    feed = get_feed()
+    since = request.args.get('since')
+    if since is None or not feed.subscribe():
+        # Обычный опрос (или все места ждущих подписчиков заняты) всегда читает
+        # базу и заодно обновляет ленту процесса
+        notifications = low_stock_snapshot()
+        feed.update(notifications)
+        response = jsonify(notifications)
+        response.headers['X-Low-Stock-Version'] = feed.version
+        return response
+    
+    try:
+        feed.current(low_stock_snapshot)
+        feed.refresh_if_stale(low_stock_snapshot)
+        # Соединение с базой не держим, пока ждём
+        db.session.close()
+        version, notifications = feed.wait(since, current_app.config['NOTIFICATIONS_KEEPALIVE'])
+    finally:
+        feed.unsubscribe()
+    response = jsonify(notifications)
+    response.headers['X-Low-Stock-Version'] = version
+    return response
+
+@bp.route('/notifications/stream', methods=['GET'])
+@login_required
+def stream_low_stock_notifications():
+    """Server-Sent Events: событие low-stock при каждом пересечении порога.
+
+    Поток живёт не дольше NOTIFICATIONS_STREAM_TIMEOUT секунд, после чего
+    браузер переподключается с Last-Event-ID. Если все места подписчиков в
+    процессе заняты, ответ 503: клиент переходит на опрос.
+    """
+    feed = get_feed()
+    if not feed.subscribe():
+        response = jsonify({'error': 'Слишком много подписчиков, используйте опрос'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
     
-    for supply in low_stock_supplies:
-        if supply.is_low_stock():
-            notifications.append({
-                'id': supply.id,
-                'code': supply.code,
-                'name': supply.name,
-                'current_stock': supply.get_current_stock(),
-                'min_stock': supply.min_stock,
-                'severity': 'critical' if supply.get_current_stock() == 0 else 'warning'
-            })
+    keepalive = current_app.config['NOTIFICATIONS_KEEPALIVE']
+    deadline = time.monotonic() + current_app.config['NOTIFICATIONS_STREAM_TIMEOUT']
+    last_seen = request.headers.get('Last-Event-ID')
     
-    return jsonify(notifications)
+    def events():
+        version, notifications = feed.current(low_stock_snapshot)
+        db.session.close()
+        if version != last_seen:
+            yield _sse_event(version, notifications)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            new_version, notifications = feed.wait(version, min(keepalive, remaining))
+            if new_version == version:
+                # Комментарий не даёт прокси закрыть простаивающее соединение
+                yield ': keepalive\n\n'
+                feed.refresh_if_stale(low_stock_snapshot)
+                db.session.close()
+                continue
+            version = new_version
+            yield _sse_event(version, notifications)
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Место освобождается, когда сервер закрывает ответ, даже если поток не начинался
+    response.call_on_close(feed.unsubscribe)
+    return response
+
+def _sse_event(version, notifications):
+    return (f'id: {version}\nevent: low-stock\nretry: 5000\n'
+            f'data: {json.dumps(notifications, ensure_ascii=False)}\n\n')
 
 # API для получения истории операций
 @bp.route('/history', methods=['GET'])
 @login_required
 def get_history():
+    query = History.query.options(joinedload(History.user))
+    for arg, column in (('action', History.action), ('entity_type', History.entity_type)):
+        if request.args.get(arg):
+            query = query.filter(column == request.args[arg])
+    user_id = int_arg('user')
+    if user_id is not None:
+        query = query.filter(History.user_id == user_id)
+    query = query.filter(*date_range(History.timestamp))
+    
+    # Страницы по курсору — только по явному запросу (cursor или paginate=cursor);
+    # по умолчанию и с page/per_page ответ в прежнем формате (OFFSET)
+    if 'page' not in request.args and ('cursor' in request.args
+                                       or request.args.get('paginate') == 'cursor'):
+        page = keyset_page(query, [History.timestamp, History.id], descending=True)
+        return jsonify(page_json(page, serialize_history(page.items)))
+    
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
-    
-    history = History.query.order_by(History.timestamp.desc()).paginate(
+    history = query.order_by(History.timestamp.desc(), History.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
-    
     return jsonify({
-        'items': [{
-            'id': h.id,
-            'user': h.user.username,
-            'action': h.action,
-            'entity_type': h.entity_type,
-            'entity_id': h.entity_id,
-            'description': h.description,
-            'timestamp': h.timestamp.isoformat(),
-            'ip_address': h.ip_address
-        } for h in history.items],
+        'items': serialize_history(history.items),
         'total': history.total,
         'pages': history.pages,
         'current_page': page
-    })
\ No newline at end of file
+    })
+
+def serialize_history(history):
+    return [{
+        'id': h.id,
+        'user': h.user.username,
+        'action': h.action,
+        'entity_type': h.entity_type,
+        'entity_id': h.entity_id,
+        'description': h.description,
+        'timestamp': h.timestamp.isoformat(),
+        'ip_address': h.ip_address
+    } for h in history]
+
+# Состояние фоновой записи журнала: очередь, доставка, ожидания (backpressure)
+@bp.route('/audit/stats', methods=['GET'])
+@admin_required
+def get_audit_stats():
+    writer = audit.get_writer()
+    if writer is None:
+        return jsonify({'async': False})
+    return jsonify(dict(writer.stats(), **{'async': True}))
@@ -0,0 +1,489 @@
+"""
+Асинхронная запись журнала действий (History).
+
+Записи журнала не вставляются в транзакцию бизнес-операции: record()
+копит их в сессии, перед коммитом (before_commit) они дописываются в спул
+с ключом записи и номером транзакции, а после коммита фоновый поток
+пачками переносит их в таблицу history. Поэтому падение процесса между
+коммитом и сбросом спула не теряет записей зафиксированной операции.
+Откат сессии отбрасывает ещё не записанные в спул записи, а для уже
+записанных дописывает в спул метку отката — такие записи не доставляются.
+Пока исход транзакции неизвестен, её записи остаются в спуле.
+
+Спул — каталог AUDIT_SPOOL_DIR с файлами JSON Lines. Процесс пишет в свой
+текущий файл и держит блокировку на нём и на своих закрытых, ещё не
+доставленных файлах. Файлы упавшего процесса (блокировка снята) любой
+процесс вставляет в базу при следующем сбросе; записи без метки отката
+из них доставляются — в том числе если процесс упал посреди коммита.
+Доставка «хотя бы один раз», а повторы отсекаются по уникальному ключу
+записи (history.audit_key). С AUDIT_SPOOL_FSYNC каждый дописанный блок
+сбрасывается на диск. Без каталога спула записи буферизуются только
+в памяти.
+
+Если недоставленных записей больше AUDIT_MAX_PENDING, поток запроса ждёт
+сброса не дольше AUDIT_BLOCK_TIMEOUT секунд (записи при этом не теряются);
+счётчики ожиданий и очереди — в stats(). Запись на диск идёт вне общей
+блокировки писателя: параллельные запросы не ждут чужого fsync.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import History
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+log = logging.getLogger(__name__)
+
+
+def _try_lock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _row(record, with_key):
+    row = dict(record)
+    row.pop('tx', None)
+    key = row.pop('key', None)
+    if with_key:
+        row['audit_key'] = key
+    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+    return row
+
+
+class MemorySpool:
+    """Буфер записей в памяти процесса (без защиты от падения)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = deque()
+        self._delivered = 0
+
+    def append(self, records):
+        with self._lock:
+            self._records.extend(records)
+
+    def segments(self):
+        """Пары (записи, подтверждение доставки)"""
+        with self._lock:
+            records = list(self._records)
+            self._records.clear()
+        if not records:
+            return
+
+        def ack(delivered):
+            with self._lock:
+                if delivered:
+                    self._delivered += len(records)
+                else:
+                    self._records.extendleft(reversed(records))
+        yield records, ack
+
+    def rotate(self):
+        pass
+
+    def forget_delivered(self):
+        with self._lock:
+            delivered, self._delivered = self._delivered, 0
+        return delivered
+
+    def close(self):
+        pass
+
+
+class FileSpool:
+    """Спул в каталоге: текущий файл процесса и закрытые сегменты.
+
+    Свои закрытые сегменты процесс держит открытыми и заблокированными до
+    доставки, поэтому чужой сброс забирает только файлы упавших процессов.
+    """
+
+    def __init__(self, directory, fsync=True):
+        self.directory = directory
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._current = None
+        self._current_count = 0
+        # Свои закрытые сегменты: путь -> (файл, число записей)
+        self._sealed = {}
+        self._delivered = 0
+
+    def _open(self):
+        while True:
+            path = os.path.join(self.directory, f'audit-{os.getpid()}-{uuid.uuid4().hex}.jsonl')
+            f = open(path, 'x+b')
+            if _try_lock(f):
+                return f
+            # Файл успел заблокировать чужой сброс; он его удалит
+            f.close()
+
+    def append(self, records):
+        data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        with self._lock:
+            if self._current is None:
+                self._current = self._open()
+            self._current.write(data.encode('utf-8'))
+            self._current.flush()
+            if self.fsync:
+                os.fsync(self._current.fileno())
+            self._current_count += len(records)
+
+    def rotate(self):
+        """Закрыть текущий файл для записи — он становится сегментом для доставки"""
+        with self._lock:
+            if self._current is None:
+                return
+            self._sealed[self._current.name] = (self._current, self._current_count)
+            self._current = None
+            self._current_count = 0
+
+    def _read(self, f, path):
+        f.seek(0)
+        records = []
+        for line in f.read().decode('utf-8', errors='replace').splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Недописанная строка при падении процесса
+                log.warning('audit spool %s: skipped broken line', path)
+        return records
+
+    def segments(self):
+        with self._lock:
+            sealed = list(self._sealed.items())
+            current = self._current.name if self._current is not None else None
+        own = {path for path, _ in sealed}
+        for path, (f, count) in sealed:
+            def ack(delivered, f=f, path=path, count=count):
+                if delivered:
+                    self._remove(f, path)
+                    with self._lock:
+                        del self._sealed[path]
+                        self._delivered += count
+            yield self._read(f, path), ack
+        for path in sorted(glob.glob(os.path.join(self.directory, 'audit-*.jsonl'))):
+            if path == current or path in own:
+                continue
+            try:
+                f = open(path, 'r+b')
+            except FileNotFoundError:
+                continue
+            if not _try_lock(f):
+                f.close()
+                continue
+
+            def ack(delivered, f=f, path=path):
+                if delivered:
+                    self._remove(f, path)
+                else:
+                    f.close()
+            yield self._read(f, path), ack
+
+    @staticmethod
+    def _remove(f, path):
+        # Windows не удаляет открытый файл: обнуляем его под блокировкой
+        f.truncate(0)
+        f.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def forget_delivered(self):
+        """Число доставленных записей из собственных сегментов"""
+        with self._lock:
+            delivered, self._delivered = self._delivered, 0
+        return delivered
+
+    def close(self):
+        self.rotate()
+        with self._lock:
+            for f, count in self._sealed.values():
+                f.close()
+            self._sealed.clear()
+
+
+class AuditWriter:
+    """Фоновый перенос записей журнала из спула в таблицу history"""
+
+    def __init__(self, engine, spool, batch_size=500, flush_interval=1.0,
+                 max_pending=100000, block_timeout=5.0):
+        self.engine = engine
+        self.spool = spool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.block_timeout = block_timeout
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+        self._pending = 0
+        # Транзакции, записанные в спул, но ещё не зафиксированные, и откаченные
+        self._in_flight = set()
+        self._aborted = set()
+        self._with_key = None
+        self._stats = dict(submitted=0, delivered=0, batches=0, failed_flushes=0,
+                           max_pending=0, blocked=0, blocked_seconds=0.0,
+                           last_flush_ms=0.0)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, records):
+        """Записать в спул записи транзакции перед её коммитом; возвращает номер транзакции.
+
+        Исход сообщает end(); до этого записи не доставляются.
+        """
+        tx = uuid.uuid4().hex
+        with self._cond:
+            if self._pending >= self.max_pending and not self._stopped:
+                start = time.monotonic()
+                self._stats['blocked'] += 1
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._pending < self.max_pending or self._stopped,
+                                    self.block_timeout)
+                self._stats['blocked_seconds'] += time.monotonic() - start
+            self._in_flight.add(tx)
+            self._stats['submitted'] += len(records)
+        try:
+            self._append([dict(record, tx=tx) for record in records])
+        except Exception:
+            with self._cond:
+                self._in_flight.discard(tx)
+            raise
+        return tx
+
+    def end(self, tx, committed):
+        """Исход транзакции: после отката её записи из спула не доставляются"""
+        with self._cond:
+            self._in_flight.discard(tx)
+            if not committed:
+                self._aborted.add(tx)
+        if not committed:
+            self._append([{'tx': tx, 'aborted': True}])
+
+    def _append(self, lines):
+        # Диск — вне общей блокировки: у спула своя, запросы не ждут чужого fsync
+        self.spool.append(lines)
+        with self._cond:
+            self._pending += len(lines)
+            self._stats['max_pending'] = max(self._stats['max_pending'], self._pending)
+            if self._pending >= self.batch_size:
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped or self._pending >= self.batch_size,
+                                    self.flush_interval)
+                if self._stopped:
+                    return
+            if not self.flush():
+                # База недоступна: повторяем не чаще раза в flush_interval
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopped, self.flush_interval)
+
+    def flush(self):
+        """Доставить всё, что накопилось в спуле (в том числе сегменты упавших процессов).
+
+        Возвращает False, если вставка не удалась; записи остаются в спуле.
+        """
+        with self._flush_lock:
+            start = time.perf_counter()
+            self.spool.rotate()
+            segments = list(self.spool.segments())
+            with self._cond:
+                seen_aborted = set(self._aborted)
+            aborted = seen_aborted | {line['tx'] for records, ack in segments
+                                      for line in records if line.get('aborted')}
+            ok = True
+            for records, ack in segments:
+                if not ok:
+                    ack(False)
+                    continue
+                with self._cond:
+                    in_flight = set(self._in_flight)
+                    aborted |= self._aborted
+                deliver, carry = [], []
+                for line in records:
+                    if line.get('aborted') or line.get('tx') in aborted:
+                        continue
+                    (carry if line.get('tx') in in_flight else deliver).append(line)
+                ok = self._deliver(deliver)
+                if ok and carry:
+                    # Исход транзакции ещё неизвестен: её записи переходят в текущий файл
+                    self._append(carry)
+                ack(ok)
+                if ok:
+                    with self._cond:
+                        self._stats['delivered'] += len(deliver)
+            with self._cond:
+                self._aborted -= seen_aborted
+                self._pending -= self.spool.forget_delivered()
+                self._stats['last_flush_ms'] = (time.perf_counter() - start) * 1000
+                self._cond.notify_all()
+            return ok
+
+    def _deliver(self, records):
+        if not records:
+            return True
+        try:
+            if self._with_key is None:
+                columns = {c['name'] for c in inspect(self.engine).get_columns('history')}
+                self._with_key = 'audit_key' in columns
+                if not self._with_key:
+                    log.warning('history.audit_key is missing (run flask create-indexes); '
+                                'audit records are delivered without deduplication')
+            with self.engine.begin() as conn:
+                for i in range(0, len(records), self.batch_size):
+                    rows = [_row(record, self._with_key) for record in records[i:i + self.batch_size]]
+                    if self._with_key:
+                        rows = self._new_rows(conn, rows)
+                    if rows:
+                        conn.execute(insert(History.__table__), rows)
+                    with self._cond:
+                        self._stats['batches'] += 1
+            return True
+        except Exception:
+            log.exception('audit flush failed, will retry')
+            with self._cond:
+                self._stats['failed_flushes'] += 1
+            return False
+
+    @staticmethod
+    def _new_rows(conn, rows):
+        """Строки, которых ещё нет в history (повтор после падения или переноса в новый файл)"""
+        keys = [row['audit_key'] for row in rows if row['audit_key'] is not None]
+        existing = set(conn.scalars(
+            select(History.audit_key).where(History.audit_key.in_(keys))
+        )) if keys else set()
+        new_rows = []
+        for row in rows:
+            key = row['audit_key']
+            if key is not None:
+                if key in existing:
+                    continue
+                existing.add(key)
+            new_rows.append(row)
+        return new_rows
+
+    def close(self):
+        """Остановить поток и доставить остаток (при завершении процесса)"""
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self.spool.close()
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=self._pending)
+
+
+def init_app(app):
+    """Запустить фоновую запись журнала, если включён AUDIT_ASYNC.
+
+    База SQLite в памяти — одно соединение на все потоки, поэтому для неё
+    журнал пишется синхронно, в транзакции операции.
+    """
+    with app.app_context():
+        engine = db.engine
+    in_memory = engine.url.get_backend_name() == 'sqlite' and engine.url.database in (None, '', ':memory:')
+    if not app.config['AUDIT_ASYNC'] or in_memory:
+        app.extensions['audit_writer'] = None
+        return
+    if app.config['AUDIT_SPOOL_DIR']:
+        spool = FileSpool(app.config['AUDIT_SPOOL_DIR'], app.config['AUDIT_SPOOL_FSYNC'])
+    else:
+        spool = MemorySpool()
+    writer = AuditWriter(engine, spool,
+                         batch_size=app.config['AUDIT_BATCH_SIZE'],
+                         flush_interval=app.config['AUDIT_FLUSH_INTERVAL'],
+                         max_pending=app.config['AUDIT_MAX_PENDING'],
+                         block_timeout=app.config['AUDIT_BLOCK_TIMEOUT'])
+    app.extensions['audit_writer'] = writer
+    writer.start()
+
+
+def get_writer():
+    return current_app.extensions['audit_writer']
+
+
+def record(user_id, action, entity_type=None, entity_id=None, description=None, ip_address=None):
+    """Добавить запись журнала; она будет записана, если текущая транзакция зафиксируется"""
+    if get_writer() is None:
+        db.session.add(History(user_id=user_id, action=action, entity_type=entity_type,
+                               entity_id=entity_id, description=description,
+                               ip_address=ip_address))
+        return
+    db.session.info.setdefault('audit_records', []).append({
+        'key': uuid.uuid4().hex,
+        'user_id': user_id,
+        'action': action,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'description': description,
+        'ip_address': ip_address,
+        'timestamp': datetime.utcnow().isoformat(),
+    })
+
+
+@event.listens_for(Session, 'before_commit')
+def _spool_before_commit(session):
+    records = session.info.pop('audit_records', None)
+    if records:
+        # Ошибка записи в спул отменяет коммит: операция не пройдёт без журнала
+        session.info.setdefault('audit_transactions', []).append(get_writer().submit(records))
+
+
+@event.listens_for(Session, 'after_commit')
+def _confirm_after_commit(session):
+    for tx in session.info.pop('audit_transactions', ()):
+        get_writer().end(tx, committed=True)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_after_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('audit_records', None)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _abort_unfinished(session, transaction):
+    # Коммит не удался (откат или закрытие сессии): записи в спуле помечаются откатом
+    if transaction.parent is None:
+        for tx in session.info.pop('audit_transactions', ()):
+            get_writer().end(tx, committed=False)
@@ -1,10 +1,10 @@
 from flask import render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.urls import url_parse
-from app import db
+from app import db, audit
 from app.auth import bp
 from app.auth.forms import LoginForm, RegistrationForm
-from app.models import User, UserRole, History
+from app.models import User, UserRole
 from functools import wraps
 
 def admin_required(f):
@@ -42,13 +42,12 @@ def login():
         login_user(user, remember=form.remember_me.data)
         
         # Запись в историю
-        history = History(
+        audit.record(
             user_id=user.id,
             action='login',
             description=f'Пользователь {user.username} вошел в систему',
             ip_address=request.remote_addr
         )
-        db.session.add(history)
         db.session.commit()
         
         next_page = request.args.get('next')
@@ -62,13 +61,12 @@ def login():
 def logout():
     if current_user.is_authenticated:
         # Запись в историю
-        history = History(
+        audit.record(
             user_id=current_user.id,
             action='logout',
             description=f'Пользователь {current_user.username} вышел из системы',
             ip_address=request.remote_addr
         )
-        db.session.add(history)
         db.session.commit()
     
     logout_user()
@@ -89,7 +87,7 @@ def register():
         db.session.commit()
         
         # Запись в историю
-        history = History(
+        audit.record(
             user_id=current_user.id,
             action='create_user',
             entity_type='User',
@@ -97,7 +95,6 @@ def register():
             description=f'Создан пользователь {user.username} с ролью {user.role.value}',
             ip_address=request.remote_addr
         )
-        db.session.add(history)
         db.session.commit()
         
         flash('Пользователь успешно зарегистрирован!', 'success')
@@ -0,0 +1,186 @@
+"""
+Кэш ответов списочных эндпоинтов API с условными GET-запросами.
+
+Готовое JSON-тело ответа хранится по ключу (эндпоинт, параметры запроса)
+вместе с версиями групп данных, из которых оно собрано ('rooms', 'stock' и т.д.).
+Операции записи отмечают затронутые группы через mark_changed(); версии
+увеличиваются после фиксации транзакции, поэтому ответ, собранный до коммита,
+в кэш с новой версией не попадёт.
+
+ETag — хэш тела, поэтому одинаковые данные дают одинаковый ETag в любом
+процессе, а клиент с актуальной копией получает 304 без тела. Изменения,
+сделанные другими процессами, подхватываются не позже чем через ttl секунд.
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+
+ALL_GROUPS = ('rooms', 'printer-models', 'printers', 'supplies', 'stock')
+
+
+class CachedBody:
+    """Тело ответа, его ETag и сжатый вариант (создаётся при первом запросе)"""
+
+    def __init__(self, body, mimetype, versions):
+        self.body = body
+        self.mimetype = mimetype
+        self.versions = versions
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.created = time.monotonic()
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+class ResponseCache:
+    """Версионированный LRU-кэш тел ответов"""
+
+    def __init__(self, ttl=30.0, max_entries=64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._versions = dict.fromkeys(ALL_GROUPS, 0)
+        self._entries = OrderedDict()
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self, groups):
+        with self._lock:
+            return tuple(self._versions[group] for group in groups)
+
+    def invalidate(self, groups):
+        with self._lock:
+            for group in groups:
+                self._versions[group] += 1
+
+    def get(self, key, groups):
+        with self._lock:
+            entry = self._entries.get(key)
+            current = tuple(self._versions[group] for group in groups)
+            if (entry is None or entry.versions != current
+                    or time.monotonic() - entry.created > self.ttl):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def value(self, key, groups, loader, max_age):
+        """Значение loader(), которое хранится до смены версий groups, но не дольше max_age секунд"""
+        with self._lock:
+            current = tuple(self._versions[group] for group in groups)
+            item = self._values.get(key)
+            if item is not None and item[0] == current and time.monotonic() - item[1] <= max_age:
+                self.hits += 1
+                return item[2]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            self._values[key] = (current, time.monotonic(), value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._values.clear()
+
+
+def init_app(app):
+    app.extensions['response_cache'] = ResponseCache(app.config['RESPONSE_CACHE_TTL'],
+                                                     app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+
+
+def get_cache():
+    return current_app.extensions['response_cache']
+
+
+def mark_changed(groups=ALL_GROUPS):
+    """Отметить группы данных, изменённые текущей транзакцией"""
+    session = db.session()
+    if not session.in_transaction():
+        # Без начатой транзакции откат не вызывает событий, и отметки дожили бы до следующего коммита
+        session.begin()
+    session.info.setdefault('changed_groups', set()).update(groups)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    groups = session.info.pop('changed_groups', None)
+    if groups:
+        get_cache().invalidate(groups)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_after_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('changed_groups', None)
+
+
+def cached_response(*groups):
+    """Кэшировать ответ GET-эндпоинта, зависящего от групп данных groups.
+
+    Ставится под login_required: проверка доступа выполняется всегда,
+    кэшируется только уже собранное тело ответа.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config['RESPONSE_CACHE_ENABLED']:
+                return view(*args, **kwargs)
+            cache = get_cache()
+            key = (request.endpoint, tuple(sorted(request.args.items(multi=True))))
+            entry = cache.get(key, groups)
+            if entry is None:
+                # Версии берутся до сборки ответа: если данные изменятся во время
+                # сборки, запись окажется устаревшей, а не ошибочно свежей
+                versions = cache.versions(groups)
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = CachedBody(response.get_data(), response.mimetype, versions)
+                cache.put(key, entry)
+            return _conditional_response(entry)
+        return wrapper
+    return decorator
+
+
+def _conditional_response(entry):
+    use_gzip = (current_app.config['RESPONSE_GZIP']
+                and len(entry.body) >= current_app.config['RESPONSE_GZIP_MIN_SIZE']
+                and 'gzip' in request.accept_encodings)
+    # У сжатого варианта свой ETag: тела разные, а прокси могут хранить оба
+    etag = entry.etag + '-gzip' if use_gzip else entry.etag
+    response = current_app.response_class(mimetype=entry.mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+    if use_gzip:
+        response.set_data(entry.gzipped())
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response.set_data(entry.body)
+    return response
@@ -0,0 +1,58 @@
+"""
+Снимок статистики для главной страницы.
+
+Счётчики собираются одним запросом со скалярными подзапросами (остаток
+склада и число расходников с низким остатком берутся из Supply.available_count),
+последние движения — вторым. Готовый снимок хранится в кэше процесса
+(app.cache) и пересобирается после коммита операций с кабинетами,
+принтерами, расходниками и складом или по истечении
+DASHBOARD_MAX_STALENESS секунд (изменения из других процессов).
+"""
+
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.cache import get_cache
+from app.models import Room, Printer, Supply, Stock, Movement
+
+DASHBOARD_GROUPS = ('rooms', 'printers', 'supplies', 'stock')
+
+# Движение без привязки к сессии: снимок живёт дольше запроса
+RecentMovement = namedtuple('RecentMovement', 'timestamp type supply_name username notes')
+
+
+def compute_dashboard():
+    counts = db.session.execute(select(
+        select(func.count(Room.id)).scalar_subquery(),
+        select(func.count(Printer.id)).where(Printer.status == 'active').scalar_subquery(),
+        select(func.count(Supply.id)).scalar_subquery(),
+        select(func.coalesce(func.sum(Supply.available_count), 0)).scalar_subquery(),
+        select(func.count(Supply.id)).where(
+            Supply.available_count - Supply.min_stock <= 0).scalar_subquery(),
+    )).one()
+    movements = Movement.query.options(
+        joinedload(Movement.stock_item).joinedload(Stock.supply),
+        joinedload(Movement.responsible_user)
+    ).order_by(Movement.timestamp.desc(), Movement.id.desc()).limit(5).all()
+    return {
+        'rooms': counts[0],
+        'printers': counts[1],
+        'supplies': counts[2],
+        'stock_available': counts[3],
+        'low_stock_items': counts[4],
+        'recent_movements': [RecentMovement(
+            m.timestamp, m.type, m.stock_item.supply.name, m.responsible_user.username, m.notes
+        ) for m in movements],
+    }
+
+
+def dashboard_stats():
+    """Снимок из кэша; DASHBOARD_MAX_STALENESS = 0 отключает хранение"""
+    max_age = current_app.config['DASHBOARD_MAX_STALENESS']
+    if not max_age:
+        return compute_dashboard()
+    return get_cache().value('dashboard', DASHBOARD_GROUPS, compute_dashboard, max_age)
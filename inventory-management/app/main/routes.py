@@ -2,6 +2,7 @@ from flask import render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from app import db
 from app.main import bp
+from app.dashboard import dashboard_stats
 from app.auth.routes import operator_required, admin_required
 from app.models import (User, Room, Printer, PrinterModel, Supply, Stock, 
                        Movement, History, SupplyType, MovementType)
@@ -10,16 +11,8 @@ from app.models import (User, Room, Printer, PrinterModel, Supply, Stock,
 @bp.route('/index')
 @login_required
 def index():
-    # Собираем статистику для дашборда
-    stats = {
-        'rooms': Room.query.count(),
-        'printers': Printer.query.filter_by(status='active').count(),
-        'supplies': Supply.query.count(),
-        'stock_available': Stock.query.filter_by(status='available').count(),
-        'low_stock_items': sum(1 for s in Supply.query.all() if s.is_low_stock()),
-        'recent_movements': Movement.query.order_by(Movement.timestamp.desc()).limit(5).all()
-    }
-    return render_template('index.html', title='Главная', stats=stats)
+    # Статистика для дашборда — из снимка, который обновляется после изменений
+    return render_template('index.html', title='Главная', stats=dashboard_stats())
 
 @bp.route('/rooms')
 @login_required
@@ -109,6 +102,6 @@ def users():
 @bp.route('/notifications')
 @login_required
 def notifications():
-    low_stock_supplies = [s for s in Supply.query.all() if s.is_low_stock()]
+    low_stock_supplies = Supply.low_stock_query().order_by(Supply.id).all()
     return render_template('notifications.html', title='Уведомления', 
                          low_stock_supplies=low_stock_supplies)
\ No newline at end of file
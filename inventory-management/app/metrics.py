@@ -0,0 +1,207 @@
+"""
+Метрики запросов: задержки по эндпоинтам, число и время SQL-запросов.
+
+Включается настройкой METRICS_ENABLED. Для каждого запроса считается
+время обработки (гистограмма по эндпоинту и методу), число SQL-операторов
+и их суммарное время — через события SQLAlchemy before/after_cursor_execute.
+Запросы к базе дольше METRICS_SLOW_QUERY_MS пишутся в журнал: текст
+оператора и число параметров, но не сами значения. Данные отдаются на
+/metrics в текстовом формате Prometheus и, с METRICS_DEBUG_HEADER,
+в заголовке Server-Timing.
+
+И /metrics, и Server-Timing видны только тем, кому можно смотреть метрики:
+с METRICS_TOKEN — по заголовку Authorization: Bearer <токен>, без него —
+запросам с самого сервера (127.0.0.1/::1, не через прокси) и вошедшему
+администратору.
+
+Счётчики живут в памяти процесса: у gunicorn с несколькими воркерами
+каждый воркер отдаёт свои.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Response, current_app, g, has_app_context, request
+from flask_login import current_user
+from sqlalchemy import event
+
+from app import db
+
+log = logging.getLogger(__name__)
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+# Длина текста оператора в журнале медленных запросов
+SLOW_QUERY_MAX_STATEMENT = 1000
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RequestMetrics:
+    """Счётчики процесса; запрос обновляет их под одной короткой блокировкой"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(Histogram)   # (endpoint, method) -> гистограмма
+        self.requests = defaultdict(int)        # (endpoint, method, status) -> число
+        self.sql_count = defaultdict(int)       # endpoint -> операторов
+        self.sql_seconds = defaultdict(float)   # endpoint -> секунд
+        self.slow_queries = defaultdict(int)    # endpoint -> медленных операторов
+
+    def record(self, endpoint, method, status, seconds, sql_count, sql_seconds, slow):
+        with self._lock:
+            self.latency[endpoint, method].observe(seconds)
+            self.requests[endpoint, method, status] += 1
+            self.sql_count[endpoint] += sql_count
+            self.sql_seconds[endpoint] += sql_seconds
+            self.slow_queries[endpoint] += slow
+
+    def render(self, extra_gauges=()):
+        """Текстовый формат Prometheus 0.0.4"""
+        with self._lock:
+            lines = [
+                '# HELP inventory_request_duration_seconds Время обработки запроса',
+                '# TYPE inventory_request_duration_seconds histogram',
+            ]
+            for (endpoint, method), hist in sorted(self.latency.items()):
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), hist.counts):
+                    cumulative += count
+                    lines.append(f'inventory_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'inventory_request_duration_seconds_sum{{{labels}}} {hist.total:.6f}')
+                lines.append(f'inventory_request_duration_seconds_count{{{labels}}} {hist.count}')
+            lines += ['# HELP inventory_requests_total Запросы по коду ответа',
+                      '# TYPE inventory_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'inventory_requests_total{{endpoint="{endpoint}",method="{method}",'
+                             f'status="{status}"}} {count}')
+            for name, help_text, values, fmt in (
+                ('inventory_sql_queries_total', 'SQL-операторы', self.sql_count, '{}'),
+                ('inventory_sql_seconds_total', 'Время SQL-операторов', self.sql_seconds, '{:.6f}'),
+                ('inventory_slow_queries_total', 'SQL-операторы дольше METRICS_SLOW_QUERY_MS',
+                 self.slow_queries, '{}'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{{endpoint="{endpoint}"}} {fmt.format(value)}'
+                          for endpoint, value in sorted(values.items())]
+        for name, help_text, value in extra_gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def _extra_gauges(app):
+    """Состояние фоновой записи журнала и кэша ответов"""
+    gauges = []
+    writer = app.extensions.get('audit_writer')
+    if writer is not None:
+        stats = writer.stats()
+        gauges += [
+            ('inventory_audit_pending', 'Недоставленные записи журнала', stats['pending']),
+            ('inventory_audit_delivered', 'Доставленные записи журнала', stats['delivered']),
+            ('inventory_audit_blocked', 'Ожидания запросов из-за переполнения очереди', stats['blocked']),
+            ('inventory_audit_failed_flushes', 'Неудачные сбросы журнала', stats['failed_flushes']),
+        ]
+    cache = app.extensions.get('response_cache')
+    if cache is not None:
+        gauges += [
+            ('inventory_response_cache_hits', 'Попадания в кэш ответов', cache.hits),
+            ('inventory_response_cache_misses', 'Промахи кэша ответов', cache.misses),
+        ]
+    return gauges
+
+
+def _parameter_count(parameters, executemany):
+    """Число параметров оператора (для executemany — число наборов)"""
+    if not parameters:
+        return 0
+    if executemany or isinstance(parameters, (tuple, list, dict)):
+        return len(parameters)
+    return 1
+
+
+def can_view_metrics():
+    """Можно ли текущему запросу видеть /metrics и Server-Timing"""
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        return request.headers.get('Authorization') == f'Bearer {token}'
+    # За обратным прокси на той же машине все запросы приходят с 127.0.0.1:
+    # такие запросы локальными не считаются, для них нужен вход или токен
+    local = (request.remote_addr in LOCAL_ADDRESSES
+             and 'X-Forwarded-For' not in request.headers and 'Forwarded' not in request.headers)
+    return local or (current_user.is_authenticated and current_user.is_admin())
+
+
+def init_app(app):
+    metrics = RequestMetrics()
+    app.extensions['metrics'] = metrics
+    slow_seconds = app.config['METRICS_SLOW_QUERY_MS'] / 1000
+    debug_header = app.config['METRICS_DEBUG_HEADER']
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_start
+        # Фоновые потоки (запись журнала) работают без контекста приложения
+        if not has_app_context() or 'metrics_start' not in g:
+            return
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+        if elapsed >= slow_seconds:
+            g.slow_queries += 1
+            # Значения параметров не пишутся: в них бывают логины и другие данные пользователей
+            log.warning('slow query %.1f ms on %s: %.*s; %d parameter(s)',
+                        elapsed * 1000, request.endpoint, SLOW_QUERY_MAX_STATEMENT,
+                        ' '.join(statement.split()), _parameter_count(parameters, executemany))
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.slow_queries = 0
+
+    @app.after_request
+    def record_request(response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        endpoint = request.endpoint or 'unmatched'
+        metrics.record(endpoint, request.method, response.status_code, elapsed,
+                       g.sql_count, g.sql_seconds, g.slow_queries)
+        if debug_header and can_view_metrics():
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'sql;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_count} queries"'
+            )
+        return response
+
+    def metrics_view():
+        if not can_view_metrics():
+            if current_app.config['METRICS_TOKEN']:
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(metrics.render(_extra_gauges(current_app)),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
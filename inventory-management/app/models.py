@@ -3,6 +3,8 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db, login_manager
 from enum import Enum
+from sqlalchemy import func, inspect, text
+from sqlalchemy.schema import CreateIndex
 
 class UserRole(Enum):
     ADMIN = 'admin'
@@ -96,15 +98,31 @@ class Supply(db.Model):
     type = db.Column(db.Enum(SupplyType), nullable=False)
     color = db.Column(db.String(20))  # black, cyan, magenta, yellow
     min_stock = db.Column(db.Integer, default=5)
+    # Число единиц со статусом available. Меняется только вместе со статусом
+    # Stock (adjust_available), пересчитывается командой flask reconcile-stock.
+    # В базу, созданную до его появления, добавляется upgrade_schema()
+    available_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Связи
     stock_items = db.relationship('Stock', backref='supply', lazy='dynamic')
     
     def get_current_stock(self):
-        return self.stock_items.filter_by(status='available').count()
+        return self.available_count
     
     def is_low_stock(self):
         return self.get_current_stock() <= self.min_stock
+    
+    @staticmethod
+    def adjust_available(supply_id, delta):
+        """Атомарно изменить счётчик в текущей транзакции (UPDATE ... SET x = x + delta)"""
+        Supply.query.filter_by(id=supply_id).update(
+            {Supply.available_count: Supply.available_count + delta}
+        )
+    
+    @staticmethod
+    def low_stock_query():
+        """Расходники с остатком не выше минимального — один запрос по индексу"""
+        return Supply.query.filter(Supply.available_count - Supply.min_stock <= 0)
 
 class Stock(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -116,6 +134,44 @@ class Stock(db.Model):
     
     # Связи
     movements = db.relationship('Movement', backref='stock_item', lazy='dynamic')
+    
+    def set_status(self, status):
+        """Сменить статус, если его не поменял параллельный запрос; обновляет счётчик.
+
+        Возвращает False, если статус единицы уже не тот, что был прочитан.
+        """
+        old_status = self.status
+        changed = Stock.query.filter_by(id=self.id, status=old_status).update({Stock.status: status})
+        if not changed:
+            return False
+        if old_status == 'available' and status != 'available':
+            Supply.adjust_available(self.supply_id, -1)
+        elif old_status != 'available' and status == 'available':
+            Supply.adjust_available(self.supply_id, 1)
+        return True
+
+db.Index('ix_supply_low_stock', Supply.available_count - Supply.min_stock)
+db.Index('ix_stock_status_supply', Stock.status, Stock.supply_id)
+
+def reconcile_stock_counters():
+    """Пересчитать Supply.available_count по таблице Stock.
+
+    Возвращает список (supply, было, стало) для расходившихся счётчиков;
+    фиксация транзакции — за вызывающим.
+    """
+    actual = dict(
+        db.session.query(Stock.supply_id, func.count(Stock.id))
+        .filter(Stock.status == 'available')
+        .group_by(Stock.supply_id)
+        .all()
+    )
+    fixed = []
+    for supply in Supply.query.order_by(Supply.id):
+        count = actual.get(supply.id, 0)
+        if supply.available_count != count:
+            fixed.append((supply, supply.available_count, count))
+            supply.available_count = count
+    return fixed
 
 class PrinterSupply(db.Model):
     """Текущие установленные расходники в принтерах"""
@@ -155,6 +211,52 @@ class History(db.Model):
     description = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     ip_address = db.Column(db.String(15))
+    # Ключ записи из спула фоновой записи журнала: по нему отсекаются повторы доставки
+    audit_key = db.Column(db.String(32))
     
     def __repr__(self):
-        return f'<History {self.action} by {self.user_id} at {self.timestamp}>'
\ No newline at end of file
+        return f'<History {self.action} by {self.user_id} at {self.timestamp}>'
+
+# Ключи keyset-пагинации списков склада, движений и истории
+db.Index('ix_stock_status_receipt', Stock.status, Stock.receipt_date, Stock.id)
+db.Index('ix_movement_timestamp', Movement.timestamp, Movement.id)
+db.Index('ix_history_timestamp', History.timestamp, History.id)
+db.Index('ux_history_audit_key', History.audit_key, unique=True)
+
+# Столбцы, появившиеся после первой версии схемы: db.create_all создаёт их
+# сразу, а в существующую базу их добавляет upgrade_schema()
+ADDED_COLUMNS = {
+    'supply.available_count': 'INTEGER NOT NULL DEFAULT 0',
+    'history.audit_key': 'VARCHAR(32)',
+}
+
+def missing_columns():
+    """Имена столбцов из ADDED_COLUMNS ('таблица.столбец'), которых нет в базе"""
+    inspector = inspect(db.engine)
+    existing = {}
+    missing = []
+    for name in ADDED_COLUMNS:
+        table, column = name.split('.')
+        if table not in existing:
+            existing[table] = {c['name'] for c in inspector.get_columns(table)}
+        if column not in existing[table]:
+            missing.append(name)
+    return missing
+
+def upgrade_schema():
+    """Добавить в существующую базу недостающие столбцы и индексы (flask create-indexes).
+
+    Только что добавленный счётчик остатков сразу пересчитывается по складу.
+    Возвращает имена добавленных столбцов; транзакция фиксируется.
+    """
+    added = missing_columns()
+    for name in added:
+        table, column = name.split('.')
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ADDED_COLUMNS[name]}'))
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            db.session.execute(CreateIndex(index, if_not_exists=True))
+    if 'supply.available_count' in added:
+        reconcile_stock_counters()
+    db.session.commit()
+    return added
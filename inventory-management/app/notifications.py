@@ -0,0 +1,134 @@
+"""
+Общая лента изменений низких остатков для push-уведомлений.
+
+Список расходников с низким остатком хранится в одном экземпляре на процесс
+(app.extensions['low_stock_feed']). Запросы, меняющие склад (приход, установка, списание), после фиксации
+транзакции пересчитывают его одним запросом; подписчики (SSE-потоки и
+long-poll запросы) только ждут на условной переменной и не обращаются к базе.
+Версия снимка — хэш набора расходников с низким остатком и их критичности:
+она меняется, только когда остаток пересёк порог, и одинакова во всех
+процессах, поэтому клиент может переподключиться к любому воркеру с
+Last-Event-ID (или ?since=) и не пропустить изменение.
+
+Ждущий подписчик занимает поток сервера, поэтому их число в процессе
+ограничено (max_subscribers): остальные получают ответ сразу и опрашивают
+сервер как раньше.
+
+Лента своя у каждого процесса. Изменения, сделанные другими процессами
+(несколько воркеров WSGI-сервера, команда reconcile-stock), подхватываются
+периодическим пересчётом: подписчики этого процесса увидят их с задержкой
+до refresh_interval секунд.
+"""
+
+import hashlib
+import threading
+import time
+
+from flask import current_app
+
+from app.models import Supply
+
+
+def low_stock_snapshot():
+    """Текущий список уведомлений о низких остатках (один запрос по индексу)"""
+    return [{
+        'id': supply.id,
+        'code': supply.code,
+        'name': supply.name,
+        'current_stock': supply.get_current_stock(),
+        'min_stock': supply.min_stock,
+        'severity': 'critical' if supply.get_current_stock() == 0 else 'warning'
+    } for supply in Supply.low_stock_query().order_by(Supply.id)]
+
+
+def snapshot_version(snapshot):
+    """Версия снимка: меняется, только когда изменился набор расходников или их критичность"""
+    signature = ';'.join(f"{item['id']}:{item['severity']}" for item in snapshot)
+    return hashlib.sha1(signature.encode()).hexdigest()[:16]
+
+
+class LowStockFeed:
+    """Последний снимок низких остатков с версией и ожиданием изменений"""
+
+    def __init__(self, refresh_interval=60.0, max_subscribers=4):
+        self.refresh_interval = refresh_interval
+        self.max_subscribers = max_subscribers
+        self._cond = threading.Condition()
+        self._snapshot = None
+        self._version = None
+        self._updated_at = 0.0
+        self._refreshing = False
+        self._subscribers = 0
+
+    def update(self, snapshot):
+        """Сохранить новый снимок; подписчики будятся, только если пересечён порог"""
+        version = snapshot_version(snapshot)
+        with self._cond:
+            self._snapshot = snapshot
+            self._updated_at = time.monotonic()
+            if version != self._version:
+                self._version = version
+                self._cond.notify_all()
+
+    def current(self, loader):
+        """(версия, снимок); при первом обращении в процессе снимок загружается"""
+        with self._cond:
+            if self._snapshot is not None:
+                return self._version, self._snapshot
+        self.update(loader())
+        with self._cond:
+            return self._version, self._snapshot
+
+    def wait(self, since, timeout):
+        """Ждать версии новее since не дольше timeout; возвращает (версия, снимок)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != since, timeout)
+            return self._version, self._snapshot
+
+    def refresh_if_stale(self, loader):
+        """Пересчитать снимок, если он старше refresh_interval (один поток на процесс)"""
+        with self._cond:
+            if self._refreshing or time.monotonic() - self._updated_at < self.refresh_interval:
+                return
+            self._refreshing = True
+        try:
+            self.update(loader())
+        finally:
+            with self._cond:
+                self._refreshing = False
+
+    def subscribe(self):
+        """Занять место ждущего подписчика; False, если все места в процессе заняты"""
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                return False
+            self._subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    @property
+    def subscribers(self):
+        with self._cond:
+            return self._subscribers
+
+    @property
+    def version(self):
+        with self._cond:
+            return self._version
+
+
+def init_app(app):
+    app.extensions['low_stock_feed'] = LowStockFeed(app.config['NOTIFICATIONS_REFRESH_INTERVAL'],
+                                                    app.config['NOTIFICATIONS_MAX_SUBSCRIBERS'])
+
+
+def get_feed():
+    return current_app.extensions['low_stock_feed']
+
+
+def notify_stock_changed():
+    """Вызывается после фиксации операций, меняющих остатки"""
+    get_feed().update(low_stock_snapshot())
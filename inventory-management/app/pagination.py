@@ -0,0 +1,112 @@
+"""
+Keyset-пагинация и фильтры списочных эндпоинтов API.
+
+Страница — строки, идущие после курсора в порядке ключа сортировки:
+WHERE (timestamp, id) < (:timestamp, :id) ORDER BY timestamp DESC, id DESC LIMIT n.
+В отличие от OFFSET цена страницы не зависит от её номера, а новые строки
+не сдвигают уже выданные. Курсор — непрозрачная для клиента строка
+(base64 от значений ключа последней строки страницы).
+
+Параметры запроса: limit (по умолчанию API_PAGE_SIZE, не больше
+API_MAX_PAGE_SIZE), cursor (next_cursor предыдущей страницы) и count=1,
+чтобы получить общее число строк с учётом фильтров (отдельный COUNT).
+"""
+
+import base64
+import binascii
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app, request
+from sqlalchemy import DateTime, tuple_
+
+Page = namedtuple('Page', 'items next_cursor total')
+
+
+class PaginationError(ValueError):
+    """Неверный курсор, limit или фильтр — ответ 400"""
+
+
+def is_paged_request():
+    """Клиент явно запросил страницу (иначе эндпоинт отвечает в прежнем формате)"""
+    return 'cursor' in request.args or 'limit' in request.args
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise PaginationError('Неверный курсор')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise PaginationError('Неверный курсор')
+    try:
+        return [datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+                for column, value in zip(columns, values)]
+    except (TypeError, ValueError):
+        raise PaginationError('Неверный курсор')
+
+
+def int_arg(name):
+    """Целочисленный фильтр; нечисловое значение — ошибка, а не пропуск фильтра"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise PaginationError(f'Параметр {name} должен быть числом')
+
+
+def date_range(column, from_arg='date_from', to_arg='date_to'):
+    """Условия на column по датам YYYY-MM-DD; date_to включает весь день"""
+    conditions = []
+    for name, end_of_day in ((from_arg, False), (to_arg, True)):
+        value = request.args.get(name)
+        if not value:
+            continue
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise PaginationError(f'Параметр {name}: ожидается дата ГГГГ-ММ-ДД')
+        conditions.append(column < day + timedelta(days=1) if end_of_day else column >= day)
+    return conditions
+
+
+def keyset_page(query, columns, descending=False):
+    """Страница query по ключу columns (последний столбец должен быть уникальным)"""
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'])
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise PaginationError('Параметр limit должен быть числом')
+    if not 1 <= limit <= current_app.config['API_MAX_PAGE_SIZE']:
+        raise PaginationError(f'limit: от 1 до {current_app.config["API_MAX_PAGE_SIZE"]}')
+
+    total = query.order_by(None).count() if request.args.get('count') == '1' else None
+    cursor = request.args.get('cursor')
+    if cursor:
+        key, after = tuple_(*columns), tuple(decode_cursor(cursor, columns))
+        query = query.filter(key < after if descending else key > after)
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return Page(rows, next_cursor, total)
+
+
+def page_json(page, items):
+    """Тело ответа со страницей: items, next_cursor и total (если запрошен)"""
+    body = {'items': items, 'next_cursor': page.next_cursor}
+    if page.total is not None:
+        body['total'] = page.total
+    return body
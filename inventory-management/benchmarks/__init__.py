@@ -0,0 +1 @@
+"""Замеры и проверки производительности веб-приложения (см. README)."""
@@ -0,0 +1,73 @@
+"""
+Запись журнала действий: синхронно в транзакции операции и в фоне через спул.
+
+Замеряет время POST-запросов, пишущих журнал, в трёх режимах: синхронно
+(AUDIT_ASYNC = False), в фоне со спулом на диске с fsync и в фоне с буфером
+в памяти. После остановки приложения каждая операция должна иметь ровно одну
+запись в history. Доставку из спула, восстановление после падения процесса
+и синхронный режим проверяет tests/test_audit.py.
+
+    python -m benchmarks.bench_audit [--requests 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from .common import make_app, seed, login
+from app.audit import get_writer
+from app.models import History
+
+
+def measure(tmp, name, requests, **config):
+    app = make_app('sqlite:///' + os.path.join(tmp, f'{name}.db'), **config)
+    with app.app_context():
+        admin_id = seed(10)
+        before = History.query.count()
+    client = app.test_client()
+    login(client, admin_id)
+
+    start = time.perf_counter()
+    for n in range(requests):
+        response = client.post('/api/rooms', json={'number': f'A-{n:05d}'})
+        if response.status_code != 201:
+            raise RuntimeError(f'HTTP {response.status_code}')
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        writer = get_writer()
+        stats = writer.stats() if writer else {}
+        if writer:
+            writer.close()
+        written = History.query.count() - before
+    return elapsed, written, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        modes = [
+            ('синхронно', dict(AUDIT_ASYNC=False)),
+            ('спул + fsync', dict(AUDIT_SPOOL_DIR=os.path.join(tmp, 'spool'))),
+            ('память', dict()),
+        ]
+        print(f'{"режим":14} {"мс/запрос":>10} {"записей":>8} {"пачек":>6} {"макс. очередь":>14}')
+        for n, (title, config) in enumerate(modes):
+            elapsed, written, stats = measure(tmp, f'mode{n}', args.requests, **config)
+            print(f'{title:14} {elapsed / args.requests * 1000:10.2f} {written:8} '
+                  f'{stats.get("batches", "—"):>6} {stats.get("max_pending", "—"):>14}')
+            failed |= written != args.requests
+    if failed:
+        print('ОШИБКА: число записей журнала не совпадает с числом операций')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
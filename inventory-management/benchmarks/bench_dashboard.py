@@ -0,0 +1,72 @@
+"""
+Статистика главной страницы: отдельные COUNT-запросы, сводный запрос и снимок.
+
+Сравнивает прежний сбор статистики (по запросу на каждый счётчик) со сводным
+запросом compute_dashboard() и со снимком из кэша; завершается с ошибкой,
+если снимок отдаётся медленнее --max-ms. Совпадение значений и обновление
+снимка проверяет tests/test_dashboard.py.
+
+    python -m benchmarks.bench_dashboard [--scale 2000] [--repeat 50] [--max-ms 0.5]
+"""
+
+import argparse
+import sys
+import time
+
+from .common import make_app, seed, count_queries
+from app import db
+from app.dashboard import compute_dashboard, dashboard_stats
+from app.models import Room, Printer, Supply, Stock, Movement
+
+
+def legacy_dashboard():
+    """Сбор статистики, как в main.index до снимка"""
+    return {
+        'rooms': Room.query.count(),
+        'printers': Printer.query.filter_by(status='active').count(),
+        'supplies': Supply.query.count(),
+        'stock_available': Stock.query.filter_by(status='available').count(),
+        'low_stock_items': Supply.low_stock_query().count(),
+        'recent_movements': Movement.query.order_by(Movement.timestamp.desc(), Movement.id.desc()).limit(5).all()
+    }
+
+
+def timed(app, engine, func, repeat):
+    with app.test_request_context():
+        func()  # прогрев
+        start = time.perf_counter()
+        with count_queries(engine) as statements:
+            for _ in range(repeat):
+                result = func()
+        return (time.perf_counter() - start) / repeat * 1000, len(statements) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--max-ms', type=float, default=0.5, help='допустимое время снимка, мс')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(args.scale)
+        engine = db.engine
+
+    print(f'{"вариант":18} {"мс":>8} {"запросов":>9}')
+    results = {}
+    for title, func in (('по счётчику', legacy_dashboard), ('сводный запрос', compute_dashboard),
+                        ('снимок', dashboard_stats)):
+        ms, queries, result = timed(app, engine, func, args.repeat)
+        results[title] = (ms, queries, result)
+        print(f'{title:18} {ms:8.3f} {queries:9.1f}')
+
+    ms = results['снимок'][0]
+    if ms > args.max_ms:
+        print(f'ОШИБКА: снимок отдаётся за {ms:.3f} мс (допустимо {args.max_ms} мс)')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
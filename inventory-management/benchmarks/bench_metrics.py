@@ -0,0 +1,57 @@
+"""
+Цена метрик запросов: время ответа с METRICS_ENABLED и без.
+
+Гоняет одни и те же запросы к API на двух приложениях — без метрик и
+с метриками (и заголовком Server-Timing), печатает среднее время и
+накладные расходы. Формат /metrics, счётчики, доступ и журнал медленных
+запросов проверяет tests/test_metrics.py.
+
+    python -m benchmarks.bench_metrics [--scale 200] [--repeat 200] [--max-overhead 10]
+"""
+
+import argparse
+import sys
+import time
+
+from .common import make_app, seed, login
+
+URLS = ['/api/supplies', '/api/stock?limit=50', '/api/notifications/low-stock']
+
+
+def run(enabled, scale, repeat):
+    app = make_app(METRICS_ENABLED=enabled, METRICS_DEBUG_HEADER=enabled,
+                   RESPONSE_CACHE_ENABLED=False)
+    with app.app_context():
+        admin_id = seed(scale)
+    client = app.test_client()
+    login(client, admin_id)
+    for url in URLS:
+        client.get(url)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url in URLS:
+            client.get(url)
+    return (time.perf_counter() - start) / (repeat * len(URLS)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--max-overhead', type=float, default=10, help='допустимые накладные расходы, %%')
+    args = parser.parse_args()
+
+    plain = run(False, args.scale, args.repeat)
+    instrumented = run(True, args.scale, args.repeat)
+    overhead = (instrumented - plain) / plain * 100
+    print(f'без метрик: {plain:.3f} мс/запрос, с метриками: {instrumented:.3f} мс/запрос '
+          f'({overhead:+.1f}%)')
+
+    if overhead > args.max_overhead:
+        print(f'ОШИБКА: накладные расходы больше {args.max_overhead}%')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
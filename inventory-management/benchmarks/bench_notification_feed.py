@@ -0,0 +1,152 @@
+"""
+Замер доставки push-уведомлений о низких остатках.
+
+Поднимает приложение на локальном порту (многопоточный сервер werkzeug),
+открывает N подписчиков /api/notifications/stream и списывает расходник,
+пока его остаток не опустится до минимума. Каждый подписчик должен получить
+событие low-stock с этим расходником, а число SQL-запросов на списание
+не должно зависеть от числа подписчиков. Формат потока, long-poll и лимит
+подписчиков проверяет tests/test_notifications.py.
+
+    python -m benchmarks.bench_notification_feed [--clients 1 50]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from .common import make_app, seed, login, count_queries, shutdown
+from app import db
+from app.models import Stock, Supply
+
+
+class Subscriber(threading.Thread):
+    """Читает поток SSE и складывает полученные события low-stock"""
+
+    def __init__(self, port, cookie):
+        super().__init__(daemon=True)
+        self.port = port
+        self.cookie = cookie
+        self.events = []
+        self.status = None
+        self.closed = False
+        self.changed = threading.Condition()
+
+    def run(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        conn.request('GET', '/api/notifications/stream', headers={'Cookie': self.cookie})
+        response = conn.getresponse()
+        with self.changed:
+            self.status = response.status
+            self.changed.notify_all()
+        fields = {}
+        for raw in iter(response.readline, b''):
+            line = raw.decode('utf-8').rstrip('\n')
+            if line:
+                if not line.startswith(':'):
+                    name, _, value = line.partition(': ')
+                    fields[name] = value
+                continue
+            if fields.get('event') == 'low-stock':
+                with self.changed:
+                    self.events.append((fields['id'], json.loads(fields['data'])))
+                    self.changed.notify_all()
+            fields = {}
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+
+    def wait_for(self, predicate, timeout):
+        with self.changed:
+            return self.changed.wait_for(lambda: predicate(self), timeout)
+
+
+def serve(app):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(clients, keepalive):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Журнал пишется синхронно, чтобы фоновые вставки не попадали в подсчёт запросов
+        app = make_app('sqlite:///' + os.path.join(tmp, 'inventory.db'), AUDIT_ASYNC=False,
+                       NOTIFICATIONS_MAX_SUBSCRIBERS=clients, NOTIFICATIONS_STREAM_TIMEOUT=60)
+        app.config['NOTIFICATIONS_KEEPALIVE'] = keepalive
+        with app.app_context():
+            admin_id = seed(20)
+            engine = db.engine
+            # Расходник с запасом выше минимума — его будем списывать до порога
+            supply = (Supply.query.filter(Supply.available_count > Supply.min_stock)
+                      .order_by(Supply.id).first())
+            supply_id = supply.id
+            to_dispose = [stock.id for stock in Stock.query.filter_by(
+                supply_id=supply_id, status='available').order_by(Stock.id)
+            ][:supply.available_count - supply.min_stock]
+
+        client = app.test_client()
+        login(client, admin_id)
+        cookie = f'session={client.get_cookie("session").value}'
+
+        server = serve(app)
+        try:
+            subscribers = [Subscriber(server.server_port, cookie) for _ in range(clients)]
+            for subscriber in subscribers:
+                subscriber.start()
+            for subscriber in subscribers:
+                if not subscriber.wait_for(lambda s: s.events, 10):
+                    raise RuntimeError('подписчик не получил начальный снимок')
+            initial = subscribers[0].events[0][0]
+
+            start = time.perf_counter()
+            with count_queries(engine) as statements:
+                for stock_id in to_dispose:
+                    response = client.post(f'/api/stock/{stock_id}/dispose', json={'reason': 'проверка'})
+                    if response.status_code != 200:
+                        raise RuntimeError(f'HTTP {response.status_code}: {response.get_json()}')
+                delivered = [subscriber.wait_for(
+                    lambda s: any(version != initial and any(item['id'] == supply_id for item in data)
+                                  for version, data in s.events), 10)
+                    for subscriber in subscribers]
+                latency = time.perf_counter() - start
+                queries = len(statements)
+        finally:
+            server.shutdown()
+            shutdown(app)
+        return sum(delivered), queries / len(to_dispose), latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 50])
+    parser.add_argument('--keepalive', type=int, default=1, help='NOTIFICATIONS_KEEPALIVE, секунд')
+    args = parser.parse_args()
+
+    print(f'{"подписчиков":>12} {"получили":>9} {"SQL на списание":>16} {"доставка, с":>12}')
+    failed = False
+    per_dispose = set()
+    for clients in args.clients:
+        delivered, queries, latency = run(clients, args.keepalive)
+        print(f'{clients:12} {delivered:9} {queries:16.1f} {latency:12.2f}')
+        failed |= delivered != clients
+        per_dispose.add(queries)
+    if failed:
+        print('ОШИБКА: не все подписчики получили событие')
+        return 1
+    if len(per_dispose) > 1:
+        print('ОШИБКА: число запросов растёт вместе с числом подписчиков')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
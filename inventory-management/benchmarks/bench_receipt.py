@@ -0,0 +1,83 @@
+"""
+Пропускная способность прихода на склад (единиц в секунду).
+
+Сравнивает пакетный эндпоинт POST /api/stock/receipt/bulk (диапазоны
+серийных номеров) с поштучным добавлением через ORM — Stock и Movement
+на каждую единицу, как работал прежний приход. База — временный файл SQLite.
+
+    python -m benchmarks.bench_receipt [--sizes 1000 10000 50000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from .common import make_app, seed, login, shutdown
+from app import db
+from app.models import Stock, Movement, MovementType, Supply
+
+
+def orm_one_by_one(app, user_id, supply_id, count, run):
+    with app.app_context():
+        start = time.perf_counter()
+        for n in range(count):
+            stock = Stock(supply_id=supply_id, serial_number=f'ORM-{run}-{n:07d}')
+            db.session.add(stock)
+            db.session.flush()
+            db.session.add(Movement(stock_id=stock.id, type=MovementType.RECEIPT,
+                                    user_id=user_id, notes='Поступление на склад'))
+        Supply.adjust_available(supply_id, count)
+        db.session.commit()
+        return time.perf_counter() - start
+
+
+def bulk_endpoint(client, supply_id, count, run):
+    start = time.perf_counter()
+    response = client.post('/api/stock/receipt/bulk', json={'lines': [{
+        'supply_id': supply_id,
+        'serial_range': {'prefix': f'BULK-{run}-', 'start': 1, 'end': count, 'width': 7},
+    }]})
+    elapsed = time.perf_counter() - start
+    if response.status_code != 201:
+        raise RuntimeError(f'HTTP {response.status_code}: {response.get_json()}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--skip-orm', action='store_true', help='не замерять поштучный вариант')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app('sqlite:///' + os.path.join(tmp, 'inventory.db'))
+        app.config['RECEIPT_MAX_ITEMS'] = max(args.sizes)
+        with app.app_context():
+            admin_id = seed(10)
+            supply_id = Supply.query.first().id
+        client = app.test_client()
+        login(client, admin_id)
+
+        print(f'{"единиц":>8} {"поштучно, ед/с":>16} {"пакетно, ед/с":>16} {"ускорение":>10}')
+        for run, size in enumerate(args.sizes):
+            bulk = bulk_endpoint(client, supply_id, size, run)
+            if args.skip_orm:
+                print(f'{size:8} {"—":>16} {size / bulk:16.0f}')
+                continue
+            orm = orm_one_by_one(app, admin_id, supply_id, size, run)
+            print(f'{size:8} {size / orm:16.0f} {size / bulk:16.0f} {orm / bulk:9.1f}x')
+
+        shutdown(app)
+        with app.app_context():
+            orphans = Movement.query.filter(Movement.stock_id.is_(None)).count()
+            counted = Stock.query.filter_by(supply_id=supply_id, status='available').count()
+            if orphans or db.session.get(Supply, supply_id).available_count != counted:
+                print('ОШИБКА: движения без единицы или счётчик остатка разошёлся')
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Повторные запросы к списочным эндпоинтам: без кэша, из кэша и с If-None-Match.
+
+Для каждого эндпоинта печатает среднее время ответа в трёх режимах и размер
+тела без сжатия и с gzip. Сброс кэша после коммита, ETag сжатого варианта
+и кэширование только ответов 200 проверяет tests/test_response_cache.py.
+
+    python -m benchmarks.bench_response_cache [--scale 500] [--repeat 20]
+"""
+
+import argparse
+import sys
+import time
+
+from .common import make_app, seed, login
+from app.cache import get_cache
+
+ENDPOINTS = ['/api/rooms', '/api/printer-models', '/api/printers', '/api/supplies', '/api/stock']
+
+
+def timed(client, url, repeat, headers=None):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url, headers=headers)
+    return (time.perf_counter() - start) / repeat * 1000, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        admin_id = seed(args.scale)
+    client = app.test_client()
+    login(client, admin_id)
+
+    print(f'{"эндпоинт":22} {"без кэша, мс":>13} {"кэш, мс":>9} {"304, мс":>9} '
+          f'{"тело, КБ":>9} {"gzip, КБ":>9}')
+    for url in ENDPOINTS:
+        app.config['RESPONSE_CACHE_ENABLED'] = False
+        uncached, response = timed(client, url, args.repeat)
+        plain_size = len(response.get_data())
+
+        app.config['RESPONSE_CACHE_ENABLED'] = True
+        client.get(url)
+        cached, response = timed(client, url, args.repeat)
+        etag = response.headers['ETag']
+        not_modified, response = timed(client, url, args.repeat, {'If-None-Match': etag})
+        if response.status_code != 304:
+            print(f'ОШИБКА: {url} не вернул 304 на актуальный ETag')
+            return 1
+        zipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        print(f'{url:22} {uncached:13.2f} {cached:9.2f} {not_modified:9.2f} '
+              f'{plain_size / 1024:9.1f} {len(zipped.get_data()) / 1024:9.1f}')
+
+    with app.app_context():
+        cache = get_cache()
+        print(f'попаданий: {cache.hits}, промахов: {cache.misses}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
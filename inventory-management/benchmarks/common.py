@@ -0,0 +1,118 @@
+"""
+Общие части скриптов замеров: приложение на отдельной базе, синтетические
+данные и тестовый клиент с вошедшим пользователем.
+"""
+
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import (User, UserRole, Room, PrinterModel, Printer, Supply, SupplyType,
+                        Stock, PrinterSupply, Movement, MovementType, History,
+                        reconcile_stock_counters)
+from config import Config
+
+
+def make_app(database_uri='sqlite://', **config):
+    """Приложение с собственной базой (по умолчанию в памяти) и пустой схемой.
+
+    Журнал действий буферизуется в памяти, если в config не задан AUDIT_SPOOL_DIR.
+    """
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_uri
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        AUDIT_SPOOL_DIR = None
+
+    for name, value in config.items():
+        setattr(BenchConfig, name, value)
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed(scale, seed=42):
+    """Заполнить базу: scale кабинетов и принтеров, ~3*scale единиц на складе.
+
+    Вызывается внутри app_context. Возвращает id администратора.
+    """
+    rnd = random.Random(seed)
+    admin = User(username='admin', email='admin@example.com', role=UserRole.ADMIN)
+    admin.set_password('admin123')
+    db.session.add(admin)
+
+    rooms = [Room(number=f'{i:04d}', name=f'Кабинет {i}', floor=i % 5 + 1, building='Главный корпус')
+             for i in range(scale)]
+    models = [PrinterModel(manufacturer='HP', model=f'LaserJet {i}') for i in range(max(1, scale // 5))]
+    supplies = [Supply(code=f'CRG-{i:04d}', name=f'Картридж {i}', type=SupplyType.CARTRIDGE,
+                       color='black', min_stock=rnd.randint(1, 5))
+                for i in range(max(1, scale // 2))]
+    db.session.add_all(rooms + models + supplies)
+    db.session.flush()
+
+    printers = [Printer(inventory_number=f'INV-{i:05d}', serial_number=f'SN-{i:05d}',
+                        model_id=rnd.choice(models).id, room_id=rnd.choice(rooms).id)
+                for i in range(scale)]
+    db.session.add_all(printers)
+    db.session.flush()
+
+    start = datetime(2024, 1, 1)
+    stock = [Stock(supply_id=rnd.choice(supplies).id, serial_number=f'S-{i:06d}',
+                   receipt_date=start + timedelta(minutes=i))
+             for i in range(scale * 3)]
+    db.session.add_all(stock)
+    db.session.flush()
+
+    movements, installed = [], []
+    for i, item in enumerate(stock):
+        movements.append(Movement(stock_id=item.id, type=MovementType.RECEIPT, user_id=admin.id,
+                                  timestamp=item.receipt_date))
+        if i % 3 == 0:
+            printer = rnd.choice(printers)
+            item.status = 'installed'
+            installed.append(PrinterSupply(printer_id=printer.id, stock_id=item.id,
+                                           installed_date=item.receipt_date))
+            movements.append(Movement(stock_id=item.id, type=MovementType.INSTALL, user_id=admin.id,
+                                      printer_id=printer.id,
+                                      timestamp=item.receipt_date + timedelta(days=1)))
+    history = [History(user_id=admin.id, action='receipt_stock', description=f'Запись {i}',
+                       timestamp=start + timedelta(minutes=i))
+               for i in range(scale)]
+    db.session.add_all(installed + movements + history)
+    db.session.flush()
+    reconcile_stock_counters()
+    db.session.commit()
+    return admin.id
+
+
+def shutdown(app):
+    """Дописать журнал действий до удаления временной базы"""
+    writer = app.extensions.get('audit_writer')
+    if writer is not None:
+        writer.close()
+
+
+def login(client, user_id):
+    """Сессия flask_login без прохождения формы входа"""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+@contextmanager
+def count_queries(engine):
+    """Считает SQL-операторы, выполненные через engine внутри блока"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
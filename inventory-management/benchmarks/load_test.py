@@ -0,0 +1,185 @@
+"""
+Нагрузочный тест production-профиля: задержки p50/p99 и запросов в секунду.
+
+Готовит базу с синтетическими данными (если файла ещё нет), при --serve
+сам запускает gunicorn или waitress с wsgi.py на этой базе и после теста
+останавливает его штатно (SIGTERM). Пользователи — потоки с keep-alive
+соединением, запросы выбираются по весам из MIX. Сессия входа подписывается
+тем же SECRET_KEY, что и у сервера (переменная окружения или config.py).
+
+    python -m benchmarks.load_test --db load.db --scale 500 --serve gunicorn --users 32 --duration 30
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --users 16
+    python -m benchmarks.load_test --print-cookie     # для benchmarks/locustfile.py
+"""
+
+import argparse
+import http.client
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from flask import Flask
+
+from .common import make_app, seed, shutdown
+from config import Config
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# (метод, адрес, вес); POST создаёт кабинет с уникальным номером
+MIX = [
+    ('GET', '/api/printers?limit=50', 3),
+    ('GET', '/api/stock?limit=50', 3),
+    ('GET', '/api/supplies', 2),
+    ('GET', '/api/rooms', 2),
+    ('GET', '/api/movements?limit=50', 2),
+    ('GET', '/api/history?paginate=cursor&limit=50', 1),
+    ('GET', '/api/notifications/low-stock', 2),
+    ('POST', '/api/rooms', 1),
+]
+
+
+def session_cookie(user_id=1):
+    """Cookie сессии flask_login, подписанная SECRET_KEY сервера"""
+    app = Flask(__name__)
+    app.secret_key = Config.SECRET_KEY
+    serializer = app.session_interface.get_signing_serializer(app)
+    return 'session=' + serializer.dumps({'_user_id': str(user_id), '_fresh': True})
+
+
+def prepare(db_file, scale):
+    if os.path.exists(db_file):
+        return
+    app = make_app('sqlite:///' + os.path.abspath(db_file))
+    with app.app_context():
+        seed(scale)
+    shutdown(app)
+
+
+def start_server(kind, db_file, bind):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.abspath(db_file), BIND=bind)
+    if kind == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    else:
+        command = [sys.executable, 'wsgi.py']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    host, _, port = bind.rpartition(':')
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, int(port)), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f'{kind} завершился с кодом {process.returncode}')
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{kind} не начал слушать {bind}')
+
+
+def stop_server(process):
+    if os.name == 'nt':
+        process.terminate()
+    else:
+        process.send_signal(signal.SIGTERM)
+    return process.wait(timeout=60)
+
+
+def user(base_url, cookie, measure_from, deadline, results, seed_value):
+    rnd = random.Random(seed_value)
+    parts = urlsplit(base_url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    choices = [(method, url) for method, url, weight in MIX for _ in range(weight)]
+    while time.monotonic() < deadline:
+        method, url = rnd.choice(choices)
+        body, headers = None, {'Cookie': cookie}
+        if method == 'POST':
+            body = f'{{"number": "LOAD-{seed_value}-{time.time_ns()}"}}'
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            conn.request(method, url, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            status = 0
+        if time.monotonic() >= measure_from:
+            results.append((f'{method} {url}', time.perf_counter() - start, status))
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(results, elapsed):
+    by_name = defaultdict(list)
+    errors = defaultdict(int)
+    for name, latency, status in results:
+        by_name[name].append(latency)
+        if not 200 <= status < 400:
+            errors[name] += 1
+    print(f'{"запрос":40} {"всего":>7} {"в сек":>8} {"p50, мс":>8} {"p99, мс":>8} {"ошибок":>7}')
+    for name in sorted(by_name) + ['ИТОГО']:
+        latencies = sorted(by_name[name] if name != 'ИТОГО' else [r[1] for r in results])
+        failed = errors[name] if name != 'ИТОГО' else sum(errors.values())
+        print(f'{name:40} {len(latencies):7} {len(latencies) / elapsed:8.1f} '
+              f'{percentile(latencies, 0.5) * 1000:8.1f} {percentile(latencies, 0.99) * 1000:8.1f} '
+              f'{failed:7}')
+    return sum(errors.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default='load.db', help='база для --serve (создаётся, если её нет)')
+    parser.add_argument('--scale', type=int, default=500)
+    parser.add_argument('--serve', choices=['gunicorn', 'waitress'])
+    parser.add_argument('--bind', default='127.0.0.1:8000')
+    parser.add_argument('--url', help='уже запущенный сервер вместо --serve')
+    parser.add_argument('--user-id', type=int, default=1, help='от чьего имени идут запросы')
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20, help='секунд')
+    parser.add_argument('--warmup', type=float, default=5,
+                        help='секунд до начала замера (запуск воркеров, прогрев кэшей)')
+    parser.add_argument('--print-cookie', action='store_true')
+    args = parser.parse_args()
+
+    cookie = session_cookie(args.user_id)
+    if args.print_cookie:
+        print(cookie.partition('=')[2])
+        return 0
+    if not args.serve and not args.url:
+        parser.error('нужен --serve или --url')
+
+    process = None
+    if args.serve:
+        prepare(args.db, args.scale)
+        process = start_server(args.serve, args.db, args.bind)
+    base_url = args.url or f'http://{args.bind}'
+    try:
+        results = []
+        start = time.monotonic() + args.warmup
+        deadline = start + args.duration
+        threads = [threading.Thread(target=user, args=(base_url, cookie, start, deadline, results, n))
+                   for n in range(args.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = args.duration
+    finally:
+        if process is not None:
+            code = stop_server(process)
+            print(f'сервер остановлен, код выхода {code}')
+    return 1 if report(results, elapsed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Сценарий locust с той же смесью запросов, что и benchmarks/load_test.py.
+
+    pip install locust
+    python wsgi.py   # или gunicorn -c gunicorn.conf.py wsgi:app
+    LOAD_TEST_COOKIE=$(python -m benchmarks.load_test --print-cookie) \\
+        locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000 \\
+        --headless -u 50 -r 10 -t 1m
+
+Перцентили и запросы в секунду locust выводит в итоговой таблице.
+"""
+
+import os
+import time
+
+from locust import HttpUser, between, task
+
+
+class InventoryUser(HttpUser):
+    wait_time = between(0.1, 0.5)
+
+    def on_start(self):
+        self.client.cookies.set('session', os.environ['LOAD_TEST_COOKIE'])
+
+    @task(3)
+    def printers(self):
+        self.client.get('/api/printers?limit=50')
+
+    @task(3)
+    def stock(self):
+        self.client.get('/api/stock?limit=50')
+
+    @task(2)
+    def supplies(self):
+        self.client.get('/api/supplies')
+
+    @task(2)
+    def rooms(self):
+        self.client.get('/api/rooms')
+
+    @task(2)
+    def movements(self):
+        self.client.get('/api/movements?limit=50')
+
+    @task(1)
+    def history(self):
+        self.client.get('/api/history?paginate=cursor&limit=50')
+
+    @task(2)
+    def low_stock(self):
+        self.client.get('/api/notifications/low-stock')
+
+    @task(1)
+    def create_room(self):
+        self.client.post('/api/rooms', json={'number': f'LOCUST-{time.time_ns()}'},
+                         name='/api/rooms [POST]')
@@ -8,7 +8,56 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'inventory.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Пул соединений (для серверных СУБД; у SQLite пула нет)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = 30  # секунд ожидания свободного соединения
+    DB_POOL_RECYCLE = 1800  # секунд; раньше, чем сервер БД закроет простаивающее соединение
+    # SQLite: журнал WAL (чтение не ждёт записи) и ожидание блокировки вместо ошибки
+    SQLITE_WAL = True
+    SQLITE_BUSY_TIMEOUT = 15  # секунд
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     
     # Настройки для уведомлений о низких остатках
-    LOW_STOCK_THRESHOLD = 5  # Минимальное количество расходников
\ No newline at end of file
+    LOW_STOCK_THRESHOLD = 5  # Минимальное количество расходников
+    NOTIFICATIONS_KEEPALIVE = 15  # секунд между keepalive в потоке уведомлений
+    NOTIFICATIONS_STREAM_TIMEOUT = 25  # секунд; потом поток закрывается, браузер переподключается
+    # Ждущие подписчики (поток SSE, long-poll) на процесс; каждый занимает поток сервера,
+    # поэтому держите значение заметно меньше GUNICORN_THREADS / WAITRESS_THREADS
+    NOTIFICATIONS_MAX_SUBSCRIBERS = int(os.environ.get('NOTIFICATIONS_MAX_SUBSCRIBERS', 4))
+    NOTIFICATIONS_REFRESH_INTERVAL = 60  # пересчёт снимка для изменений из других процессов
+    
+    # Максимум единиц в одном приходе на склад
+    RECEIPT_MAX_ITEMS = 50000
+    
+    # Размер страницы списочных эндпоинтов API (limit/cursor)
+    API_PAGE_SIZE = 50
+    API_MAX_PAGE_SIZE = 500
+    
+    # Журнал действий: запись в фоне пачками через спул на диске
+    AUDIT_ASYNC = True
+    AUDIT_SPOOL_DIR = os.environ.get('AUDIT_SPOOL_DIR') or os.path.join(basedir, 'audit-spool')
+    AUDIT_SPOOL_FSYNC = True  # сбрасывать спул на диск при каждой записи
+    AUDIT_BATCH_SIZE = 500
+    AUDIT_FLUSH_INTERVAL = 1.0  # секунд
+    AUDIT_MAX_PENDING = 100000  # выше — запросы ждут сброса (backpressure)
+    AUDIT_BLOCK_TIMEOUT = 5.0  # секунд, не дольше
+    
+    # Кэш ответов списочных эндпоинтов API (ETag / 304)
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_TTL = 30  # секунд; срок, за который видны изменения из других процессов
+    RESPONSE_CACHE_MAX_ENTRIES = 64
+    RESPONSE_GZIP = True
+    RESPONSE_GZIP_MIN_SIZE = 1024  # байт
+    
+    # Метрики запросов на /metrics (формат Prometheus)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    # Если задан — доступ по Authorization: Bearer <токен>; если нет — только
+    # с самого сервера (не через прокси) или вошедшему администратору
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_SLOW_QUERY_MS = 200  # SQL дольше — в журнал (текст и число параметров)
+    METRICS_DEBUG_HEADER = False  # заголовок Server-Timing в ответах тем, кому видны метрики
+    
+    # Снимок статистики главной страницы: не старше стольких секунд (0 — без снимка)
+    DASHBOARD_MAX_STALENESS = 30
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Настройки gunicorn для production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Число воркеров и потоков переопределяется переменными WEB_CONCURRENCY
+и GUNICORN_THREADS, адрес — BIND.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+
+# Процессы дают параллелизм на CPU; с SQLite запись всё равно идёт по одной,
+# поэтому больше 4 воркеров лишь удлиняют очередь на блокировку базы
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+worker_class = 'gthread'
+# Потоки обслуживают ожидание ввода-вывода, в том числе подписчиков
+# уведомлений (SSE, long-poll): их не больше NOTIFICATIONS_MAX_SUBSCRIBERS
+# на воркер, каждый поток SSE закрывается через NOTIFICATIONS_STREAM_TIMEOUT
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+timeout = 60
+keepalive = 5
+# При остановке воркер дорабатывает текущие запросы (потоки SSE закрываются
+# не позже чем через NOTIFICATIONS_STREAM_TIMEOUT) и дописывает журнал действий
+graceful_timeout = 30
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = 5000
+max_requests_jitter = 500
+
+# Приложение загружается в каждом воркере: фоновая запись журнала
+# запускает поток, который не переживает fork из мастер-процесса
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+
+
+def worker_exit(server, worker):
+    from wsgi import shutdown
+    shutdown()
@@ -1,5 +1,6 @@
 from app import create_app, db
-from app.models import User, UserRole, Room, PrinterModel, Supply, SupplyType, Printer, Stock
+from app.models import (User, UserRole, Room, PrinterModel, Supply, SupplyType, Printer, Stock,
+                        reconcile_stock_counters)
 from datetime import datetime, date
 
 app = create_app()
@@ -143,6 +144,9 @@ with app.app_context():
         )
         db.session.add(stock)
     
+    db.session.flush()
+    # Единицы добавлены напрямую, минуя API, — пересчитываем остатки
+    reconcile_stock_counters()
     db.session.commit()
     
     print("Демонстрационные данные успешно созданы!")
@@ -1,5 +1,7 @@
+import click
 from app import create_app, db
-from app.models import User, UserRole
+from app.models import (User, UserRole, Supply, missing_columns, reconcile_stock_counters,
+                        upgrade_schema)
 
 app = create_app()
 
@@ -7,6 +9,34 @@ app = create_app()
 def make_shell_context():
     return {'db': db, 'User': User}
 
+@app.cli.command('reconcile-stock')
+@click.option('--dry-run', is_flag=True, help='Только показать расхождения')
+def reconcile_stock(dry_run):
+    """Пересчитать счётчики остатков расходников по складу."""
+    # Схему команда не меняет, в том числе с --dry-run: столбец добавляет create-indexes
+    if 'supply.available_count' in missing_columns():
+        raise click.ClickException('В базе нет столбца supply.available_count; '
+                                   'добавьте его командой flask --app run create-indexes')
+    
+    fixed = reconcile_stock_counters()
+    for supply, was, now in fixed:
+        click.echo(f'{supply.code}: {was} -> {now}')
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    click.echo(f'Расхождений: {len(fixed)} из {Supply.query.count()}')
+
+@app.cli.command('create-indexes')
+def create_indexes():
+    """Добавить столбцы и индексы, которых нет в существующей базе."""
+    added = upgrade_schema()
+    for name in added:
+        click.echo(f'Добавлен столбец {name}')
+    if 'supply.available_count' in added:
+        click.echo('Счётчики остатков пересчитаны')
+    click.echo('Индексы созданы')
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
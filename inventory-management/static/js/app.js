@@ -1,33 +1,68 @@
+// Обновление значка уведомлений о низких остатках
+function renderNotifications(notifications) {
+    const badge = $('#notification-badge');
+    if (notifications.length > 0) {
+        badge.text(notifications.length).show();
+        
+        // Показываем критические уведомления
+        const critical = notifications.filter(n => n.severity === 'critical');
+        if (critical.length > 0) {
+            badge.removeClass('bg-danger bg-warning').addClass('bg-danger');
+        } else {
+            badge.removeClass('bg-danger bg-warning').addClass('bg-warning');
+        }
+    } else {
+        badge.hide();
+    }
+}
+
 // Проверка уведомлений о низких остатках
 function checkNotifications() {
     $.ajax({
         url: '/api/notifications/low-stock',
         method: 'GET',
-        success: function(notifications) {
-            const badge = $('#notification-badge');
-            if (notifications.length > 0) {
-                badge.text(notifications.length).show();
-                
-                // Показываем критические уведомления
-                const critical = notifications.filter(n => n.severity === 'critical');
-                if (critical.length > 0) {
-                    badge.removeClass('bg-danger bg-warning').addClass('bg-danger');
-                } else {
-                    badge.removeClass('bg-danger bg-warning').addClass('bg-warning');
-                }
-            } else {
-                badge.hide();
-            }
-        }
+        success: renderNotifications
     });
 }
 
+// Опрос раз в 60 секунд; через duration мс (если задано) снова пробуем подписку
+function pollNotifications(duration) {
+    checkNotifications();
+    const timer = setInterval(checkNotifications, 60000);
+    if (duration) {
+        setTimeout(function() {
+            clearInterval(timer);
+            subscribeNotifications();
+        }, duration);
+    }
+}
+
+// Подписка на изменения: сервер присылает событие, только когда остаток
+// пересёк порог. Поток закрывается сервером каждые ~25 секунд, и EventSource
+// переподключается сам, передавая Last-Event-ID. Если мест для подписчиков
+// нет (503), EventSource больше не переподключается — переходим на опрос
+function subscribeNotifications() {
+    const source = new EventSource('/api/notifications/stream');
+    source.addEventListener('low-stock', function(event) {
+        renderNotifications(JSON.parse(event.data));
+    });
+    source.onerror = function() {
+        if (source.readyState === EventSource.CLOSED) {
+            pollNotifications(5 * 60000);
+        }
+    };
+    return source;
+}
+
 // Проверяем уведомления при загрузке страницы
 $(document).ready(function() {
     if ($('#notification-badge').length > 0) {
-        checkNotifications();
-        // Проверяем каждые 60 секунд
-        setInterval(checkNotifications, 60000);
+        if (window.EventSource) {
+            subscribeNotifications();
+        } else {
+            // Старые браузеры без EventSource только опрашивают сервер
+            pollNotifications();
+        }
     }
     
     // Инициализация всплывающих подсказок Bootstrap
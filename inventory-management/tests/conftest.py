@@ -0,0 +1,52 @@
+"""
+Общие фикстуры тестов: приложение на базе в памяти, синтетические данные
+из benchmarks.common и тестовый клиент с вошедшим администратором.
+
+Запуск из каталога inventory-management:
+
+    python -m pytest
+"""
+
+import pytest
+
+from app import db
+from benchmarks.common import make_app, seed, login, count_queries, shutdown
+
+
+@pytest.fixture
+def make_seeded_app():
+    """Фабрика приложений: make_seeded_app(scale, **config) -> (app, id администратора)"""
+    apps = []
+
+    def factory(scale=20, **config):
+        app = make_app(**config)
+        with app.app_context():
+            admin_id = seed(scale)
+        apps.append(app)
+        return app, admin_id
+
+    yield factory
+    for app in apps:
+        shutdown(app)
+
+
+@pytest.fixture
+def app(make_seeded_app):
+    app, app.admin_id = make_seeded_app()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    login(client, app.admin_id)
+    return client
+
+
+@pytest.fixture
+def queries(app):
+    """Список SQL-операторов, выполненных за время теста"""
+    with app.app_context():
+        engine = db.engine
+    with count_queries(engine) as statements:
+        yield statements
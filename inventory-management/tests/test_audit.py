@@ -0,0 +1,178 @@
+"""Журнал действий: доставка из спула в History, восстановление после падения, синхронный режим"""
+
+import glob
+import json
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import audit, db
+from app.audit import get_writer
+from app.models import History, Room
+from benchmarks.common import login, make_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    return os.path.join(str(tmp_path), 'spool')
+
+
+@pytest.fixture
+def spooled_app(tmp_path, spool_dir, make_seeded_app):
+    """Приложение на файловой базе со спулом; фоновый сброс фактически выключен"""
+    app, app.admin_id = make_seeded_app(database_uri='sqlite:///' + os.path.join(str(tmp_path), 'inventory.db'),
+                                        AUDIT_SPOOL_DIR=spool_dir, AUDIT_FLUSH_INTERVAL=3600)
+    return app
+
+
+def spool_lines(spool_dir):
+    lines = []
+    for path in glob.glob(os.path.join(spool_dir, 'audit-*.jsonl')):
+        with open(path, encoding='utf-8') as f:
+            lines.extend(json.loads(line) for line in f if line.strip())
+    return lines
+
+
+def history_count(app, action):
+    with app.app_context():
+        return History.query.filter_by(action=action).count()
+
+
+def writer_stats(app):
+    with app.app_context():
+        return get_writer().stats()
+
+
+def test_spooled_records_are_flushed_to_history(spooled_app, spool_dir):
+    client = spooled_app.test_client()
+    login(client, spooled_app.admin_id)
+    for n in range(5):
+        assert client.post('/api/rooms', json={'number': f'A-{n}'}).status_code == 201
+    # До сброса записи лежат только в спуле
+    assert history_count(spooled_app, 'create_room') == 0
+    assert [line['action'] for line in spool_lines(spool_dir)] == ['create_room'] * 5
+    with spooled_app.app_context():
+        assert get_writer().flush()
+        assert get_writer().flush()  # повторный сброс не дублирует записи
+        rows = History.query.filter_by(action='create_room').all()
+    assert len(rows) == 5
+    assert all(row.audit_key for row in rows)
+    assert spool_lines(spool_dir) == []
+    assert writer_stats(spooled_app)['pending'] == 0
+
+
+def test_rolled_back_records_are_not_delivered(spooled_app):
+    with spooled_app.app_context():
+        audit.record(user_id=spooled_app.admin_id, action='rolled_back', entity_type='room')
+        db.session.add(Room(number='R-1'))
+        db.session.flush()
+        db.session.rollback()
+        get_writer().flush()
+    assert history_count(spooled_app, 'rolled_back') == 0
+
+
+def test_commit_failure_marks_spooled_records_aborted(spooled_app, spool_dir):
+    with spooled_app.app_context():
+        db.session.add(Room(number='DUP'))
+        db.session.commit()
+        audit.record(user_id=spooled_app.admin_id, action='failed_commit', entity_type='room')
+        db.session.add(Room(number='DUP'))  # нарушает UNIQUE уже при коммите
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+        # Записи успели попасть в спул до коммита, но доставлены не будут
+        assert any(line.get('aborted') for line in spool_lines(spool_dir))
+        get_writer().flush()
+    assert history_count(spooled_app, 'failed_commit') == 0
+
+
+def crash_child(db_file, spool_dir, count):
+    """Процесс, падающий сразу после коммита операции, до сброса спула"""
+    app = make_app('sqlite:///' + db_file, AUDIT_SPOOL_DIR=spool_dir, AUDIT_FLUSH_INTERVAL=3600)
+    with app.app_context():
+        for n in range(count):
+            db.session.add(Room(number=f'C-{n:05d}'))
+            audit.record(user_id=1, action='crash_test', entity_type='room', entity_id=n)
+        # Процесс убит между коммитом и любыми действиями писателя журнала после него
+        get_writer().end = lambda tx, committed: os._exit(1)
+        db.session.commit()
+    os._exit(2)
+
+
+def test_spool_of_crashed_process_is_recovered(tmp_path, spooled_app, spool_dir):
+    db_file = os.path.join(str(tmp_path), 'inventory.db')
+    child = subprocess.run(
+        [sys.executable, '-c', 'import sys; from tests.test_audit import crash_child; '
+                               'crash_child(sys.argv[1], sys.argv[2], int(sys.argv[3]))',
+         db_file, spool_dir, '200'],
+        cwd=ROOT, env=dict(os.environ, AUDIT_SPOOL_DIR=spool_dir),
+    )
+    assert child.returncode == 1
+    with spooled_app.app_context():
+        assert Room.query.filter(Room.number.like('C-%')).count() == 200
+        assert History.query.filter_by(action='crash_test').count() == 0
+        assert get_writer().flush()
+        assert get_writer().flush()
+        assert History.query.filter_by(action='crash_test').count() == 200
+    assert os.listdir(spool_dir) == []
+
+
+def write_orphan_segment(spool_dir, lines):
+    """Файл спула, оставшийся от упавшего процесса (без блокировки)"""
+    os.makedirs(spool_dir, exist_ok=True)
+    path = os.path.join(spool_dir, f'audit-99999-{uuid.uuid4().hex}.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines[:-1]))
+        # Строка, недописанная в момент падения
+        f.write(json.dumps(lines[-1], ensure_ascii=False)[:20])
+    return path
+
+
+def orphan(action, tx):
+    return {'key': uuid.uuid4().hex, 'user_id': 1, 'action': action, 'entity_type': 'room',
+            'entity_id': None, 'description': None, 'ip_address': None,
+            'timestamp': '2024-05-01T12:00:00', 'tx': tx}
+
+
+def test_orphan_segment_skips_aborted_and_duplicate_records(spooled_app, spool_dir):
+    duplicate = orphan('orphan', 'tx-1')
+    path = write_orphan_segment(spool_dir, [
+        duplicate, duplicate, orphan('orphan', 'tx-1'),
+        orphan('orphan_aborted', 'tx-2'), {'tx': 'tx-2', 'aborted': True},
+        orphan('orphan', 'tx-3'),
+    ])
+    with spooled_app.app_context():
+        assert get_writer().flush()
+    assert history_count(spooled_app, 'orphan') == 2
+    assert history_count(spooled_app, 'orphan_aborted') == 0
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize('config', [
+    {'AUDIT_ASYNC': False, 'AUDIT_SPOOL_DIR': 'spool'},
+    {'AUDIT_SPOOL_DIR': 'spool'},  # база в памяти — спул не используется
+])
+def test_synchronous_fallback(tmp_path, make_seeded_app, config):
+    spool = os.path.join(str(tmp_path), config['AUDIT_SPOOL_DIR'])
+    config = dict(config, AUDIT_SPOOL_DIR=spool)
+    if config.get('AUDIT_ASYNC') is False:
+        config['database_uri'] = 'sqlite:///' + os.path.join(str(tmp_path), 'inventory.db')
+    app, admin_id = make_seeded_app(**config)
+    with app.app_context():
+        assert get_writer() is None
+    client = app.test_client()
+    login(client, admin_id)
+    assert client.post('/api/rooms', json={'number': 'SYNC-1'}).status_code == 201
+    # Запись журнала зафиксирована в той же транзакции, что и операция
+    assert history_count(app, 'create_room') == 1
+    with app.app_context():
+        audit.record(user_id=admin_id, action='rolled_back')
+        db.session.rollback()
+    assert history_count(app, 'rolled_back') == 0
+    assert not os.path.exists(spool)
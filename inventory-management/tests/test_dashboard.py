@@ -0,0 +1,44 @@
+"""Снимок статистики главной страницы: те же значения, без запросов, обновление после изменений"""
+
+import time
+
+from benchmarks.bench_dashboard import legacy_dashboard
+from app.dashboard import dashboard_stats
+
+# Допустимое среднее время снимка из кэша, мс (с запасом для медленных машин)
+SNAPSHOT_MAX_MS = 2.0
+
+
+def test_snapshot_matches_per_counter_queries(app):
+    with app.test_request_context():
+        legacy, snapshot = legacy_dashboard(), dashboard_stats()
+    for key in ('rooms', 'printers', 'supplies', 'stock_available', 'low_stock_items'):
+        assert snapshot[key] == legacy[key], key
+    assert [m.timestamp for m in snapshot['recent_movements']] == \
+        [m.timestamp for m in legacy['recent_movements']]
+
+
+def test_snapshot_served_from_memory(app, queries):
+    with app.test_request_context():
+        dashboard_stats()
+        del queries[:]
+        start = time.perf_counter()
+        for _ in range(100):
+            dashboard_stats()
+        elapsed_ms = (time.perf_counter() - start) / 100 * 1000
+    assert queries == []
+    assert elapsed_ms < SNAPSHOT_MAX_MS
+
+
+def test_snapshot_refreshed_after_write(app, client):
+    with app.test_request_context():
+        before = dashboard_stats()['rooms']
+    assert client.post('/api/rooms', json={'number': 'DASH-1'}).status_code == 201
+    with app.test_request_context():
+        assert dashboard_stats()['rooms'] == before + 1
+
+
+def test_zero_staleness_computes_every_time(make_seeded_app):
+    app, _ = make_seeded_app(DASHBOARD_MAX_STALENESS=0)
+    with app.test_request_context():
+        assert dashboard_stats() is not dashboard_stats()
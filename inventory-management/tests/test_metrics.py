@@ -0,0 +1,124 @@
+"""Метрики запросов: формат /metrics, рост счётчиков, доступ и журнал медленных запросов"""
+
+import logging
+import re
+
+import pytest
+
+from app import db
+from benchmarks.common import count_queries, login
+
+URLS = ['/api/supplies', '/api/stock?limit=50', '/api/notifications/low-stock']
+# Строка сэмпла: имя{метки} значение
+SAMPLE = re.compile(r'^([a-z_]+)(\{[a-z_]+="[^"]*"(?:,[a-z_]+="[^"]*")*\})? ([0-9.e+-]+|\+Inf)$')
+REMOTE = {'REMOTE_ADDR': '10.0.0.5'}
+
+
+@pytest.fixture
+def metrics_app(make_seeded_app):
+    app, app.admin_id = make_seeded_app(METRICS_ENABLED=True, METRICS_DEBUG_HEADER=True,
+                                        RESPONSE_CACHE_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def metrics_client(metrics_app):
+    client = metrics_app.test_client()
+    login(client, metrics_app.admin_id)
+    return client
+
+
+def parse_exposition(text):
+    """{имя сэмпла: {метки: значение}}; проверяет, что у каждой метрики есть HELP и TYPE до сэмплов"""
+    declared, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            declared.setdefault(line.split()[2], set()).add('HELP')
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ', 3)
+            assert kind in ('counter', 'gauge', 'histogram')
+            declared.setdefault(name, set()).add('TYPE')
+            continue
+        match = SAMPLE.match(line)
+        assert match, f'неверная строка: {line!r}'
+        name, labels, value = match.groups()
+        family = re.sub(r'_(bucket|sum|count)$', '', name) if name not in declared else name
+        assert declared.get(family) == {'HELP', 'TYPE'}, f'{name} без HELP/TYPE'
+        samples.setdefault(name, {})[labels or ''] = float(value)
+    return samples
+
+
+def sql_counters(samples):
+    return {labels: value for labels, value in samples.get('inventory_sql_queries_total', {}).items()
+            if labels.startswith('{endpoint="api.')}
+
+
+def test_exposition_format(metrics_client):
+    for url in URLS:
+        assert metrics_client.get(url).status_code == 200
+    response = metrics_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == 'text/plain; version=0.0.4; charset=utf-8'
+    text = response.get_data(as_text=True)
+    assert text.endswith('\n')
+    samples = parse_exposition(text)
+    buckets = samples['inventory_request_duration_seconds_bucket']
+    counts = samples['inventory_request_duration_seconds_count']
+    for labels, count in counts.items():
+        series = [value for key, value in buckets.items() if key.startswith(labels[:-1] + ',le=')]
+        # Корзины накопительные, последняя (+Inf) равна числу наблюдений
+        assert series == sorted(series)
+        assert series[-1] == count
+
+
+def test_counters_grow_with_requests(metrics_app, metrics_client):
+    with metrics_app.app_context():
+        engine = db.engine
+    before = parse_exposition(metrics_client.get('/metrics').get_data(as_text=True))
+    with count_queries(engine) as statements:
+        for _ in range(3):
+            for url in URLS:
+                metrics_client.get(url)
+    after = parse_exposition(metrics_client.get('/metrics').get_data(as_text=True))
+    requests = after['inventory_requests_total']
+    label = '{endpoint="api.get_supplies",method="GET",status="200"}'
+    assert requests[label] - before.get('inventory_requests_total', {}).get(label, 0) == 3
+    # Число SQL-запросов совпадает с подсчитанным независимо
+    grown = sum(sql_counters(after).values()) - sum(sql_counters(before).values())
+    assert grown == len(statements) > 0
+
+
+def test_server_timing_header(metrics_client):
+    timing = metrics_client.get(URLS[0]).headers['Server-Timing']
+    assert re.fullmatch(r'app;dur=[0-9.]+, sql;dur=[0-9.]+;desc="\d+ queries"', timing)
+
+
+def test_access_without_token(metrics_app, metrics_client):
+    anonymous = metrics_app.test_client()
+    assert anonymous.get('/metrics').status_code == 200
+    assert anonymous.get('/metrics', environ_base=REMOTE).status_code == 403
+    assert anonymous.get('/metrics', headers={'X-Forwarded-For': '203.0.113.7'}).status_code == 403
+    assert metrics_client.get('/metrics', environ_base=REMOTE).status_code == 200
+    assert 'Server-Timing' not in anonymous.get(URLS[0], environ_base=REMOTE).headers
+
+
+def test_access_with_token(metrics_app, metrics_client):
+    metrics_app.config['METRICS_TOKEN'] = 'secret'
+    assert metrics_client.get('/metrics').status_code == 401
+    assert metrics_client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert metrics_client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+    assert 'Server-Timing' not in metrics_client.get(URLS[0]).headers
+
+
+def test_slow_query_log_omits_parameters(make_seeded_app, caplog):
+    app, admin_id = make_seeded_app(METRICS_ENABLED=True, METRICS_SLOW_QUERY_MS=0)
+    client = app.test_client()
+    login(client, admin_id)
+    with caplog.at_level(logging.WARNING, logger='app.metrics'):
+        assert client.get('/api/history?action=marker-7f3a').status_code == 200
+    messages = [record.getMessage() for record in caplog.records if record.name == 'app.metrics']
+    assert messages
+    assert all(re.search(r'; \d+ parameter\(s\)$', message) for message in messages)
+    assert not [message for message in messages if 'marker-7f3a' in message]
+    assert any('api.' in message and 'history' in message.lower() for message in messages)
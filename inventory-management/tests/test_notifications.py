@@ -0,0 +1,164 @@
+"""Лента низких остатков: публикация после фиксации, формат SSE, long-poll и лимит подписчиков"""
+
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+from app.models import Stock, Supply
+from app.notifications import low_stock_snapshot, snapshot_version
+from benchmarks.common import login
+
+
+@pytest.fixture
+def feed_app(tmp_path, make_seeded_app):
+    """Приложение на файловой базе: keepalive 0,5 с, поток живёт 1,2 с, одно место подписчика"""
+    path = os.path.join(str(tmp_path), 'inventory.db')
+    app, app.admin_id = make_seeded_app(database_uri='sqlite:///' + path, AUDIT_ASYNC=False,
+                                        NOTIFICATIONS_KEEPALIVE=0.5,
+                                        NOTIFICATIONS_STREAM_TIMEOUT=1.2,
+                                        NOTIFICATIONS_MAX_SUBSCRIBERS=1)
+    app.database_path = path
+    return app
+
+
+@pytest.fixture
+def feed_client(feed_app):
+    client = feed_app.test_client()
+    login(client, feed_app.admin_id)
+    return client
+
+
+@pytest.fixture
+def feed(feed_app):
+    return feed_app.extensions['low_stock_feed']
+
+
+def supply_above_minimum(app):
+    """(id расходника выше порога, id единиц, которые нужно списать до порога)"""
+    with app.app_context():
+        supply = (Supply.query.filter(Supply.available_count > Supply.min_stock)
+                  .order_by(Supply.id).first())
+        stock_ids = [stock.id for stock in Stock.query.filter_by(
+            supply_id=supply.id, status='available').order_by(Stock.id)]
+        return supply.id, stock_ids[:supply.available_count - supply.min_stock]
+
+
+def current_version(client):
+    return client.get('/api/notifications/low-stock').headers['X-Low-Stock-Version']
+
+
+def parse_sse(body):
+    """События потока: список словарей полей и число комментариев keepalive"""
+    events, keepalives = [], 0
+    for block in body.split('\n\n'):
+        if not block:
+            continue
+        if block.startswith(':'):
+            keepalives += 1
+            continue
+        events.append(dict(line.split(': ', 1) for line in block.split('\n')))
+    return events, keepalives
+
+
+def test_feed_published_after_commit(feed_app, feed_client, feed, monkeypatch):
+    supply_id, to_dispose = supply_above_minimum(feed_app)
+    initial = current_version(feed_client)
+    published = []
+    update = feed.update
+
+    def record(snapshot):
+        # Отдельное соединение видит только зафиксированные данные
+        conn = sqlite3.connect(feed_app.database_path)
+        committed = conn.execute('SELECT available_count FROM supply WHERE id = ?', (supply_id,)).fetchone()[0]
+        conn.close()
+        published.append((committed, snapshot))
+        update(snapshot)
+
+    monkeypatch.setattr(feed, 'update', record)
+    for stock_id in to_dispose:
+        assert feed_client.post(f'/api/stock/{stock_id}/dispose', json={'reason': 'тест'}).status_code == 200
+    assert len(published) == len(to_dispose)
+    for committed, snapshot in published:
+        in_snapshot = [item['current_stock'] for item in snapshot if item['id'] == supply_id]
+        assert in_snapshot in ([], [committed])
+    assert feed.version != initial
+    assert any(item['id'] == supply_id for item in published[-1][1])
+
+
+def test_failed_operation_does_not_publish(feed_client, feed, monkeypatch):
+    published = []
+    monkeypatch.setattr(feed, 'update', published.append)
+    assert feed_client.post('/api/stock/999999/dispose', json={}).status_code == 404
+    assert published == []
+
+
+def test_stream_framing(feed_app, feed_client, feed):
+    response = feed_client.get('/api/notifications/stream')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events, keepalives = parse_sse(response.get_data(as_text=True))
+    response.close()
+    assert len(events) == 1
+    event = events[0]
+    assert set(event) == {'id', 'event', 'retry', 'data'}
+    assert event['event'] == 'low-stock'
+    assert event['retry'] == '5000'
+    with feed_app.app_context():
+        snapshot = low_stock_snapshot()
+    assert json.loads(event['data']) == snapshot
+    assert event['id'] == snapshot_version(snapshot)
+    # Поток закрывается по NOTIFICATIONS_STREAM_TIMEOUT, между событиями — keepalive
+    assert keepalives >= 1
+    assert feed.subscribers == 0
+
+
+def test_stream_skips_event_already_seen(feed_client):
+    version = current_version(feed_client)
+    response = feed_client.get('/api/notifications/stream', headers={'Last-Event-ID': version})
+    events, keepalives = parse_sse(response.get_data(as_text=True))
+    response.close()
+    assert events == []
+    assert keepalives >= 1
+
+
+def test_long_poll_returns_after_keepalive(feed_client, feed):
+    version = current_version(feed_client)
+    start = time.perf_counter()
+    response = feed_client.get(f'/api/notifications/low-stock?since={version}')
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    assert response.headers['X-Low-Stock-Version'] == version
+    assert 0.5 <= elapsed < 2
+    assert feed.subscribers == 0
+
+
+def test_long_poll_with_old_version_answers_at_once(feed_client):
+    version = current_version(feed_client)
+    start = time.perf_counter()
+    response = feed_client.get('/api/notifications/low-stock?since=outdated')
+    assert time.perf_counter() - start < 0.4
+    assert response.headers['X-Low-Stock-Version'] == version
+
+
+def test_subscriber_cap(feed_client, feed):
+    assert feed.subscribe()  # единственное место занято другим подписчиком
+    try:
+        response = feed_client.get('/api/notifications/stream')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '60'
+        # Long-poll сверх лимита не ждёт, а отвечает обычным опросом
+        version = current_version(feed_client)
+        start = time.perf_counter()
+        response = feed_client.get(f'/api/notifications/low-stock?since={version}')
+        assert response.status_code == 200
+        assert time.perf_counter() - start < 0.4
+    finally:
+        feed.unsubscribe()
+    response = feed_client.get('/api/notifications/stream')
+    assert response.status_code == 200
+    response.close()
+    assert feed.subscribers == 0
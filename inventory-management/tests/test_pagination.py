@@ -0,0 +1,80 @@
+"""Страницы по курсору: полный обход в порядке ключа, без пропусков и повторов"""
+
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models import Printer, Stock, Movement, MovementType, History, Supply
+
+LIMIT = 7
+
+
+def walk(client, url):
+    """id всех строк, выданных страницами начиная с url"""
+    ids, separator = [], '&' if '?' in url else '?'
+    body = client.get(url).get_json()
+    while True:
+        ids += [item['id'] for item in body['items']]
+        if body['next_cursor'] is None:
+            return ids
+        body = client.get(f'{url}{separator}cursor={body["next_cursor"]}').get_json()
+
+
+@pytest.fixture
+def ties(app):
+    """Строки с одинаковым временем: порядок внутри них задаёт id"""
+    moment = datetime(2024, 6, 1, 12, 0)
+    with app.app_context():
+        supply = Supply.query.first()
+        db.session.add_all([Stock(supply_id=supply.id, serial_number=f'TIE-{i}', receipt_date=moment)
+                            for i in range(LIMIT * 2)])
+        db.session.add_all([History(user_id=app.admin_id, action='tie', timestamp=moment)
+                            for i in range(LIMIT * 2)])
+        db.session.commit()
+
+
+@pytest.mark.parametrize('url, model, order', [
+    (f'/api/printers?limit={LIMIT}', Printer, [Printer.id]),
+    (f'/api/stock?status=all&limit={LIMIT}', Stock, [Stock.receipt_date.desc(), Stock.id.desc()]),
+    (f'/api/movements?limit={LIMIT}', Movement, [Movement.timestamp.desc(), Movement.id.desc()]),
+    (f'/api/history?paginate=cursor&limit={LIMIT}', History, [History.timestamp.desc(), History.id.desc()]),
+])
+def test_walk_matches_key_order(app, client, ties, url, model, order):
+    with app.app_context():
+        expected = [row.id for row in model.query.order_by(*order)]
+    assert walk(client, url) == expected
+
+
+def test_walk_keeps_filters(app, client):
+    with app.app_context():
+        expected = [m.id for m in Movement.query.filter(Movement.type == MovementType.INSTALL)
+                    .order_by(Movement.timestamp.desc(), Movement.id.desc())]
+    assert walk(client, f'/api/movements?type=install&limit={LIMIT}') == expected
+
+
+def test_new_rows_do_not_shift_pages(app, client):
+    first = client.get(f'/api/history?paginate=cursor&limit={LIMIT}').get_json()
+    with app.app_context():
+        db.session.add(History(user_id=app.admin_id, action='late', timestamp=datetime(2030, 1, 1)))
+        db.session.commit()
+    second = client.get(f'/api/history?paginate=cursor&limit={LIMIT}&cursor={first["next_cursor"]}').get_json()
+    assert first['items'][-1]['id'] not in [item['id'] for item in second['items']]
+    assert second['items'][0]['timestamp'] <= first['items'][-1]['timestamp']
+
+
+def test_history_keeps_offset_shape_by_default(client):
+    body = client.get('/api/history?per_page=5').get_json()
+    assert set(body) == {'items', 'total', 'pages', 'current_page'}
+    assert len(body['items']) == 5
+    assert client.get('/api/history?page=2&limit=5').get_json()['current_page'] == 2
+
+
+@pytest.mark.parametrize('url', [
+    '/api/movements?cursor=not-a-cursor',
+    '/api/printers?limit=0',
+    '/api/stock?limit=abc',
+    '/api/movements?limit=5&type=unknown',
+])
+def test_bad_paging_arguments_rejected(client, url):
+    assert client.get(url).status_code == 400
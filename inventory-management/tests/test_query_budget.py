@@ -0,0 +1,57 @@
+"""Число SQL-запросов на запрос к API не зависит от числа строк и не больше бюджета"""
+
+import pytest
+
+from app import db
+from benchmarks.common import login, count_queries
+
+# Эндпоинт -> максимум SQL-запросов (включая загрузку пользователя сессии)
+QUERY_BUDGET = {
+    '/api/rooms': 2,
+    '/api/printer-models': 2,
+    '/api/printers': 3,
+    '/api/supplies': 2,
+    '/api/stock': 2,
+    '/api/movements': 2,
+    '/api/history': 3,
+    '/api/history?paginate=cursor&limit=50': 2,
+    '/api/printers?limit=50': 3,
+    '/api/stock?limit=50&date_from=2024-01-01': 2,
+    '/api/movements?limit=50&type=install': 2,
+    '/api/history?page=2': 3,
+    '/api/notifications/low-stock': 2,
+}
+SMALL, LARGE = 10, 200
+
+
+def measure(make_seeded_app, scale):
+    app, admin_id = make_seeded_app(scale)
+    with app.app_context():
+        engine = db.engine
+    client = app.test_client()
+    login(client, admin_id)
+    counts = {}
+    # Каждый запрос — со своим app context и пустой сессией, как в работе
+    for url in QUERY_BUDGET:
+        with count_queries(engine) as statements:
+            response = client.get(url)
+        assert response.status_code == 200, url
+        counts[url] = len(statements)
+    return counts
+
+
+@pytest.fixture
+def counts(make_seeded_app):
+    return measure(make_seeded_app, SMALL), measure(make_seeded_app, LARGE)
+
+
+def test_query_count_does_not_grow_with_rows(counts):
+    small, large = counts
+    grown = {url: (small[url], large[url]) for url in QUERY_BUDGET if small[url] != large[url]}
+    assert not grown
+
+
+def test_query_count_within_budget(counts):
+    _, large = counts
+    over = {url: (large[url], budget) for url, budget in QUERY_BUDGET.items() if large[url] > budget}
+    assert not over
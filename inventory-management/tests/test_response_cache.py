@@ -0,0 +1,109 @@
+"""Кэш ответов API: 304 по ETag, сброс после коммита, но не после отката, gzip и только ответы 200"""
+
+import gzip
+
+import pytest
+
+from app import db
+from app.cache import mark_changed
+from app.models import Room
+from benchmarks.common import login
+
+
+@pytest.fixture
+def cache(app):
+    return app.extensions['response_cache']
+
+
+def test_matching_etag_gets_304(client):
+    first = client.get('/api/rooms')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    second = client.get('/api/rooms', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+    assert client.get('/api/rooms', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_cached_body_is_reused(client, cache, queries):
+    first = client.get('/api/rooms')
+    del queries[:]
+    hits = cache.hits
+    second = client.get('/api/rooms')
+    assert second.data == first.data
+    assert cache.hits == hits + 1
+    # Остаются только запросы login_required (загрузка пользователя)
+    assert not [q for q in queries if 'room' in q.lower()]
+
+
+def test_commit_with_mark_changed_invalidates(client):
+    before = client.get('/api/rooms')
+    assert client.post('/api/rooms', json={'number': 'CACHE-1'}).status_code == 201
+    after = client.get('/api/rooms', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert 'CACHE-1' in [room['number'] for room in after.get_json()]
+
+
+def test_only_marked_groups_are_invalidated(app, cache):
+    with app.app_context():
+        before = cache.versions(('rooms', 'stock'))
+        mark_changed(['rooms'])
+        db.session.commit()
+        assert cache.versions(('rooms', 'stock')) == (before[0] + 1, before[1])
+
+
+@pytest.mark.parametrize('write_first', [True, False])
+def test_rollback_does_not_invalidate(app, cache, write_first):
+    with app.app_context():
+        before = cache.versions(('rooms',))
+        if write_first:
+            db.session.add(Room(number='ROLLBACK-1'))
+            db.session.flush()
+        mark_changed(['rooms'])
+        db.session.rollback()
+        # Отметки отменённой транзакции не переносятся на следующий коммит
+        db.session.commit()
+        assert cache.versions(('rooms',)) == before
+
+
+def client_for(make_seeded_app, **config):
+    app, admin_id = make_seeded_app(**config)
+    client = app.test_client()
+    login(client, admin_id)
+    return client
+
+
+def test_gzip_variant_has_its_own_etag(make_seeded_app):
+    client = client_for(make_seeded_app, RESPONSE_GZIP_MIN_SIZE=0)
+    plain = client.get('/api/rooms')
+    packed = client.get('/api/rooms', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(packed.data) == plain.data
+    assert packed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert 'Accept-Encoding' in packed.headers['Vary']
+    # ETag несжатого тела не подходит к сжатому варианту, и наоборот
+    assert client.get('/api/rooms', headers={'Accept-Encoding': 'gzip',
+                                             'If-None-Match': plain.headers['ETag']}).status_code == 200
+    assert client.get('/api/rooms', headers={'If-None-Match': packed.headers['ETag']}).status_code == 200
+    assert client.get('/api/rooms', headers={'Accept-Encoding': 'gzip',
+                                             'If-None-Match': packed.headers['ETag']}).status_code == 304
+
+
+def test_small_body_is_not_compressed(make_seeded_app):
+    client = client_for(make_seeded_app, RESPONSE_GZIP_MIN_SIZE=10 ** 6)
+    response = client.get('/api/rooms', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_only_200_responses_are_cached(client, cache):
+    first = client.get('/api/stock?supply=abc')
+    assert first.status_code == 400
+    assert 'ETag' not in first.headers
+    hits = cache.hits
+    assert client.get('/api/stock?supply=abc').status_code == 400
+    assert cache.hits == hits
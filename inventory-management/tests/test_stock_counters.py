@@ -0,0 +1,112 @@
+"""Счётчик Supply.available_count: меняется вместе со складом, пересчитывается командой"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import func, text
+
+from app import db
+from app.models import Supply, Stock, reconcile_stock_counters
+from benchmarks.common import make_app, seed, shutdown
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def counters_match():
+    actual = dict(db.session.query(Stock.supply_id, func.count(Stock.id))
+                  .filter(Stock.status == 'available').group_by(Stock.supply_id))
+    return all(s.available_count == actual.get(s.id, 0) for s in Supply.query)
+
+
+def test_counters_follow_stock_operations(app, client):
+    with app.app_context():
+        supply_id = Supply.query.first().id
+        printer_id = db.session.execute(text('SELECT id FROM printer LIMIT 1')).scalar()
+    response = client.post('/api/stock/receipt', json={'items': [
+        {'supply_id': supply_id, 'serial_number': f'CNT-{i}'} for i in range(3)]})
+    assert response.status_code == 201
+    with app.app_context():
+        stock_ids = [s.id for s in Stock.query.filter(Stock.serial_number.like('CNT-%'))]
+    assert client.post(f'/api/printers/{printer_id}/install-supply',
+                       json={'stock_id': stock_ids[0]}).status_code == 200
+    assert client.post(f'/api/stock/{stock_ids[1]}/dispose', json={}).status_code == 200
+    # Повторная установка той же единицы не должна уменьшать счётчик
+    assert client.post(f'/api/printers/{printer_id}/install-supply',
+                       json={'stock_id': stock_ids[0]}).status_code == 400
+    with app.app_context():
+        assert counters_match()
+
+
+def test_reconcile_fixes_drift(app):
+    with app.app_context():
+        supply = Supply.query.first()
+        db.session.execute(text('UPDATE supply SET available_count = available_count + 7 WHERE id = :id'),
+                           {'id': supply.id})
+        db.session.commit()
+        fixed = reconcile_stock_counters()
+        db.session.commit()
+        assert [(s.id, was - now) for s, was, now in fixed] == [(supply.id, 7)]
+        assert counters_match()
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """Файловая база без столбца supply.available_count и с устаревшими счётчиками"""
+    path = str(tmp_path / 'legacy.db')
+    app = make_app('sqlite:///' + path)
+    with app.app_context():
+        seed(10)
+        db.engine.dispose()
+    shutdown(app)
+    with sqlite3.connect(path) as conn:
+        conn.execute('DROP INDEX ix_supply_low_stock')
+        conn.execute('ALTER TABLE supply DROP COLUMN available_count')
+    return path
+
+
+def flask_cli(db_file, tmp_path, *args):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + db_file,
+               AUDIT_SPOOL_DIR=str(tmp_path / 'spool'))
+    return subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', *args],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def supply_columns(db_file):
+    with sqlite3.connect(db_file) as conn:
+        return {row[1] for row in conn.execute('PRAGMA table_info(supply)')}
+
+
+def test_dry_run_does_not_change_schema(legacy_db, tmp_path):
+    result = flask_cli(legacy_db, tmp_path, 'reconcile-stock', '--dry-run')
+    assert result.returncode != 0
+    assert 'create-indexes' in result.stderr
+    assert 'available_count' not in supply_columns(legacy_db)
+
+
+def counter_drift(db_file):
+    """Число расходников, у которых счётчик не совпадает со складом"""
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM supply WHERE available_count != "
+            "(SELECT COUNT(*) FROM stock WHERE stock.supply_id = supply.id AND status = 'available')"
+        ).fetchone()[0]
+
+
+def test_create_indexes_adds_and_reconciles_counter(legacy_db, tmp_path):
+    assert flask_cli(legacy_db, tmp_path, 'create-indexes').returncode == 0
+    assert 'available_count' in supply_columns(legacy_db)
+    assert counter_drift(legacy_db) == 0
+
+
+def test_dry_run_reports_without_writing(legacy_db, tmp_path):
+    flask_cli(legacy_db, tmp_path, 'create-indexes')
+    with sqlite3.connect(legacy_db) as conn:
+        conn.execute('UPDATE supply SET available_count = available_count + 1')
+    drift = counter_drift(legacy_db)
+    assert f'Расхождений: {drift} ' in flask_cli(legacy_db, tmp_path, 'reconcile-stock', '--dry-run').stdout
+    assert counter_drift(legacy_db) == drift
+    assert flask_cli(legacy_db, tmp_path, 'reconcile-stock').returncode == 0
+    assert counter_drift(legacy_db) == 0
@@ -0,0 +1,52 @@
+"""
+Точка входа для production-серверов.
+
+    gunicorn -c gunicorn.conf.py wsgi:app     # Linux
+    python wsgi.py                            # waitress (в том числе Windows)
+
+Схема базы и администратор создаются заранее (python run.py или
+flask --app run create-indexes для существующей базы); wsgi их не трогает.
+Настройки waitress — переменные окружения BIND (host:port, по умолчанию
+0.0.0.0:8000) и WAITRESS_THREADS.
+"""
+
+import os
+import signal
+import sys
+
+from app import create_app, db
+
+app = create_app()
+
+
+def shutdown():
+    """Доставить журнал действий и закрыть соединения перед выходом процесса"""
+    writer = app.extensions.get('audit_writer')
+    if writer is not None:
+        writer.close()
+    with app.app_context():
+        db.engine.dispose()
+
+
+def serve():
+    from waitress import serve as waitress_serve
+
+    host, _, port = os.environ.get('BIND', '0.0.0.0:8000').rpartition(':')
+    # SIGTERM (остановка службы) завершает сервер так же, как Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        waitress_serve(
+            app, host=host, port=int(port),
+            # Ждущие подписчики уведомлений занимают потоки сервера, но не больше
+            # NOTIFICATIONS_MAX_SUBSCRIBERS; остальные потоки обслуживают запросы
+            threads=int(os.environ.get('WAITRESS_THREADS', 16)),
+            connection_limit=200,
+            channel_timeout=120,
+            ident='inventory'
+        )
+    finally:
+        shutdown()
+
+
+if __name__ == '__main__':
+    serve()
@@ -1,7 +1,6 @@
 import sys
 import logging
 from PySide6.QtWidgets import QApplication, QDialog, QMessageBox
-from src.main_window import MainWindow
 from src.login_dialog import LoginDialog
 from src.database import init_db, UserManager
 
@@ -26,6 +25,8 @@ def main():
             auth_result = UserManager.authenticate(login, password)
             if auth_result:
                 user_role, username = auth_result
+                # Главное окно со всеми вкладками нужно только после входа
+                from src.main_window import MainWindow
                 main_window = MainWindow(user_role=user_role, username=username)
                 main_window.show()
                 return app.exec()
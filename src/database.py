@@ -3,15 +3,55 @@ Database module for Botsprinter application.
 Handles all database operations and schema management.
 """
 
+import os
 import sqlite3
 import hashlib
+import threading
+import queue
+import time
+import atexit
 from datetime import datetime
-from typing import List, Tuple, Optional, Dict, Any
+import random
+from typing import List, Tuple, Optional, Dict, Any, Callable, Iterator
 from contextlib import contextmanager
 import logging
+from src.migrations import run_migrations, rebuild_writeoff_monthly
+from src.query_cache import query_cache, cached, invalidates
 
 DB_FILE = "office.db"
 
+# Параметры пула соединений
+POOL_SIZE = 5
+POOL_TIMEOUT = 10.0          # сколько секунд ждать свободное соединение
+POOL_HEALTH_CHECK_IDLE = 30.0  # проверять соединение, простоявшее дольше N секунд
+
+# PRAGMA, применяемые к каждому новому соединению. По умолчанию журнал
+# DELETE: office.db обычно лежит на сетевом диске, а WAL требует разделяемой
+# памяти и на SMB/NFS может повредить базу. WAL (читатели не ждут пишущего
+# клиента) включается явно — configure_pragmas(journal_mode="WAL",
+# synchronous="NORMAL") или переменной окружения PRINTGUARD_DB_WAL=1 — и
+# действует только для базы на локальном диске (см. network_safe_profile).
+PRAGMA_PROFILE: Dict[str, Any] = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",     # с журналом DELETE NORMAL не защищает от сбоя питания
+    "cache_size": -16000,      # отрицательное значение — размер в КиБ
+    "mmap_size": 64 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,      # мс
+}
+if os.environ.get("PRINTGUARD_DB_WAL") == "1":
+    PRAGMA_PROFILE.update(journal_mode="WAL", synchronous="NORMAL")
+
+# Файловые системы, на которых WAL и mmap небезопасны
+NETWORK_FS_TYPES = ("nfs", "nfs4", "cifs", "smb", "smb2", "smb3", "smbfs", "fuse.sshfs")
+
+# Размер страницы истории (постраничная загрузка по ключу (datetime, id))
+HISTORY_PAGE_SIZE = 200
+
+# Повтор захвата блокировки записи при "database is locked"
+WRITE_RETRIES = 5
+WRITE_RETRY_BACKOFF = 0.05     # секунды, удваивается на каждой попытке
+
 logging.basicConfig(level=logging.ERROR)
 
 class DatabaseError(Exception):
@@ -22,26 +62,324 @@ def hash_password(password: str) -> str:
     """Hash a password using SHA-256."""
     return hashlib.sha256(password.encode("utf-8")).hexdigest()
 
+
+def is_network_path(path: str) -> bool:
+    """Return True if path is on a network share (UNC path, mapped drive, NFS/SMB mount)."""
+    full = os.path.abspath(path)
+    if full.startswith(("\\\\", "//")):
+        return True
+    if os.name == "nt":
+        import ctypes
+        drive = os.path.splitdrive(full)[0]
+        # DRIVE_REMOTE == 4: буква подключённого сетевого диска
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return False
+    # Файловая система самой длинной точки монтирования, содержащей путь
+    best, fs_type = "", ""
+    for point, kind in mounts:
+        point = point.replace("\\040", " ")
+        inside = full == point or full.startswith(point.rstrip("/") + "/")
+        if inside and len(point) > len(best):
+            best, fs_type = point, kind
+    return fs_type in NETWORK_FS_TYPES
+
+
+def network_safe_profile(database: str, profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Return the pragma profile for a database file.
+
+    WAL and mmap are refused when the file is on a network share: the
+    journal falls back to DELETE and a warning is logged.
+    """
+    profile = dict(PRAGMA_PROFILE if profile is None else profile)
+    if database == ":memory:" or not is_network_path(database):
+        return profile
+    if str(profile.get("journal_mode", "")).upper() == "WAL":
+        logging.warning("%s is on a network share, WAL is unsafe there; using journal_mode=DELETE",
+                        database)
+        profile["journal_mode"] = "DELETE"
+        profile["synchronous"] = "FULL"
+    profile.pop("mmap_size", None)
+    return profile
+
+
+def apply_pragmas(conn: sqlite3.Connection, profile: Optional[Dict[str, Any]] = None):
+    """Apply the pragma profile to a freshly opened connection."""
+    profile = PRAGMA_PROFILE if profile is None else profile
+    # busy_timeout ставим первым, чтобы смена journal_mode тоже ждала блокировку
+    ordered = sorted(profile.items(), key=lambda kv: kv[0] != "busy_timeout")
+    for name, value in ordered:
+        row = conn.execute(f"PRAGMA {name} = {value}").fetchone()
+        if name == "journal_mode" and row and str(row[0]).lower() != str(value).lower():
+            logging.warning("journal_mode=%s is not supported for %s, using %s",
+                            value, DB_FILE, row[0])
+
+def configure_pragmas(**overrides):
+    """Override pragma profile entries; a value of None removes the pragma.
+
+    Pooled connections are reopened so the new profile takes effect.
+    """
+    for name, value in overrides.items():
+        if value is None:
+            PRAGMA_PROFILE.pop(name, None)
+        else:
+            PRAGMA_PROFILE[name] = value
+    close_pool()
+
+def _is_busy_error(exc: sqlite3.Error) -> bool:
+    message = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+def _retry_busy(action: Callable[[], Any]):
+    """Run action, retrying with exponential backoff while the database is locked."""
+    delay = WRITE_RETRY_BACKOFF
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            return action()
+        except sqlite3.OperationalError as e:
+            if attempt == WRITE_RETRIES or not _is_busy_error(e):
+                raise
+            logging.warning("Database is busy, retry %d/%d", attempt + 1, WRITE_RETRIES)
+            time.sleep(delay + random.uniform(0, delay))
+            delay *= 2
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections to a single database file.
+
+    Connections are opened lazily up to ``size`` and handed out LIFO, so a
+    quiet client keeps reusing one warm connection. A connection that sat
+    idle longer than ``health_check_idle`` seconds is probed with
+    ``SELECT 1`` before reuse and replaced if the probe fails.
+    """
+
+    def __init__(self, database: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 health_check_idle: float = POOL_HEALTH_CHECK_IDLE):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+        self._watch_conn: Optional[sqlite3.Connection] = None
+        self._watch_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn, network_safe_profile(self.database))
+        return conn
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a connection, opening a new one if the pool is not full."""
+        if self._closed:
+            raise DatabaseError("Connection pool is closed")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._opened < self.size
+                    if can_open:
+                        self._opened += 1
+                if can_open:
+                    try:
+                        return self._connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._opened -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DatabaseError("Timed out waiting for a database connection")
+                try:
+                    conn, released_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise DatabaseError("Timed out waiting for a database connection")
+            if time.monotonic() - released_at > self.health_check_idle and not self._is_healthy(conn):
+                logging.warning("Dropping broken pooled connection to %s", self.database)
+                self._discard(conn)
+                continue
+            return conn
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False):
+        """Return a borrowed connection; an open transaction is rolled back."""
+        if broken or self._closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def data_version(self) -> int:
+        """PRAGMA data_version on a dedicated connection.
+
+        The value changes whenever any other connection, in this process or
+        another one, commits to the database file.
+        """
+        with self._watch_lock:
+            if self._watch_conn is None:
+                self._watch_conn = sqlite3.connect(self.database, check_same_thread=False)
+            return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        """Close every idle connection and refuse further borrowing."""
+        self._closed = True
+        with self._watch_lock:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+                self._watch_conn = None
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"size": self.size, "opened": self._opened, "idle": self._idle.qsize()}
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, (re)creating it if DB_FILE changed."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed or _pool.database != DB_FILE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_FILE)
+            _attach_cache(_pool)
+        return _pool
+
+def configure_pool(size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                   health_check_idle: float = POOL_HEALTH_CHECK_IDLE) -> ConnectionPool:
+    """Replace the process-wide pool with one using the given settings."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(DB_FILE, size=size, timeout=timeout,
+                               health_check_idle=health_check_idle)
+        _attach_cache(_pool)
+        return _pool
+
+def close_pool():
+    """Close all pooled connections (called automatically at exit)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        query_cache.clear()
+
+atexit.register(close_pool)
+
+# Проверять ли PRAGMA data_version, чтобы замечать записи других клиентов
+CACHE_CHECK_DATA_VERSION = True
+
+def _attach_cache(pool: ConnectionPool):
+    query_cache.clear()
+    query_cache.set_version_probe(pool.data_version if CACHE_CHECK_DATA_VERSION else None)
+
+def configure_cache(enabled: Optional[bool] = None, ttl: Optional[float] = None,
+                    max_entries: Optional[int] = None, check_data_version: Optional[bool] = None,
+                    version_check_interval: Optional[float] = None):
+    """Tune the manager query cache; any change drops cached results."""
+    global CACHE_CHECK_DATA_VERSION
+    if check_data_version is not None:
+        CACHE_CHECK_DATA_VERSION = check_data_version
+        if _pool is not None:
+            _attach_cache(_pool)
+    query_cache.configure(enabled=enabled, ttl=ttl, max_entries=max_entries,
+                          version_check_interval=version_check_interval)
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the manager query cache."""
+    return query_cache.stats
+
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections."""
+    """Context manager that borrows a connection from the pool."""
+    pool = get_pool()
     conn = None
+    broken = False
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
+        conn = pool.acquire()
         yield conn
     except sqlite3.Error as e:
         if conn:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
         logging.error(f"Database error: {e}")
         raise DatabaseError(f"Database error: {e}")
     finally:
         if conn:
-            conn.close()
+            pool.release(conn, broken=broken)
+
+def _connection_data_version(conn: sqlite3.Connection) -> Optional[int]:
+    """PRAGMA data_version of a pooled connection; unchanged by its own commits."""
+    try:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+    except sqlite3.Error:
+        return None
+
+@contextmanager
+def write_transaction():
+    """Context manager for a write transaction on a pooled connection.
+
+    Takes the write lock up front (BEGIN IMMEDIATE) so a read-then-write
+    block cannot fail half way with SQLITE_BUSY, retries lock acquisition
+    and COMMIT with backoff, and rolls back if the block raises.
+    """
+    with get_db_connection() as conn:
+        _retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"))
+        # Под блокировкой записи чужой коммит невозможен: кэш сверяет версию базы
+        query_cache.before_write()
+        own_version = _connection_data_version(conn)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        _retry_busy(conn.commit)
+        query_cache.after_write(own_version, lambda: _connection_data_version(conn))
 
 def init_db():
     """Initialize the database with required tables."""
-    with get_db_connection() as conn:
+    with write_transaction() as conn:
         cursor = conn.cursor()
         
         # Users table
@@ -95,6 +433,8 @@ def init_db():
                 writeoff_drum INTEGER DEFAULT 0,
                 datetime TEXT NOT NULL,
                 username TEXT,
+                cartridge TEXT,  -- модели расходников на момент списания
+                drum TEXT,
                 FOREIGN KEY (printer_id) REFERENCES printers(id)
             )
         ''')
@@ -123,7 +463,16 @@ def init_db():
             )
         ''')
         
-        conn.commit()
+        # Indexes, constraints and later schema changes
+        run_migrations(conn)
+    query_cache.clear()
+
+
+@invalidates("writeoff_monthly")
+def rebuild_monthly_usage() -> int:
+    """Rebuild the writeoff_monthly aggregate from the full writeoff history."""
+    with write_transaction() as conn:
+        return rebuild_writeoff_monthly(conn)
 
 
 class UserManager:
@@ -145,6 +494,7 @@ class UserManager:
             return None
     
     @staticmethod
+    @cached("users")
     def get_all_users() -> List[Dict[str, Any]]:
         """Get all users from the database."""
         with get_db_connection() as conn:
@@ -153,25 +503,26 @@ class UserManager:
             return [dict(row) for row in cursor.fetchall()]
     
     @staticmethod
+    @invalidates("users")
     def add_user(login: str, password: str, role: str) -> bool:
         """Add a new user to the database."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "INSERT INTO users (login, password, role) VALUES (?, ?, ?)",
                     (login, hash_password(password), role)
                 )
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @invalidates("users")
     def update_user(user_id: int, login: str, password: str, role: str) -> bool:
         """Update an existing user."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 if password:
                     cursor.execute(
@@ -183,19 +534,18 @@ class UserManager:
                         "UPDATE users SET login = ?, role = ? WHERE id = ?",
                         (login, role, user_id)
                     )
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @invalidates("users")
     def delete_user(user_id: int) -> bool:
         """Delete a user from the database."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-                conn.commit()
                 return True
         except DatabaseError:
             return False
@@ -205,6 +555,7 @@ class CabinetManager:
     """Manages cabinet-related database operations."""
     
     @staticmethod
+    @cached("cabinets")
     def get_all_cabinets() -> List[Dict[str, Any]]:
         """Get all cabinets from the database."""
         with get_db_connection() as conn:
@@ -213,37 +564,37 @@ class CabinetManager:
             return [dict(row) for row in cursor.fetchall()]
     
     @staticmethod
+    @invalidates("cabinets")
     def add_cabinet(name: str) -> bool:
         """Add a new cabinet to the database."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute("INSERT INTO cabinets (name) VALUES (?)", (name,))
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @invalidates("cabinets")
     def update_cabinet(cabinet_id: int, name: str) -> bool:
         """Update an existing cabinet."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute("UPDATE cabinets SET name = ? WHERE id = ?", (name, cabinet_id))
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @invalidates("cabinets")
     def delete_cabinet(cabinet_id: int) -> bool:
         """Delete a cabinet from the database."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM cabinets WHERE id = ?", (cabinet_id,))
-                conn.commit()
                 return True
         except DatabaseError:
             return False
@@ -253,6 +604,7 @@ class PrinterManager:
     """Manages printer-related database operations."""
     
     @staticmethod
+    @cached("printers", "cabinets")
     def get_all_printers() -> List[Dict[str, Any]]:
         """Get all printers with cabinet information."""
         with get_db_connection() as conn:
@@ -269,25 +621,26 @@ class PrinterManager:
             return [dict(row) for row in cursor.fetchall()]
     
     @staticmethod
+    @invalidates("printers")
     def add_printer(cabinet_id: int, name: str, cartridge: str = "", drum: str = "") -> bool:
         """Add a new printer to the database."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "INSERT INTO printers (cabinet_id, name, cartridge, drum) VALUES (?, ?, ?, ?)",
                     (cabinet_id, name, cartridge, drum)
                 )
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @invalidates("printers")
     def update_printer(printer_id: int, **kwargs) -> bool:
         """Update an existing printer."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 # Build dynamic update query based on provided kwargs
                 set_clause = ", ".join([f"{key} = ?" for key in kwargs.keys()])
@@ -297,24 +650,24 @@ class PrinterManager:
                     f"UPDATE printers SET {set_clause} WHERE id = ?", 
                     values
                 )
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @invalidates("printers")
     def delete_printer(printer_id: int) -> bool:
         """Delete a printer from the database."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM printers WHERE id = ?", (printer_id,))
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @cached("printers")
     def get_low_stock_warnings() -> List[str]:
         """Get warnings for printers with low stock."""
         warnings = []
@@ -364,6 +717,7 @@ class StorageManager:
     """Manages storage-related database operations."""
     
     @staticmethod
+    @cached("storage")
     def get_all_storage() -> List[Dict[str, Any]]:
         """Get all storage items."""
         with get_db_connection() as conn:
@@ -372,32 +726,18 @@ class StorageManager:
             return [dict(row) for row in cursor.fetchall()]
     
     @staticmethod
+    @invalidates("storage", "storage_transfer_history")
     def add_to_storage(model: str, item_type: str, amount: int, username: str) -> bool:
         """Add items to storage."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 
-                # Check if item already exists
-                cursor.execute(
-                    "SELECT id, amount FROM storage WHERE model = ? AND type = ?",
-                    (model, item_type)
-                )
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing item
-                    new_amount = existing['amount'] + amount
-                    cursor.execute(
-                        "UPDATE storage SET amount = ? WHERE id = ?",
-                        (new_amount, existing['id'])
-                    )
-                else:
-                    # Insert new item
-                    cursor.execute(
-                        "INSERT INTO storage (model, type, amount) VALUES (?, ?, ?)",
-                        (model, item_type, amount)
-                    )
+                # UNIQUE(model, type) позволяет обойтись одним UPSERT
+                cursor.execute('''
+                    INSERT INTO storage (model, type, amount) VALUES (?, ?, ?)
+                    ON CONFLICT(model, type) DO UPDATE SET amount = amount + excluded.amount
+                ''', (model, item_type, amount))
                 
                 # Add to transfer history
                 cursor.execute('''
@@ -410,17 +750,17 @@ class StorageManager:
                     "внешние поставки", "склад"
                 ))
                 
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @invalidates("storage", "printers", "storage_transfer_history")
     def transfer_to_printer(model: str, item_type: str, amount: int, 
                           printer_id: int, username: str) -> bool:
         """Transfer items from storage to printer."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 # Проверка остатка на складе
                 cursor.execute(
@@ -458,12 +798,12 @@ class StorageManager:
                     username, model, item_type, amount,
                     "склад", printer_name
                 ))
-                conn.commit()
                 return True
         except DatabaseError:
             return False
     
     @staticmethod
+    @cached("printers")
     def get_compatible_printers(model: str, item_type: str) -> List[Dict[str, Any]]:
         """Get printers compatible with the given supply model."""
         with get_db_connection() as conn:
@@ -475,6 +815,7 @@ class StorageManager:
             return [dict(row) for row in cursor.fetchall()]
     
     @staticmethod
+    @cached("storage")
     def get_storage_summary() -> Dict[str, int]:
         """Get summary of storage quantities."""
         with get_db_connection() as conn:
@@ -488,32 +829,56 @@ class StorageManager:
             return {"cartridges": cartridge_sum, "drums": drum_sum}
     
     @staticmethod
+    @invalidates("storage")
     def set_storage_amount(model: str, item_type: str, amount: int) -> bool:
         """Установить новое количество для расходника на складе."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "UPDATE storage SET amount = ? WHERE model = ? AND type = ?",
                     (amount, model, item_type)
                 )
-                conn.commit()
                 return cursor.rowcount > 0
         except DatabaseError:
             return False
     
     @staticmethod
+    @invalidates("writeoff_history", "writeoff_monthly", "printers")
     def add_writeoff_record(printer_id: int, writeoff_cartridge: int, writeoff_drum: int, username: str) -> bool:
         """Добавить запись о замене/списании расходников в writeoff_history."""
         try:
-            with get_db_connection() as conn:
+            with write_transaction() as conn:
                 cursor = conn.cursor()
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                # Модели запоминаются в самом списании: агрегат и его пересборка
+                # (rebuild_writeoff_monthly) не зависят от последующих правок принтера
+                cursor.execute(
+                    "SELECT COALESCE(cartridge, ''), COALESCE(drum, '') FROM printers WHERE id = ?",
+                    (printer_id,)
+                )
+                cartridge, drum = cursor.fetchone() or ("", "")
                 cursor.execute(
                     """
-                    INSERT INTO writeoff_history (printer_id, writeoff_cartridge, writeoff_drum, datetime, username)
-                    VALUES (?, ?, ?, ?, ?)
+                    INSERT INTO writeoff_history
+                        (printer_id, writeoff_cartridge, writeoff_drum, datetime, username, cartridge, drum)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                     """,
-                    (printer_id, writeoff_cartridge, writeoff_drum, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), username)
+                    (printer_id, writeoff_cartridge, writeoff_drum, now, username, cartridge, drum)
+                )
+                # Помесячный агрегат для аналитики обновляется в той же транзакции;
+                # списания без принтера попадают в printer_id 0 (неизвестный принтер)
+                cursor.execute(
+                    """
+                    INSERT INTO writeoff_monthly
+                        (month, printer_id, cartridge, drum, writeoff_cartridge, writeoff_drum)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (month, printer_id, cartridge, drum) DO UPDATE SET
+                        writeoff_cartridge = writeoff_cartridge + excluded.writeoff_cartridge,
+                        writeoff_drum = writeoff_drum + excluded.writeoff_drum
+                    """,
+                    (now[:7], printer_id if printer_id is not None else 0, cartridge, drum,
+                     writeoff_cartridge, writeoff_drum)
                 )
                 # Одновременно уменьшаем количество расходников у принтера
                 if writeoff_cartridge > 0:
@@ -526,7 +891,6 @@ class StorageManager:
                         "UPDATE printers SET drum_amount = drum_amount - ? WHERE id = ?",
                         (writeoff_drum, printer_id)
                     )
-                conn.commit()
                 return True
         except Exception as e:
             logging.error(f"Ошибка записи списания: {e}")
@@ -537,6 +901,7 @@ class HistoryManager:
     """Manages history-related database operations."""
     
     @staticmethod
+    @cached("storage_transfer_history")
     def get_transfer_history() -> List[Dict[str, Any]]:
         """Get all transfer history records."""
         with get_db_connection() as conn:
@@ -549,6 +914,7 @@ class HistoryManager:
             return [dict(row) for row in cursor.fetchall()]
     
     @staticmethod
+    @cached("writeoff_history", "printers")
     def get_writeoff_history() -> List[Dict[str, Any]]:
         """Get all writeoff history records."""
         with get_db_connection() as conn:
@@ -561,3 +927,119 @@ class HistoryManager:
                 ORDER BY wh.datetime DESC
             ''')
             return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _history_where(columns: Dict[str, str], after: Optional[Tuple[str, int]],
+                       date_from: Optional[str], date_to: Optional[str],
+                       **filters: Optional[str]) -> Tuple[str, List[Any]]:
+        """Build the WHERE clause for a history page.
+
+        ``after`` is the (datetime, id) of the last row of the previous page;
+        dates are 'YYYY-MM-DD' and inclusive; other filters are exact matches
+        on the columns named in ``columns``.
+        """
+        clauses, params = [], []
+        if after is not None:
+            clauses.append(f"({columns['datetime']}, {columns['id']}) < (?, ?)")
+            params.extend(after)
+        if date_from:
+            clauses.append(f"{columns['datetime']} >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append(f"{columns['datetime']} <= ?")
+            params.append(f"{date_to} 23:59:59" if len(date_to) == 10 else date_to)
+        for name, value in filters.items():
+            if value:
+                clauses.append(columns[name])
+                params.extend([value] * columns[name].count("?"))
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @staticmethod
+    def get_transfer_history_page(after: Optional[Tuple[str, int]] = None,
+                                  limit: int = HISTORY_PAGE_SIZE,
+                                  date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                  username: Optional[str] = None, model: Optional[str] = None,
+                                  printer: Optional[str] = None) -> List[Dict[str, Any]]:
+        """One page of transfer history, newest first, starting after the given key."""
+        where, params = HistoryManager._history_where(
+            {"datetime": "datetime", "id": "id", "username": "username = ?",
+             "model": "model = ?", "printer": "(from_place = ? OR to_place = ?)"},
+            after, date_from, date_to, username=username, model=model, printer=printer
+        )
+        with get_db_connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT id, datetime, username, model, type, amount, from_place, to_place
+                FROM storage_transfer_history
+                {where}
+                ORDER BY datetime DESC, id DESC
+                LIMIT ?
+            ''', params + [limit])
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_writeoff_history_page(after: Optional[Tuple[str, int]] = None,
+                                  limit: int = HISTORY_PAGE_SIZE,
+                                  date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                  username: Optional[str] = None, model: Optional[str] = None,
+                                  printer: Optional[str] = None) -> List[Dict[str, Any]]:
+        """One page of writeoff history, newest first, starting after the given key.
+
+        Models are the ones recorded with each writeoff, not the printer's
+        current settings.
+        """
+        where, params = HistoryManager._history_where(
+            {"datetime": "wh.datetime", "id": "wh.id", "username": "wh.username = ?",
+             "model": "(wh.cartridge = ? OR wh.drum = ?)", "printer": "p.name = ?"},
+            after, date_from, date_to, username=username, model=model, printer=printer
+        )
+        with get_db_connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT wh.id, wh.datetime, wh.username, wh.writeoff_cartridge,
+                       wh.writeoff_drum, p.name AS printer_name,
+                       wh.cartridge, wh.drum
+                FROM writeoff_history wh
+                LEFT JOIN printers p ON wh.printer_id = p.id
+                {where}
+                ORDER BY wh.datetime DESC, wh.id DESC
+                LIMIT ?
+            ''', params + [limit])
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _iter_pages(get_page: Callable[..., List[Dict[str, Any]]], page_size: int,
+                    filters: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        after = None
+        while True:
+            page = get_page(after=after, limit=page_size, **filters)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = (page[-1]["datetime"], page[-1]["id"])
+
+    @staticmethod
+    def iter_transfer_history(page_size: int = HISTORY_PAGE_SIZE, **filters) -> Iterator[Dict[str, Any]]:
+        """Stream transfer history page by page without loading the whole table.
+
+        No connection is held between pages; accepts the same filters as
+        get_transfer_history_page().
+        """
+        return HistoryManager._iter_pages(HistoryManager.get_transfer_history_page, page_size, filters)
+
+    @staticmethod
+    def iter_writeoff_history(page_size: int = HISTORY_PAGE_SIZE, **filters) -> Iterator[Dict[str, Any]]:
+        """Stream writeoff history page by page; see iter_transfer_history()."""
+        return HistoryManager._iter_pages(HistoryManager.get_writeoff_history_page, page_size, filters)
+
+
+if __name__ == "__main__":
+    import sys
+    commands = {
+        "init": init_db,
+        "rebuild-usage": lambda: print(f"writeoff_monthly: {rebuild_monthly_usage()} rows"),
+    }
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print(f"Usage: python -m src.database [{' | '.join(commands)}]")
+        sys.exit(1)
+    if sys.argv[1] != "init":
+        init_db()
+    commands[sys.argv[1]]()
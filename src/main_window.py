@@ -2,30 +2,99 @@ import sys
 from PySide6.QtWidgets import (
     QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QTabWidget, QLabel,
     QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox, QFormLayout, QLineEdit,
-    QSpinBox, QDialogButtonBox, QComboBox, QDialog, QTextEdit
+    QSpinBox, QDialogButtonBox, QComboBox, QDialog, QTextEdit, QProgressBar,
+    QTableView, QAbstractItemView, QCheckBox, QDateEdit
+)
+from PySide6.QtCore import Qt, QDate, QTimer
+from src.database import (
+    PrinterManager, StorageManager, UserManager, CabinetManager, HistoryManager, HISTORY_PAGE_SIZE
 )
-from PySide6.QtGui import QColor
-from PySide6.QtCore import Qt
-from src.database import PrinterManager, StorageManager, UserManager, CabinetManager
 from src.utils import CabinetDialog, PrinterDialog, WriteoffDialog, UserDialog, ResetPasswordDialog
-from analytics import (
-    get_cartridge_usage_by_month, get_top5_cartridge_models, get_cartridge_forecast,
-    get_cartridge_change_report, plot_cartridge_usage, export_cartridge_usage_to_excel
+from src.workers import TaskRunner
+from src.table_models import (
+    RowTableModel, PagedTableModel, PrintersTableModel, StorageTableModel, UsersTableModel
 )
-try:
-    import autoupdate
-except Exception as e:
-    autoupdate = None
-    import traceback
-    def show_update_error(parent):
-        from PySide6.QtWidgets import QMessageBox
-        QMessageBox.critical(parent, "Ошибка обновления", f"Ошибка импорта autoupdate:\n{traceback.format_exc()}")
+# analytics (pandas, matplotlib) и autoupdate (requests) импортируются при первом
+# обращении к аналитике и обновлениям, а не при запуске: их загрузка занимает
+# больше времени, чем всё остальное до окна входа
 
 # --- Константы для индексов столбцов ---
 STORAGE_COL_MODEL = 0
 STORAGE_COL_TYPE = 1
 STORAGE_COL_AMOUNT = 2
 
+# Проверка обновлений после запуска — когда основные данные уже загружаются
+UPDATE_CHECK_DELAY_MS = 3000
+# Сколько ждать установку обновления при закрытии окна
+UPDATE_SHUTDOWN_TIMEOUT_MS = 30000
+
+# --- Загрузчики данных, выполняемые в фоновых потоках (без обращения к виджетам) ---
+def _load_overview():
+    return PrinterManager.get_low_stock_warnings(), StorageManager.get_storage_summary()
+
+def _load_analytics():
+    import analytics
+    return (analytics.get_cartridge_usage_by_month(), analytics.get_top5_cartridge_models(),
+            analytics.get_cartridge_change_report())
+
+def _load_forecast(model):
+    import analytics
+    return analytics.get_cartridge_forecast(model)
+
+def _load_usage():
+    import analytics
+    return analytics.get_cartridge_usage_by_month()
+
+def _plot_usage(usage_df):
+    # Вызывается в GUI-потоке: графики matplotlib рисуются только в нём
+    import analytics
+    analytics.plot_cartridge_usage(usage_df)
+
+def _check_for_update(interactive):
+    import autoupdate
+    # По кнопке сведения о релизе перепроверяются сразу (ответ 304 дешёвый)
+    return autoupdate.check_new_version(0 if interactive else autoupdate.RELEASE_CACHE_TTL)
+
+def _make_table_view(model):
+    """QTableView с построчным выделением, как у прежних QTableWidget."""
+    view = QTableView()
+    view.setModel(model)
+    view.setSelectionBehavior(QAbstractItemView.SelectRows)
+    view.setSelectionMode(QAbstractItemView.SingleSelection)
+    return view
+
+def _selected_row(view):
+    """Кортеж данных выбранной строки таблицы или None."""
+    index = view.currentIndex()
+    if not index.isValid():
+        return None
+    return view.model().row(index.row())
+
+def _export_usage():
+    import analytics
+    analytics.export_cartridge_usage_to_excel(analytics.get_cartridge_usage_by_month())
+
+# --- История: столбцы и загрузка страниц по ключу (datetime, id) ---
+HISTORY_KINDS = {
+    "transfer": (
+        "Перемещения",
+        ["ID", "Дата", "Пользователь", "Модель", "Тип", "Кол-во", "Откуда", "Куда"],
+        HistoryManager.get_transfer_history_page,
+        ("id", "datetime", "username", "model", "type", "amount", "from_place", "to_place"),
+    ),
+    "writeoff": (
+        "Списания",
+        ["ID", "Дата", "Пользователь", "Принтер", "Картридж", "Списано картриджей", "Драм", "Списано драмов"],
+        HistoryManager.get_writeoff_history_page,
+        ("id", "datetime", "username", "printer_name", "cartridge", "writeoff_cartridge", "drum", "writeoff_drum"),
+    ),
+}
+
+def _load_history_page(kind, cursor, filters):
+    _, _, get_page, columns = HISTORY_KINDS[kind]
+    rows = get_page(after=cursor, limit=HISTORY_PAGE_SIZE, **filters)
+    return [tuple(row[c] for c in columns) for row in rows]
+
 class MainWindow(QMainWindow):
     """Главное окно приложения учёта принтеров и расходников."""
     def __init__(self, user_role, username, parent=None):
@@ -34,13 +103,20 @@ class MainWindow(QMainWindow):
         self.resize(1280, 750)
         self.user_role = user_role
         self.username = username
+        self.tasks = TaskRunner(self)
+        # TaskProgress идущей установки обновления (None — установка не идёт)
+        self._update_progress = None
+        # Аналитика (и вместе с ней pandas) загружается при первом открытии вкладки
+        self._analytics_loaded = False
         self._init_ui()
+        QTimer.singleShot(UPDATE_CHECK_DELAY_MS, self.check_updates)
 
     def _init_ui(self):
         """Инициализация интерфейса пользователя."""
         self._init_menu()
         self._init_tabs()
         self._init_layout()
+        self._init_status_bar()
         self._connect_menu()
         self._apply_role_restrictions()
         self._fill_tabs()
@@ -89,6 +165,33 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(self.tabs, 1)
         self.setCentralWidget(central_widget)
 
+    def _init_status_bar(self):
+        """Неблокирующий индикатор загрузки для фоновых задач."""
+        self.loading_bar = QProgressBar()
+        self.loading_bar.setRange(0, 0)
+        self.loading_bar.setMaximumWidth(160)
+        self.loading_bar.setTextVisible(False)
+        self.loading_bar.hide()
+        self.statusBar().addPermanentWidget(self.loading_bar)
+        self.tasks.busyChanged.connect(self._on_tasks_busy)
+
+    def _on_tasks_busy(self, busy):
+        self.loading_bar.setVisible(busy)
+        if busy:
+            self.statusBar().showMessage("Загрузка данных…")
+        else:
+            self.statusBar().clearMessage()
+
+    def closeEvent(self, event):
+        if self._update_progress is not None:
+            # Загрузка прерывается на ближайшем блоке и продолжится при следующем
+            # обновлении; уже начатую замену файлов даём закончить
+            self._update_progress.cancel()
+            self.tasks.shutdown(UPDATE_SHUTDOWN_TIMEOUT_MS)
+        else:
+            self.tasks.shutdown()
+        super().closeEvent(event)
+
     def _connect_menu(self):
         self.btn_overview.clicked.connect(lambda: self.tabs.setCurrentWidget(self.tab_overview))
         self.btn_cabinets.clicked.connect(lambda: self.tabs.setCurrentWidget(self.tab_cabinets))
@@ -98,10 +201,8 @@ class MainWindow(QMainWindow):
         self.btn_analytics.clicked.connect(lambda: self.tabs.setCurrentWidget(self.tab_analytics))
         self.btn_users.clicked.connect(lambda: self.tabs.setCurrentWidget(self.tab_users))
         self.btn_exit.clicked.connect(self.close)
-        if autoupdate:
-            self.btn_update.clicked.connect(lambda: autoupdate.check_and_update_gui(self))
-        else:
-            self.btn_update.clicked.connect(lambda: show_update_error(self))
+        self.btn_update.clicked.connect(lambda: self.check_updates(interactive=True))
+        self.tabs.currentChanged.connect(self._on_tab_changed)
 
     def _apply_role_restrictions(self):
         if self.user_role != "admin":
@@ -116,6 +217,38 @@ class MainWindow(QMainWindow):
         self.setup_analytics_tab()
         self.setup_users_tab()
 
+    # --- Обновления ---
+    def check_updates(self, interactive=False):
+        """Проверить обновления в фоне; при запуске — молча, по кнопке — с предложением установить."""
+        if self._update_progress is not None:
+            return
+        self.tasks.submit(
+            "update", _check_for_update,
+            lambda rel: self._on_update_checked(rel, interactive),
+            lambda msg: self._on_update_check_failed(msg, interactive), interactive
+        )
+
+    def _on_update_checked(self, rel, interactive):
+        if rel:
+            self.btn_update.setText(f"Обновление ({rel['tag_name']})")
+            self.statusBar().showMessage(f"Доступна новая версия {rel['tag_name']}", 10000)
+            if interactive and self._update_progress is None:
+                import autoupdate
+                self._update_progress = autoupdate.offer_update(
+                    self, rel, self.tasks, self._on_update_finished)
+                self.btn_update.setEnabled(self._update_progress is None)
+        elif interactive:
+            self.statusBar().showMessage("У вас уже последняя версия", 5000)
+
+    def _on_update_finished(self):
+        self._update_progress = None
+        self.btn_update.setEnabled(True)
+
+    def _on_update_check_failed(self, message, interactive):
+        # Сеть недоступна — без диалогов; по кнопке причина видна в строке состояния
+        if interactive:
+            self.statusBar().showMessage(f"Не удалось проверить обновления: {message}", 10000)
+
     # --- Диалоги и сообщения ---
     def show_error(self, message):
         QMessageBox.critical(self, "Ошибка", message)
@@ -181,16 +314,13 @@ class MainWindow(QMainWindow):
         title = QLabel("Управление принтерами")
         title.setStyleSheet("font-size: 18px; font-weight: bold; margin: 10px;")
         layout.addWidget(title)
-        self.printers_table = QTableWidget(0, 8)
-        self.printers_table.setHorizontalHeaderLabels([
-            "ID", "Кабинет", "Принтер", "Картридж", "Драм",
-            "Кол-во картриджей", "Кол-во драмов", "Статус"
-        ])
+        self.printers_model = PrintersTableModel(self)
+        self.printers_table = _make_table_view(self.printers_model)
         # Позволить пользователю регулировать ширину столбцов вручную
         header = self.printers_table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Interactive)
         # По умолчанию подогнать ширину под содержимое
-        for i in range(self.printers_table.columnCount()):
+        for i in range(self.printers_model.columnCount()):
             header.setSectionResizeMode(i, QHeaderView.Interactive)
             self.printers_table.resizeColumnToContents(i)
         layout.addWidget(self.printers_table)
@@ -218,10 +348,14 @@ class MainWindow(QMainWindow):
         self.refresh_printers()
 
     def refresh_overview(self):
+        self.tasks.submit(
+            "overview", _load_overview, self._fill_overview,
+            lambda msg: self.show_error(f"Не удалось обновить обзор: {msg}")
+        )
+
+    def _fill_overview(self, data):
+        printer_warnings, storage_summary = data
         try:
-            printer_warnings = PrinterManager.get_low_stock_warnings()
-            storage_summary = StorageManager.get_storage_summary()
-            
             summary_text = (
                 f"Картриджей на складе: <b>{storage_summary['cartridges']}</b><br>"
                 f"Драмов на складе: <b>{storage_summary['drums']}</b>"
@@ -237,8 +371,11 @@ class MainWindow(QMainWindow):
 
     def setup_storage_tab(self):
         layout = QVBoxLayout(self.tab_storage)
-        self.storage_table = QTableWidget(0, 3)
-        self.storage_table.setHorizontalHeaderLabels(["Модель", "Тип", "Количество"])
+        self.storage_model = StorageTableModel(self)
+        self.storage_table = _make_table_view(self.storage_model)
+        self.storage_table.setEditTriggers(
+            QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed
+        )
         self.storage_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.storage_table)
         btns = QHBoxLayout()
@@ -250,27 +387,19 @@ class MainWindow(QMainWindow):
         layout.addStretch(1)
         self.btn_add_storage.clicked.connect(self.add_storage)
         self.btn_give_storage.clicked.connect(self.give_storage_to_printer)
-        self.storage_table.cellChanged.connect(self.on_storage_cell_changed)
+        self.storage_model.amountEdited.connect(self.on_storage_amount_edited)
         self.refresh_storage()
 
     def refresh_storage(self):
-        self.storage_table.blockSignals(True)
-        storage_items = StorageManager.get_all_storage()
-        self.storage_table.setRowCount(len(storage_items))
-        for i, item in enumerate(storage_items):
-            self.storage_table.setItem(i, 0, QTableWidgetItem(item['model']))
-            self.storage_table.setItem(i, 1, QTableWidgetItem(item['type']))
-            amount_item = QTableWidgetItem(str(item['amount']))
-            amount_item.setFlags(amount_item.flags() | Qt.ItemIsEditable)
-            self.storage_table.setItem(i, 2, amount_item)
-        self.storage_table.blockSignals(False)
-
-    def on_storage_cell_changed(self, row, column):
-        if column != 2:
-            return
-        model = self.storage_table.item(row, 0).text()
-        item_type = self.storage_table.item(row, 1).text()
-        value = self.storage_table.item(row, 2).text()
+        self.tasks.submit(
+            "storage", StorageManager.get_all_storage, self._fill_storage,
+            lambda msg: self.show_error(f"Не удалось загрузить склад: {msg}")
+        )
+
+    def _fill_storage(self, storage_items):
+        self.storage_model.set_storage(storage_items)
+
+    def on_storage_amount_edited(self, model, item_type, value):
         try:
             amount = int(value)
             if amount < 0:
@@ -283,11 +412,89 @@ class MainWindow(QMainWindow):
         success = StorageManager.set_storage_amount(model, item_type, amount)
         if not success:
             self.show_warning("Не удалось обновить количество на складе")
-            self.refresh_storage()
+        self.refresh_storage()
 
     def setup_history_tab(self):
-        # Add similar logical setup for history tab
-        pass
+        layout = QVBoxLayout(self.tab_history)
+        # --- Фильтры (применяются в запросе, а не к загруженным строкам) ---
+        filters = QHBoxLayout()
+        self.history_kind_combo = QComboBox()
+        for kind, (title, _, _, _) in HISTORY_KINDS.items():
+            self.history_kind_combo.addItem(title, kind)
+        self.history_period_check = QCheckBox("За период")
+        self.history_date_from = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.history_date_to = QDateEdit(QDate.currentDate())
+        for edit in (self.history_date_from, self.history_date_to):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("dd.MM.yyyy")
+            edit.setEnabled(False)
+        self.history_user_edit = QLineEdit()
+        self.history_user_edit.setPlaceholderText("Пользователь")
+        self.history_model_edit = QLineEdit()
+        self.history_model_edit.setPlaceholderText("Модель")
+        self.history_printer_edit = QLineEdit()
+        self.history_printer_edit.setPlaceholderText("Принтер")
+        self.btn_history_apply = QPushButton("Применить")
+        filters.addWidget(self.history_kind_combo)
+        filters.addWidget(self.history_period_check)
+        filters.addWidget(self.history_date_from)
+        filters.addWidget(QLabel("—"))
+        filters.addWidget(self.history_date_to)
+        filters.addWidget(self.history_user_edit)
+        filters.addWidget(self.history_model_edit)
+        filters.addWidget(self.history_printer_edit)
+        filters.addWidget(self.btn_history_apply)
+        layout.addLayout(filters)
+        # --- Таблица: страницы подгружаются при прокрутке ---
+        self.history_models = {}
+        for kind, (_, headers, _, _) in HISTORY_KINDS.items():
+            model = PagedTableModel(headers, cursor=lambda row: (row[1], row[0]),
+                                    key=lambda row: row[0], parent=self)
+            model.pageRequested.connect(lambda cursor, kind=kind: self._request_history_page(kind, cursor))
+            self.history_models[kind] = model
+        self._history_filters = {}
+        self.history_table = _make_table_view(self.history_models["transfer"])
+        self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.history_table)
+        self.history_period_check.toggled.connect(self.history_date_from.setEnabled)
+        self.history_period_check.toggled.connect(self.history_date_to.setEnabled)
+        self.history_kind_combo.currentIndexChanged.connect(self.refresh_history)
+        self.btn_history_apply.clicked.connect(self.refresh_history)
+        for edit in (self.history_user_edit, self.history_model_edit, self.history_printer_edit):
+            edit.returnPressed.connect(self.refresh_history)
+        self.refresh_history()
+
+    def refresh_history(self):
+        """Перечитать историю с первой страницы с текущими фильтрами."""
+        filters = {
+            "username": self.history_user_edit.text().strip() or None,
+            "model": self.history_model_edit.text().strip() or None,
+            "printer": self.history_printer_edit.text().strip() or None,
+        }
+        if self.history_period_check.isChecked():
+            filters["date_from"] = self.history_date_from.date().toString("yyyy-MM-dd")
+            filters["date_to"] = self.history_date_to.date().toString("yyyy-MM-dd")
+        self._history_filters = filters
+        kind = self.history_kind_combo.currentData()
+        model = self.history_models[kind]
+        if self.history_table.model() is not model:
+            self.history_table.setModel(model)
+        model.reset_pages()
+
+    def _request_history_page(self, kind, cursor):
+        # Новый запрос в канале "history" отменяет устаревшую страницу
+        # (например, загружавшуюся до смены фильтров)
+        model = self.history_models[kind]
+        self.tasks.submit(
+            "history", _load_history_page,
+            lambda rows: model.append_page(rows, HISTORY_PAGE_SIZE),
+            lambda msg: self._on_history_error(model, msg),
+            kind, cursor, dict(self._history_filters)
+        )
+
+    def _on_history_error(self, model, message):
+        model.page_failed()
+        self.show_error(f"Не удалось загрузить историю: {message}")
 
     def add_storage(self):
         dlg = QDialog(self)
@@ -391,40 +598,15 @@ class MainWindow(QMainWindow):
     
     # --- Методы для работы с принтерами ---
     def refresh_printers(self):
-        """Обновление таблицы принтеров"""
+        """Обновление таблицы принтеров (данные загружаются в фоне)"""
+        self.tasks.submit(
+            "printers", PrinterManager.get_all_printers, self._fill_printers,
+            lambda msg: self.show_error(f"Не удалось загрузить принтеры: {msg}")
+        )
+
+    def _fill_printers(self, printers):
         try:
-            printers = PrinterManager.get_all_printers()
-            self.printers_table.setRowCount(len(printers))
-            
-            for i, printer in enumerate(printers):
-                self.printers_table.setItem(i, 0, QTableWidgetItem(str(printer['id'])))
-                self.printers_table.setItem(i, 1, QTableWidgetItem(printer['cabinet_name'] or "Без кабинета"))
-                self.printers_table.setItem(i, 2, QTableWidgetItem(printer['name']))
-                self.printers_table.setItem(i, 3, QTableWidgetItem(printer['cartridge'] or ""))
-                self.printers_table.setItem(i, 4, QTableWidgetItem(printer['drum'] or ""))
-                self.printers_table.setItem(i, 5, QTableWidgetItem(str(printer['cartridge_amount'] or 0)))
-                self.printers_table.setItem(i, 6, QTableWidgetItem(str(printer['drum_amount'] or 0)))
-                
-                # Определение статуса
-                status = "Норма"
-                min_cart = printer['min_cartridge_amount'] or 0
-                min_drum = printer['min_drum_amount'] or 0
-                cart_amt = printer['cartridge_amount'] or 0
-                drum_amt = printer['drum_amount'] or 0
-                
-                if cart_amt < 0 or drum_amt < 0:
-                    status = "Ошибка"
-                elif (min_cart > 0 and cart_amt < min_cart) or (min_drum > 0 and drum_amt < min_drum):
-                    status = "Нужно пополнение"
-                
-                status_item = QTableWidgetItem(status)
-                if status == "Ошибка":
-                    status_item.setBackground(QColor(255, 200, 200))  # Красный
-                elif status == "Нужно пополнение":
-                    status_item.setBackground(QColor(255, 255, 200))  # Желтый
-                
-                self.printers_table.setItem(i, 7, status_item)
-                
+            self.printers_model.set_printers(printers)
         except Exception as e:
             self.show_error(f"Не удалось загрузить принтеры: {e}")
     
@@ -466,11 +648,11 @@ class MainWindow(QMainWindow):
 
     def edit_printer(self):
         """Редактирование выбранного принтера"""
-        current_row = self.printers_table.currentRow()
-        if current_row < 0:
+        selected = _selected_row(self.printers_table)
+        if selected is None:
             self.show_warning("Выберите принтер для редактирования")
             return
-        printer_id = int(self.printers_table.item(current_row, 0).text())
+        printer_id = selected[PrintersTableModel.COL_ID]
         printers = PrinterManager.get_all_printers()
         current_printer = next((p for p in printers if p['id'] == printer_id), None)
         if not current_printer:
@@ -489,13 +671,13 @@ class MainWindow(QMainWindow):
     
     def delete_printer(self):
         """Удаление выбранного принтера"""
-        current_row = self.printers_table.currentRow()
-        if current_row < 0:
+        selected = _selected_row(self.printers_table)
+        if selected is None:
             self.show_warning("Выберите принтер для удаления")
             return
         
-        printer_id = int(self.printers_table.item(current_row, 0).text())
-        printer_name = self.printers_table.item(current_row, 2).text()
+        printer_id = selected[PrintersTableModel.COL_ID]
+        printer_name = selected[PrintersTableModel.COL_NAME]
         
         reply = QMessageBox.question(
             self, "Подтверждение", 
@@ -512,12 +694,12 @@ class MainWindow(QMainWindow):
     
     def writeoff_supplies(self):
         """Списание (замена) расходников с принтера с учётом в аналитике."""
-        current_row = self.printers_table.currentRow()
-        if current_row < 0:
+        selected = _selected_row(self.printers_table)
+        if selected is None:
             self.show_warning("Выберите принтер для списания расходников")
             return
-        printer_id = int(self.printers_table.item(current_row, 0).text())
-        printer_name = self.printers_table.item(current_row, 2).text()
+        printer_id = selected[PrintersTableModel.COL_ID]
+        printer_name = selected[PrintersTableModel.COL_NAME]
         dialog = WriteoffDialog(printer_name)
         if dialog.exec():
             cart_writeoff = dialog.cartridge_spin.value()
@@ -539,13 +721,11 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Ошибка", "Не удалось провести замену расходников")
 
     def give_storage_to_printer(self):
-        current_row = self.storage_table.currentRow()
-        if current_row < 0:
+        selected = _selected_row(self.storage_table)
+        if selected is None:
             QMessageBox.warning(self, "Предупреждение", "Выберите позицию на складе для выдачи")
             return
-        model = self.storage_table.item(current_row, 0).text()
-        item_type = self.storage_table.item(current_row, 1).text()
-        max_amount = int(self.storage_table.item(current_row, 2).text())
+        model, item_type, max_amount = selected
         if max_amount <= 0:
             QMessageBox.warning(self, "Ошибка", "Нет доступного количества для выдачи")
             return
@@ -583,23 +763,20 @@ class MainWindow(QMainWindow):
     def setup_analytics_tab(self):
         layout = QVBoxLayout(self.tab_analytics)
         # --- Таблица расхода по месяцам ---
-        self.analytics_usage_table = QTableWidget()
-        self.analytics_usage_table.setColumnCount(2)
-        self.analytics_usage_table.setHorizontalHeaderLabels(["Месяц", "Расход картриджей"])
+        self.analytics_usage_model = RowTableModel(["Месяц", "Расход картриджей"], parent=self)
+        self.analytics_usage_table = _make_table_view(self.analytics_usage_model)
         layout.addWidget(QLabel("Расход картриджей по месяцам:"))
         layout.addWidget(self.analytics_usage_table)
         # --- Топ-5 моделей ---
-        self.analytics_top5_table = QTableWidget()
-        self.analytics_top5_table.setColumnCount(2)
-        self.analytics_top5_table.setHorizontalHeaderLabels(["Модель", "Всего расход"])
+        self.analytics_top5_model = RowTableModel(["Модель", "Всего расход"], parent=self)
+        self.analytics_top5_table = _make_table_view(self.analytics_top5_model)
         layout.addWidget(QLabel("Топ-5 моделей картриджей по расходу:"))
         layout.addWidget(self.analytics_top5_table)
         # --- Отчёт по заменам ---
-        self.analytics_report_table = QTableWidget()
-        self.analytics_report_table.setColumnCount(6)
-        self.analytics_report_table.setHorizontalHeaderLabels([
+        self.analytics_report_model = RowTableModel([
             "Кабинет", "Принтер", "Картридж", "Замен", "Последняя замена", "Дней прошло"
-        ])
+        ], parent=self)
+        self.analytics_report_table = _make_table_view(self.analytics_report_model)
         layout.addWidget(QLabel("Отчёт по заменам картриджей:"))
         layout.addWidget(self.analytics_report_table)
         # --- Прогноз по модели ---
@@ -623,31 +800,39 @@ class MainWindow(QMainWindow):
         self.btn_export_usage.clicked.connect(self.on_export_usage)
         self.btn_refresh_analytics.clicked.connect(self.refresh_analytics_tab)
         self.forecast_combo.currentTextChanged.connect(self.on_forecast_model_changed)
-        self.refresh_analytics_tab()
+
+    def _on_tab_changed(self, index):
+        if self.tabs.widget(index) is self.tab_analytics and not self._analytics_loaded:
+            self.refresh_analytics_tab()
 
     def refresh_analytics_tab(self):
+        self._analytics_loaded = True
+        self.btn_refresh_analytics.setEnabled(False)
+        self.tasks.submit(
+            "analytics", _load_analytics, self._fill_analytics, self._on_analytics_error
+        )
+
+    def _on_analytics_error(self, message):
+        self.btn_refresh_analytics.setEnabled(True)
+        self.show_error(f"Не удалось загрузить аналитику: {message}")
+
+    def _fill_analytics(self, data):
+        usage_df, top5_df, report = data
+        self.btn_refresh_analytics.setEnabled(True)
         # --- Заполняем таблицу расхода по месяцам ---
-        usage_df = get_cartridge_usage_by_month()
-        self.analytics_usage_table.setRowCount(len(usage_df))
-        for i, row in usage_df.iterrows():
-            self.analytics_usage_table.setItem(i, 0, QTableWidgetItem(str(row["month"])))
-            self.analytics_usage_table.setItem(i, 1, QTableWidgetItem(str(row["usage"])))
+        self.analytics_usage_model.set_rows(
+            (str(month), str(usage)) for month, usage in zip(usage_df["month"], usage_df["usage"])
+        )
         # --- Топ-5 моделей ---
-        top5_df = get_top5_cartridge_models()
-        self.analytics_top5_table.setRowCount(len(top5_df))
-        for i, row in top5_df.iterrows():
-            self.analytics_top5_table.setItem(i, 0, QTableWidgetItem(str(row["model"])))
-            self.analytics_top5_table.setItem(i, 1, QTableWidgetItem(str(row["total"])))
+        self.analytics_top5_model.set_rows(
+            (str(model), str(total)) for model, total in zip(top5_df["model"], top5_df["total"])
+        )
         # --- Отчёт по заменам ---
-        report = get_cartridge_change_report()
-        self.analytics_report_table.setRowCount(len(report))
-        for i, row in enumerate(report):
-            self.analytics_report_table.setItem(i, 0, QTableWidgetItem(str(row["cabinet"])))
-            self.analytics_report_table.setItem(i, 1, QTableWidgetItem(str(row["printer"])))
-            self.analytics_report_table.setItem(i, 2, QTableWidgetItem(str(row["cartridge"])))
-            self.analytics_report_table.setItem(i, 3, QTableWidgetItem(str(row["total_changes"])))
-            self.analytics_report_table.setItem(i, 4, QTableWidgetItem(str(row["last_change"])))
-            self.analytics_report_table.setItem(i, 5, QTableWidgetItem(str(row["days_since_last"])))
+        self.analytics_report_model.set_rows(
+            tuple(str(row[key]) for key in (
+                "cabinet", "printer", "cartridge", "total_changes", "last_change", "days_since_last"
+            )) for row in report
+        )
         # --- Прогноз по модели ---
         self.forecast_combo.blockSignals(True)
         self.forecast_combo.clear()
@@ -661,7 +846,13 @@ class MainWindow(QMainWindow):
         if not model:
             self.forecast_label.setText("")
             return
-        forecast = get_cartridge_forecast(model)
+        self.forecast_label.setText("Расчёт прогноза…")
+        self.tasks.submit(
+            "forecast", _load_forecast, self._fill_forecast,
+            lambda msg: self.forecast_label.setText(f"Ошибка прогноза: {msg}"), model
+        )
+
+    def _fill_forecast(self, forecast):
         if forecast:
             self.forecast_label.setText(
                 f"Средний расход: <b>{forecast['avg_per_month']:.1f}</b> шт/мес<br>"
@@ -671,18 +862,28 @@ class MainWindow(QMainWindow):
             self.forecast_label.setText("Нет данных по расходу")
 
     def on_plot_usage(self):
-        usage_df = get_cartridge_usage_by_month()
-        plot_cartridge_usage(usage_df)
+        # Данные готовятся в фоне, сам график рисуется в GUI-потоке
+        self.tasks.submit(
+            "plot", _load_usage, _plot_usage,
+            lambda msg: self.show_error(f"Не удалось построить график: {msg}")
+        )
 
     def on_export_usage(self):
-        usage_df = get_cartridge_usage_by_month()
-        export_cartridge_usage_to_excel(usage_df)
+        self.btn_export_usage.setEnabled(False)
+        self.tasks.submit("export", _export_usage, self._on_export_done, self._on_export_error)
+
+    def _on_export_done(self, _):
+        self.btn_export_usage.setEnabled(True)
         QMessageBox.information(self, "Экспорт", "Файл cartridge_usage.xlsx сохранён.")
 
+    def _on_export_error(self, message):
+        self.btn_export_usage.setEnabled(True)
+        self.show_error(f"Не удалось выполнить экспорт: {message}")
+
     def setup_users_tab(self):
         layout = QVBoxLayout(self.tab_users)
-        self.users_table = QTableWidget(0, 3)
-        self.users_table.setHorizontalHeaderLabels(["ID", "Логин", "Роль"])
+        self.users_model = UsersTableModel(self)
+        self.users_table = _make_table_view(self.users_model)
         self.users_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.users_table)
         btns = QHBoxLayout()
@@ -711,12 +912,7 @@ class MainWindow(QMainWindow):
             self.btn_reset_password.setEnabled(False)
 
     def refresh_users(self):
-        users = UserManager.get_all_users()
-        self.users_table.setRowCount(len(users))
-        for i, user in enumerate(users):
-            self.users_table.setItem(i, 0, QTableWidgetItem(str(user['id'])))
-            self.users_table.setItem(i, 1, QTableWidgetItem(user['login']))
-            self.users_table.setItem(i, 2, QTableWidgetItem(user['role']))
+        self.users_model.set_users(UserManager.get_all_users())
 
     def add_user(self):
         dialog = UserDialog()
@@ -731,13 +927,11 @@ class MainWindow(QMainWindow):
                 self.show_warning("Не удалось добавить пользователя (возможно, логин уже занят)")
 
     def edit_user(self):
-        current_row = self.users_table.currentRow()
-        if current_row < 0:
+        selected = _selected_row(self.users_table)
+        if selected is None:
             self.show_warning("Выберите пользователя для редактирования")
             return
-        user_id = int(self.users_table.item(current_row, 0).text())
-        login = self.users_table.item(current_row, 1).text()
-        role = self.users_table.item(current_row, 2).text()
+        user_id, login, role = selected
         dialog = UserDialog(login, role, edit_mode=True)
         if dialog.exec():
             new_login, new_password, new_role = dialog.get_data()
@@ -750,12 +944,11 @@ class MainWindow(QMainWindow):
                 self.show_warning("Не удалось обновить пользователя")
 
     def delete_user(self):
-        current_row = self.users_table.currentRow()
-        if current_row < 0:
+        selected = _selected_row(self.users_table)
+        if selected is None:
             self.show_warning("Выберите пользователя для удаления")
             return
-        user_id = int(self.users_table.item(current_row, 0).text())
-        login = self.users_table.item(current_row, 1).text()
+        user_id, login, _ = selected
         if login == self.username:
             self.show_warning("Нельзя удалить самого себя!")
             return
@@ -768,15 +961,14 @@ class MainWindow(QMainWindow):
                 self.show_warning("Не удалось удалить пользователя")
 
     def reset_password(self):
-        current_row = self.users_table.currentRow()
-        if current_row < 0:
+        selected = _selected_row(self.users_table)
+        if selected is None:
             self.show_warning("Выберите пользователя для сброса пароля")
             return
-        user_id = int(self.users_table.item(current_row, 0).text())
-        login = self.users_table.item(current_row, 1).text()
+        user_id, login, role = selected
         import random, string
         new_password = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
-        if UserManager.update_user(user_id, login, new_password, self.users_table.item(current_row, 2).text()):
+        if UserManager.update_user(user_id, login, new_password, role):
             dlg = ResetPasswordDialog(new_password, self)
             dlg.exec()
             self.show_info("Пароль успешно сброшен")
@@ -0,0 +1,175 @@
+"""
+Schema migrations for office.db.
+
+The schema version is stored in PRAGMA user_version. Each migration is a
+function that receives an open connection (inside the caller's transaction)
+and brings the schema from version N-1 to N. Migrations must be safe to run
+against databases created by any earlier release, so every statement is
+written to be idempotent.
+"""
+
+import sqlite3
+import logging
+from typing import Callable, List, Tuple
+
+
+def _merge_duplicate_storage(conn: sqlite3.Connection):
+    """Fold duplicate (model, type) rows into one before adding UNIQUE."""
+    duplicates = conn.execute('''
+        SELECT model, type, MIN(id) AS keep_id, SUM(amount) AS total
+        FROM storage
+        GROUP BY model, type
+        HAVING COUNT(*) > 1
+    ''').fetchall()
+    for model, item_type, keep_id, total in duplicates:
+        logging.warning("Merging duplicate storage rows for %s (%s)", model, item_type)
+        conn.execute("UPDATE storage SET amount = ? WHERE id = ?", (total, keep_id))
+        conn.execute(
+            "DELETE FROM storage WHERE model = ? AND type = ? AND id <> ?",
+            (model, item_type, keep_id)
+        )
+
+
+def _v1_hot_query_indexes(conn: sqlite3.Connection):
+    """Indexes for the filters used by the managers and analytics."""
+    # Отчёт по заменам и прогноз: WHERE printer_id = ? ... ORDER BY datetime
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_writeoff_printer_datetime
+        ON writeoff_history (printer_id, datetime, writeoff_cartridge, writeoff_drum)
+    ''')
+    # Расход по месяцам и история списаний: сортировка/фильтр по дате
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_writeoff_datetime
+        ON writeoff_history (datetime)
+    ''')
+    # get_compatible_printers и аналитика по моделям
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_printers_cartridge ON printers (cartridge)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_printers_drum ON printers (drum)")
+    # История перемещений
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transfer_history_datetime
+        ON storage_transfer_history (datetime)
+    ''')
+
+
+def _v2_storage_unique_model_type(conn: sqlite3.Connection):
+    """UNIQUE(model, type) on storage; also serves the lookups by model and type."""
+    _merge_duplicate_storage(conn)
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_storage_model_type
+        ON storage (model, type)
+    ''')
+
+
+def backfill_writeoff_models(conn: sqlite3.Connection) -> int:
+    """Fill the consumable models of writeoff rows recorded without them.
+
+    Such rows predate the model snapshot, so the printers' current
+    settings are the best available guess; rows of deleted printers get ''.
+    Returns the number of rows filled.
+    """
+    cursor = conn.execute('''
+        UPDATE writeoff_history
+        SET cartridge = COALESCE((SELECT p.cartridge FROM printers p
+                                  WHERE p.id = writeoff_history.printer_id), ''),
+            drum = COALESCE((SELECT p.drum FROM printers p
+                             WHERE p.id = writeoff_history.printer_id), '')
+        WHERE cartridge IS NULL OR drum IS NULL
+    ''')
+    return cursor.rowcount
+
+
+def rebuild_writeoff_monthly(conn: sqlite3.Connection) -> int:
+    """Recompute writeoff_monthly from writeoff_history; returns the row count.
+
+    Uses the models stored in each writeoff row, exactly like the
+    incremental update in add_writeoff_record, so a rebuild reproduces the
+    live aggregate even after a printer changed model or was deleted.
+    Rows without a printer go to printer_id 0 (unknown printer).
+    """
+    conn.execute("DELETE FROM writeoff_monthly")
+    conn.execute('''
+        INSERT INTO writeoff_monthly
+            (month, printer_id, cartridge, drum, writeoff_cartridge, writeoff_drum)
+        SELECT substr(datetime, 1, 7), COALESCE(printer_id, 0),
+               COALESCE(cartridge, ''), COALESCE(drum, ''),
+               SUM(writeoff_cartridge), SUM(writeoff_drum)
+        FROM writeoff_history
+        GROUP BY substr(datetime, 1, 7), COALESCE(printer_id, 0),
+                 COALESCE(cartridge, ''), COALESCE(drum, '')
+    ''')
+    return conn.execute("SELECT COUNT(*) FROM writeoff_monthly").fetchone()[0]
+
+
+def _v3_writeoff_monthly(conn: sqlite3.Connection):
+    """Monthly writeoff totals per printer and consumable model for analytics."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS writeoff_monthly (
+            month TEXT NOT NULL,                 -- 'YYYY-MM'
+            printer_id INTEGER NOT NULL,
+            cartridge TEXT NOT NULL DEFAULT '',  -- модель на момент списания
+            drum TEXT NOT NULL DEFAULT '',
+            writeoff_cartridge INTEGER NOT NULL DEFAULT 0,
+            writeoff_drum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, printer_id, cartridge, drum)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_writeoff_monthly_cartridge
+        ON writeoff_monthly (cartridge, month)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_writeoff_monthly_drum
+        ON writeoff_monthly (drum, month)
+    ''')
+    # Заполняется в v4, когда у списаний появляется модель на момент списания
+
+
+def _v4_writeoff_models(conn: sqlite3.Connection):
+    """Consumable models recorded with each writeoff; rebuilds writeoff_monthly."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(writeoff_history)")}
+    for column in ("cartridge", "drum"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE writeoff_history ADD COLUMN {column} TEXT")
+    backfill_writeoff_models(conn)
+    rebuild_writeoff_monthly(conn)
+
+
+# (версия, описание, функция) — только добавлять в конец, не менять старые
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "indexes for hot queries", _v1_hot_query_indexes),
+    (2, "unique (model, type) on storage", _v2_storage_unique_model_type),
+    (3, "monthly writeoff aggregate", _v3_writeoff_monthly),
+    (4, "consumable models in writeoff history", _v4_writeoff_models),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the schema version recorded in the database file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations and return the resulting schema version.
+
+    Must be called inside an open transaction: PRAGMA user_version is
+    transactional in SQLite, so either all pending steps land together
+    with the new version number or none of them do.
+    """
+    current = get_schema_version(conn)
+    if current > SCHEMA_VERSION:
+        logging.warning(
+            "office.db schema version %d is newer than this client supports (%d)",
+            current, SCHEMA_VERSION
+        )
+        return current
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        logging.info("Applying migration %d: %s", version, description)
+        migrate(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        current = version
+    return current
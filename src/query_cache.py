@@ -0,0 +1,258 @@
+"""
+Read-through cache for manager queries.
+
+Read methods are wrapped with ``@cached(*tables)`` and write methods with
+``@invalidates(*tables)``; a write drops every cached result that depends
+on one of the tables it touches. Entries also expire after a TTL and the
+cache is bounded in size (least recently used entries are evicted first).
+
+Writes made by other processes (another operator's client on the same
+office.db) are detected through an optional version probe, normally
+``PRAGMA data_version`` on a dedicated connection: when it changes, the
+whole cache is dropped because we cannot tell which tables were touched.
+The probe only tells that something changed, not how many commits
+happened, and our own writes move it too. ``before_write`` probes while
+the write lock is held, so any change seen there is another client's.
+After the commit ``after_write`` takes the new probe value as the
+baseline and asks the writing connection whether anyone else committed
+since BEGIN: that connection's own data_version ignores its own commit.
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+CACHE_TTL = 30.0             # секунды
+CACHE_MAX_ENTRIES = 256
+VERSION_CHECK_INTERVAL = 1.0  # не чаще раза в секунду опрашивать data_version
+
+
+def _copy_result(value: Any) -> Any:
+    """Shallow copy of list/dict results so callers cannot corrupt the cache."""
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class QueryCache:
+    """Thread-safe TTL/LRU cache with per-table invalidation."""
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES,
+                 version_check_interval: float = VERSION_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_check_interval = version_check_interval
+        self.enabled = True
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._by_table: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.RLock()
+        self._version_probe: Optional[Callable[[], int]] = None
+        self._last_version: Optional[int] = None
+        self._last_version_check = 0.0
+        self.generation = 0  # растёт при каждой инвалидации
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.external_changes = 0
+
+    def configure(self, enabled: Optional[bool] = None, ttl: Optional[float] = None,
+                  max_entries: Optional[int] = None,
+                  version_check_interval: Optional[float] = None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if ttl is not None:
+                self.ttl = ttl
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if version_check_interval is not None:
+                self.version_check_interval = version_check_interval
+            self.clear()
+
+    def set_version_probe(self, probe: Optional[Callable[[], int]]):
+        """Install a callable returning a counter that changes on external writes."""
+        with self._lock:
+            self._version_probe = probe
+            self._last_version = None
+            self._last_version_check = 0.0
+
+    def _probe(self) -> Optional[int]:
+        """Current probe value; on failure the cache is dropped and None returned."""
+        self._last_version_check = time.monotonic()
+        try:
+            return self._version_probe()
+        except Exception as e:
+            logging.warning(f"Cache version probe failed: {e}")
+            self._clear_entries()
+            self._last_version = None
+            return None
+
+    def _external_change(self):
+        self.external_changes += 1
+        self._clear_entries()
+
+    def _check_external_changes(self):
+        if self._version_probe is None:
+            return
+        if (self._last_version is not None
+                and time.monotonic() - self._last_version_check < self.version_check_interval):
+            return
+        version = self._probe()
+        if version is None:
+            return
+        if self._last_version is not None and version != self._last_version:
+            self._external_change()
+        self._last_version = version
+
+    def before_write(self):
+        """Probe for external writes while our write transaction holds the lock.
+
+        Called right after BEGIN IMMEDIATE: no other client can commit
+        until we do, so a version change seen here is someone else's write.
+        """
+        with self._lock:
+            if self._version_probe is None:
+                return
+            version = self._probe()
+            if version is None:
+                return
+            if self._last_version is not None and version != self._last_version:
+                self._external_change()
+            self._last_version = version
+
+    def after_write(self, own_before: Optional[int], own_probe: Callable[[], int]):
+        """Advance the baseline past our own commit without hiding others' writes.
+
+        ``own_before`` is PRAGMA data_version read on the writing connection
+        inside the transaction and ``own_probe`` reads it again. It does not
+        move for that connection's own commit, so any change means another
+        connection committed after our COMMIT released the lock. The
+        dedicated probe is read first: a commit between the two reads is
+        caught here, a later one by the next probe.
+        """
+        with self._lock:
+            if self._version_probe is None:
+                return
+            self._last_version = self._probe()
+            if self._last_version is None:
+                return
+            try:
+                own_after = own_probe()
+            except Exception as e:
+                logging.warning(f"Cache version probe failed: {e}")
+                own_after = None
+            if own_before is None or own_after != own_before:
+                self._external_change()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            if not self.enabled:
+                return False, None
+            self._check_external_changes()
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, _copy_result(entry[1])
+
+    def put(self, key: Hashable, value: Any, tables: Tuple[str, ...], generation: int):
+        """Store a result computed when the cache was at ``generation``.
+
+        If anything was invalidated meanwhile the result may predate that
+        write, so it is not stored.
+        """
+        with self._lock:
+            if not self.enabled or generation != self.generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic(), _copy_result(value), tables)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: Hashable):
+        _, _, tables = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys:
+                keys.discard(key)
+
+    def invalidate(self, *tables: str):
+        """Drop every entry that depends on any of the given tables."""
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.pop(table, ())):
+                    if key in self._entries:
+                        self._drop(key)
+            self.generation += 1
+            self.invalidations += 1
+
+    def _clear_entries(self):
+        self.generation += 1
+        self._entries.clear()
+        self._by_table.clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear_entries()
+            self._last_version = None
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "external_changes": self.external_changes,
+            }
+
+
+query_cache = QueryCache()
+
+
+def cached(*tables: str):
+    """Cache the decorated read function; results depend on the given tables."""
+    def decorator(func):
+        name = func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            generation = query_cache.generation
+            hit, value = query_cache.get(key)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            query_cache.put(key, value, tables, generation)
+            return value
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def invalidates(*tables: str):
+    """Drop cached results for the given tables after the decorated write."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                query_cache.invalidate(*tables)
+        return wrapper
+    return decorator
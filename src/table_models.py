@@ -0,0 +1,287 @@
+"""
+Table models for the main window views.
+
+Rows are stored as plain tuples and exposed to the view incrementally via
+canFetchMore()/fetchMore(), so a table with thousands of printers only
+creates what is actually scrolled into view. set_rows() compares the new
+rows with the current ones by key and emits row-level insert/remove/
+dataChanged signals instead of resetting the whole model.
+"""
+
+from difflib import SequenceMatcher
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
+from PySide6.QtGui import QColor
+
+Row = Tuple[Any, ...]
+
+
+class RowTableModel(QAbstractTableModel):
+    """Read-only model over a list of tuples with lazy fetching and diff updates."""
+
+    FETCH_BATCH = 200
+
+    def __init__(self, headers: Sequence[str], key: Optional[Callable[[Row], Hashable]] = None,
+                 parent=None):
+        super().__init__(parent)
+        self._headers = list(headers)
+        self._key = key or (lambda row: row)
+        self._rows: List[Row] = []
+        self._visible = 0
+
+    # --- Qt API ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._visible
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._visible:
+            return None
+        row = self._rows[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.display(row, index.column())
+        if role == Qt.BackgroundRole:
+            return self.background(row, index.column())
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._visible < len(self._rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.FETCH_BATCH, len(self._rows) - self._visible)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._visible, self._visible + count - 1)
+        self._visible += count
+        self.endInsertRows()
+
+    # --- Переопределяется в наследниках ---
+    def display(self, row: Row, column: int) -> Any:
+        value = row[column]
+        return "" if value is None else str(value)
+
+    def background(self, row: Row, column: int) -> Optional[QColor]:
+        return None
+
+    # --- Доступ к данным ---
+    def row(self, index: int) -> Row:
+        return self._rows[index]
+
+    def rows(self) -> List[Row]:
+        return list(self._rows)
+
+    def set_rows(self, rows: Sequence[Row]):
+        """Replace the contents, emitting only the row-level differences."""
+        new_rows = [tuple(r) for r in rows]
+        if not self._rows or not new_rows:
+            self.beginResetModel()
+            self._rows = new_rows
+            self._visible = min(self.FETCH_BATCH, len(new_rows))
+            self.endResetModel()
+            return
+        old_keys = [self._key(r) for r in self._rows]
+        new_keys = [self._key(r) for r in new_rows]
+        matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+        # С конца, чтобы индексы ещё не обработанных участков не сдвигались
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == "equal":
+                self._update_range(i1, new_rows[j1:j2])
+                continue
+            if tag in ("delete", "replace"):
+                self._remove_range(i1, i2)
+            if tag in ("insert", "replace"):
+                self._insert_range(i1, new_rows[j1:j2])
+
+    def _update_range(self, start: int, rows: List[Row]):
+        for offset, new_row in enumerate(rows):
+            i = start + offset
+            if self._rows[i] != new_row:
+                self._rows[i] = new_row
+                if i < self._visible:
+                    self.dataChanged.emit(self.index(i, 0), self.index(i, self.columnCount() - 1))
+
+    def _remove_range(self, start: int, end: int):
+        visible_end = min(end, self._visible)
+        if visible_end > start:
+            self.beginRemoveRows(QModelIndex(), start, visible_end - 1)
+            del self._rows[start:end]
+            self._visible -= visible_end - start
+            self.endRemoveRows()
+        else:
+            del self._rows[start:end]
+
+    def _insert_range(self, start: int, rows: List[Row]):
+        all_visible = self._visible == len(self._rows)
+        if start < self._visible or (all_visible and start == self._visible):
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            self._rows[start:start] = rows
+            self._visible += len(rows)
+            self.endInsertRows()
+        else:
+            self._rows[start:start] = rows
+
+
+class PagedTableModel(RowTableModel):
+    """Model whose rows arrive page by page from the database.
+
+    fetchMore() does not read from memory but emits pageRequested(cursor);
+    the owner loads the page in the background and hands it over through
+    append_page(). Only one page is requested at a time.
+    """
+
+    pageRequested = Signal(object)  # курсор последней загруженной строки или None
+
+    def __init__(self, headers: Sequence[str], cursor: Callable[[Row], Any],
+                 key: Optional[Callable[[Row], Hashable]] = None, parent=None):
+        super().__init__(headers, key=key, parent=parent)
+        self._cursor_of = cursor
+        self._cursor = None
+        self._exhausted = False
+        self._loading = False
+
+    def reset_pages(self):
+        """Drop loaded rows (e.g. after a filter change) and request the first page."""
+        self.beginResetModel()
+        self._rows = []
+        self._visible = 0
+        self._cursor = None
+        self._exhausted = False
+        self._loading = False
+        self.endResetModel()
+        self._request_page()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._visible < len(self._rows) or not (self._exhausted or self._loading)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        if self._visible < len(self._rows):
+            super().fetchMore(parent)
+        elif not (self._exhausted or self._loading):
+            self._request_page()
+
+    def _request_page(self):
+        self._loading = True
+        self.pageRequested.emit(self._cursor)
+
+    def append_page(self, rows: Sequence[Row], page_size: int):
+        """Append a loaded page; a page shorter than page_size ends the stream."""
+        rows = [tuple(r) for r in rows]
+        self._loading = False
+        self._exhausted = len(rows) < page_size
+        if not rows:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._rows.extend(rows)
+        self._visible = len(self._rows)
+        self.endInsertRows()
+        self._cursor = self._cursor_of(rows[-1])
+
+    def page_failed(self):
+        """Stop requesting pages after a load error until the next reset."""
+        self._loading = False
+        self._exhausted = True
+
+
+PRINTER_STATUS_OK = "Норма"
+PRINTER_STATUS_LOW = "Нужно пополнение"
+PRINTER_STATUS_ERROR = "Ошибка"
+
+
+def printer_status(printer: dict) -> str:
+    """Статус принтера по текущему и минимальному запасу расходников."""
+    min_cart = printer['min_cartridge_amount'] or 0
+    min_drum = printer['min_drum_amount'] or 0
+    cart_amt = printer['cartridge_amount'] or 0
+    drum_amt = printer['drum_amount'] or 0
+    if cart_amt < 0 or drum_amt < 0:
+        return PRINTER_STATUS_ERROR
+    if (min_cart > 0 and cart_amt < min_cart) or (min_drum > 0 and drum_amt < min_drum):
+        return PRINTER_STATUS_LOW
+    return PRINTER_STATUS_OK
+
+
+class PrintersTableModel(RowTableModel):
+    """Принтеры: ID, кабинет, имя, модели расходников, остатки и статус."""
+
+    COL_ID, COL_CABINET, COL_NAME, COL_CARTRIDGE, COL_DRUM, COL_CART_AMOUNT, COL_DRUM_AMOUNT, COL_STATUS = range(8)
+
+    def __init__(self, parent=None):
+        super().__init__([
+            "ID", "Кабинет", "Принтер", "Картридж", "Драм",
+            "Кол-во картриджей", "Кол-во драмов", "Статус"
+        ], key=lambda row: row[0], parent=parent)
+
+    def set_printers(self, printers: List[dict]):
+        self.set_rows([(
+            p['id'],
+            p['cabinet_name'] or "Без кабинета",
+            p['name'],
+            p['cartridge'] or "",
+            p['drum'] or "",
+            p['cartridge_amount'] or 0,
+            p['drum_amount'] or 0,
+            printer_status(p),
+        ) for p in printers])
+
+    def background(self, row, column):
+        if column == self.COL_STATUS:
+            if row[column] == PRINTER_STATUS_ERROR:
+                return QColor(255, 200, 200)  # Красный
+            if row[column] == PRINTER_STATUS_LOW:
+                return QColor(255, 255, 200)  # Желтый
+        return None
+
+
+class StorageTableModel(RowTableModel):
+    """Склад: модель, тип, количество; количество редактируется на месте."""
+
+    COL_MODEL, COL_TYPE, COL_AMOUNT = range(3)
+
+    amountEdited = Signal(str, str, str)  # model, type, введённый текст
+
+    def __init__(self, parent=None):
+        super().__init__(["Модель", "Тип", "Количество"],
+                         key=lambda row: (row[0], row[1]), parent=parent)
+
+    def set_storage(self, items: List[dict]):
+        self.set_rows([(i['model'], i['type'], i['amount']) for i in items])
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.COL_AMOUNT:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() != self.COL_AMOUNT:
+            return False
+        model, item_type, _ = self.row(index.row())
+        self.amountEdited.emit(model, item_type, str(value))
+        return True
+
+
+class UsersTableModel(RowTableModel):
+    """Пользователи: ID, логин, роль."""
+
+    COL_ID, COL_LOGIN, COL_ROLE = range(3)
+
+    def __init__(self, parent=None):
+        super().__init__(["ID", "Логин", "Роль"], key=lambda row: row[0], parent=parent)
+
+    def set_users(self, users: List[dict]):
+        self.set_rows([(u['id'], u['login'], u['role']) for u in users])
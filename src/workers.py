@@ -0,0 +1,141 @@
+"""
+Background task layer for the desktop client.
+
+Database and pandas work is submitted to the global QThreadPool and the
+result is delivered back on the GUI thread. Tasks are grouped into named
+channels ("printers", "storage", "analytics", ...): submitting to a channel
+supersedes whatever was submitted there before, so a stale refresh that is
+still queued is dropped and one that is already running has its result
+discarded.
+
+Long tasks report progress through TaskProgress: the task calls report()
+from the pool thread, the changed signal is delivered on the GUI thread,
+and cancel() from the GUI is seen by the task through the cancelled flag.
+"""
+
+import logging
+import threading
+import traceback
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+
+
+class _TaskSignals(QObject):
+    finished = Signal(str, int, object)
+    failed = Signal(str, int, str)
+
+
+class _Task(QRunnable):
+    """QRunnable that calls fn(*args) and reports through _TaskSignals."""
+
+    def __init__(self, channel: str, ticket: int, fn: Callable, args: tuple):
+        super().__init__()
+        self.channel = channel
+        self.ticket = ticket
+        self.fn = fn
+        self.args = args
+        self.signals = _TaskSignals()
+        self.setAutoDelete(False)
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            logging.error(f"Ошибка фоновой задачи {self.channel}: {e}\n{traceback.format_exc()}")
+            self.signals.failed.emit(self.channel, self.ticket, str(e))
+        else:
+            self.signals.finished.emit(self.channel, self.ticket, result)
+
+
+class TaskProgress(QObject):
+    """Progress and cancellation shared between a running task and the GUI."""
+
+    changed = Signal(object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cancelled = threading.Event()
+
+    def report(self, done, total=None):
+        """Called from the task; total may be None when it is unknown."""
+        self.changed.emit(done, total)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+class TaskRunner(QObject):
+    """Runs callables off the GUI thread, keeping only the newest task per channel."""
+
+    busyChanged = Signal(bool)
+
+    def __init__(self, parent=None, pool: Optional[QThreadPool] = None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self._tickets: Dict[str, int] = {}
+        self._pending: Dict[str, _Task] = {}
+        self._callbacks: Dict[str, tuple] = {}
+        # Ссылки на все запущенные задачи, включая устаревшие: объект QRunnable
+        # должен жить, пока пул его выполняет
+        self._inflight: Dict[Tuple[str, int], _Task] = {}
+
+    def submit(self, channel: str, fn: Callable, on_done: Callable[[Any], None],
+               on_error: Optional[Callable[[str], None]] = None, *args) -> int:
+        """Run fn(*args) in the pool; on_done(result) is called on the GUI thread."""
+        previous = self._pending.get(channel)
+        if previous is not None and self.pool.tryTake(previous):
+            self._inflight.pop((channel, previous.ticket), None)
+        ticket = self._tickets.get(channel, 0) + 1
+        self._tickets[channel] = ticket
+        task = _Task(channel, ticket, fn, args)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+        was_busy = self.is_busy
+        self._pending[channel] = task
+        self._inflight[(channel, ticket)] = task
+        self._callbacks[channel] = (on_done, on_error)
+        self.pool.start(task)
+        if not was_busy:
+            self.busyChanged.emit(True)
+        return ticket
+
+    @property
+    def is_busy(self) -> bool:
+        return bool(self._pending)
+
+    def _take(self, channel: str, ticket: int):
+        """Return callbacks if ticket is the newest for channel, else None."""
+        self._inflight.pop((channel, ticket), None)
+        if self._tickets.get(channel) != ticket or channel not in self._pending:
+            return None
+        del self._pending[channel]
+        callbacks = self._callbacks.pop(channel)
+        if not self._pending:
+            self.busyChanged.emit(False)
+        return callbacks
+
+    @Slot(str, int, object)
+    def _on_finished(self, channel: str, ticket: int, result: Any):
+        callbacks = self._take(channel, ticket)
+        if callbacks:
+            callbacks[0](result)
+
+    @Slot(str, int, str)
+    def _on_failed(self, channel: str, ticket: int, message: str):
+        callbacks = self._take(channel, ticket)
+        if callbacks and callbacks[1]:
+            callbacks[1](message)
+
+    def shutdown(self, timeout_ms: int = 3000):
+        """Drop queued tasks and wait for running ones (call on window close)."""
+        for task in self._pending.values():
+            self.pool.tryTake(task)
+        self._pending.clear()
+        self._callbacks.clear()
+        self.pool.waitForDone(timeout_ms)
+        self._inflight.clear()
@@ -0,0 +1,44 @@
+"""
+Общие фикстуры тестов настольного клиента: временная office.db, созданная
+init_db(), и пул соединений, закрываемый после каждого теста.
+
+Запуск из корня проекта:
+
+    python -m pytest
+"""
+
+import os
+
+import pytest
+
+from src import database
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """Путь к свежей базе во временном каталоге; database.DB_FILE указывает на неё"""
+    path = os.path.join(str(tmp_path), "office.db")
+    monkeypatch.setattr(database, "DB_FILE", path)
+    database.init_db()
+    yield path
+    database.close_pool()
+
+
+@pytest.fixture
+def release_server():
+    """Локальная замена GitHub из benchmarks.release_server"""
+    from benchmarks.release_server import ReleaseServer
+    with ReleaseServer() as server:
+        yield server
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """Каталог приложения для установки обновлений; свой кэш загрузок, без зеркала и пауз"""
+    import autoupdate
+    monkeypatch.setattr(autoupdate, "UPDATE_CACHE_DIR", os.path.join(str(tmp_path), "cache"))
+    monkeypatch.setattr(autoupdate, "RETRY_DELAY", 0)
+    monkeypatch.setattr(autoupdate, "UPDATE_MIRROR", "")
+    path = os.path.join(str(tmp_path), "app")
+    os.makedirs(path)
+    return path
@@ -0,0 +1,143 @@
+"""Помесячный расход из writeoff_monthly совпадает с прежним подсчётом по всей writeoff_history"""
+
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import analytics
+from benchmarks.datagen import build_office_db
+from src import database
+from src.database import PrinterManager, StorageManager
+
+COLUMNS = {"cartridge": "writeoff_cartridge", "drum": "writeoff_drum"}
+
+
+@pytest.fixture
+def usage_db(tmp_path, monkeypatch):
+    path = os.path.join(str(tmp_path), "office.db")
+    build_office_db(path, printers=200, writeoffs=10_000)
+    monkeypatch.setattr(database, "DB_FILE", path)
+    monkeypatch.setattr(analytics, "DB_FILE", path)
+    yield path
+    database.close_pool()
+
+
+@pytest.fixture
+def changed_printer(usage_db):
+    """Принтер, сменивший модели картриджа и драма; списания и до смены, и после неё"""
+    conn = sqlite3.connect(usage_db)
+    printer_id, cartridge, drum = conn.execute(
+        "SELECT id, cartridge, drum FROM printers WHERE cartridge IS NOT NULL "
+        "AND id IN (SELECT printer_id FROM writeoff_history) ORDER BY id LIMIT 1"
+    ).fetchone()
+    conn.close()
+    assert StorageManager.add_writeoff_record(printer_id, 1, 1, "test")
+    assert PrinterManager.update_printer(printer_id, cartridge="CRG-NEW", drum="DRM-NEW")
+    assert StorageManager.add_writeoff_record(printer_id, 2, 0, "test")
+    assert StorageManager.add_writeoff_record(printer_id, 0, 1, "test")
+    return printer_id, cartridge, drum
+
+
+def legacy_usage(db_file, column, model_type=None, model_name=None):
+    """Прежний подсчёт: вся история в pandas и группировка по месяцу из datetime.
+
+    Модель берётся из самого списания (модель на момент списания), как и в агрегате.
+    """
+    conn = sqlite3.connect(db_file)
+    if model_type:
+        df = pd.read_sql_query(f"SELECT datetime, {column} FROM writeoff_history w "
+                               f"WHERE w.{model_type} = ?", conn, params=(model_name,))
+    else:
+        df = pd.read_sql_query(f"SELECT datetime, {column} FROM writeoff_history WHERE {column} > 0", conn)
+    conn.close()
+    df["date"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d %H:%M:%S").dt.to_period("M")
+    return as_dict(df.groupby("date")[column].sum())
+
+
+def legacy_usage_by_cabinet(db_file):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute("""
+        SELECT p.cabinet_id, substr(w.datetime, 1, 7), SUM(w.writeoff_cartridge), SUM(w.writeoff_drum)
+        FROM writeoff_history w JOIN printers p ON p.id = w.printer_id
+        GROUP BY 1, 2
+    """).fetchall()
+    conn.close()
+    return {(cabinet, month): (cartridges, drums) for cabinet, month, cartridges, drums in rows}
+
+
+def usage_by_cabinet(db_file):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute("""
+        SELECT p.cabinet_id, m.month, SUM(m.writeoff_cartridge), SUM(m.writeoff_drum)
+        FROM writeoff_monthly m JOIN printers p ON p.id = m.printer_id
+        GROUP BY 1, 2
+    """).fetchall()
+    conn.close()
+    return {(cabinet, month): (cartridges, drums) for cabinet, month, cartridges, drums in rows}
+
+
+def as_dict(series):
+    return {str(month): int(total) for month, total in series.items()}
+
+
+def models(db_file, model_type):
+    conn = sqlite3.connect(db_file)
+    names = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT {model_type} FROM writeoff_history WHERE {model_type} IS NOT NULL")]
+    conn.close()
+    return names
+
+
+def check_matches_legacy(db_file):
+    for model_type, column in COLUMNS.items():
+        assert as_dict(analytics._monthly_usage(column)) == legacy_usage(db_file, column)
+        names = models(db_file, model_type)
+        assert len(names) > 10
+        for name in names:
+            assert (as_dict(analytics._monthly_usage(column, model_type, name))
+                    == legacy_usage(db_file, column, model_type, name)), name
+    by_cabinet = usage_by_cabinet(db_file)
+    assert len(by_cabinet) > 10
+    assert by_cabinet == legacy_usage_by_cabinet(db_file)
+
+
+def test_aggregate_matches_full_history(usage_db):
+    check_matches_legacy(usage_db)
+
+
+def test_incremental_updates_match_full_history(usage_db, changed_printer):
+    check_matches_legacy(usage_db)
+    # Пересборка агрегата из истории даёт то же, что и обновления при списании
+    database.rebuild_monthly_usage()
+    check_matches_legacy(usage_db)
+
+
+def test_writeoffs_keep_model_at_writeoff_time(usage_db, changed_printer):
+    _, cartridge, drum = changed_printer
+    month = pd.Timestamp.now().to_period("M")
+    new_cartridge = analytics._monthly_usage("writeoff_cartridge", "cartridge", "CRG-NEW")
+    new_drum = analytics._monthly_usage("writeoff_drum", "drum", "DRM-NEW")
+    assert as_dict(new_cartridge) == {str(month): 2}
+    assert as_dict(new_drum) == {str(month): 1}
+    # Списание до смены модели остаётся за прежними моделями
+    old = analytics._monthly_usage("writeoff_cartridge", "cartridge", cartridge)
+    assert old[month] >= 1
+    assert analytics._monthly_usage("writeoff_drum", "drum", drum)[month] >= 1
+    assert analytics.get_cartridge_forecast("CRG-NEW")["avg_per_month"] == 2
+    # Прежний подсчёт через текущую модель принтера отнёс бы всю историю к новой модели
+    conn = sqlite3.connect(usage_db)
+    by_current_model = conn.execute(
+        "SELECT SUM(w.writeoff_cartridge) FROM writeoff_history w JOIN printers p ON p.id = w.printer_id "
+        "WHERE p.cartridge = 'CRG-NEW'"
+    ).fetchone()[0]
+    conn.close()
+    assert by_current_model > new_cartridge.sum()
+
+
+def test_usage_by_month_frame(usage_db, changed_printer):
+    usage = analytics.get_cartridge_usage_by_month()
+    assert list(usage.columns) == ["month", "usage"]
+    assert dict(zip(map(str, usage["month"]), map(int, usage["usage"]))) == legacy_usage(
+        usage_db, "writeoff_cartridge")
@@ -0,0 +1,122 @@
+"""Загрузка обновления: поток на диск, докачка после обрыва и отмены, проверка SHA-256, установка"""
+
+import json
+import os
+import random
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+import autoupdate
+from benchmarks.release_server import make_archive
+
+SIZE_MB = 4
+ARCHIVE_NAME = "PrintGuard-2.1.0.zip"
+
+
+@pytest.fixture
+def archive(tmp_path, release_server, app_dir):
+    """Архив релиза и manifest.json на локальном сервере"""
+    rnd = random.Random(1)
+    payload = {
+        "BotPrinters.exe": rnd.randbytes(SIZE_MB * 1024 * 1024),
+        "analytics.py": b"# analytics v2\n",
+        "lib/helper.dll": rnd.randbytes(64 * 1024),
+    }
+    path = os.path.join(str(tmp_path), ARCHIVE_NAME)
+    data = make_archive(path, payload)
+    manifest = autoupdate.build_manifest(path, "2.1.0")
+    release_server.files[ARCHIVE_NAME] = data
+    release_server.files[autoupdate.MANIFEST_NAME] = json.dumps(manifest).encode()
+    return SimpleNamespace(
+        url=release_server.url(ARCHIVE_NAME), data=data, payload=payload,
+        sha256=manifest["archive"]["sha256"], size=manifest["archive"]["size"],
+    )
+
+
+def download(tmp_path, archive, name, **kwargs):
+    dest = os.path.join(str(tmp_path), name)
+    return autoupdate.download_file(archive.url, dest, archive.sha256, archive.size, **kwargs)
+
+
+def test_download_streams_to_disk(tmp_path, archive):
+    seen = []
+    tracemalloc.start()
+    try:
+        dest = download(tmp_path, archive, "full.zip", progress=lambda done, total: seen.append((done, total)))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    with open(dest, "rb") as f:
+        assert f.read() == archive.data
+    assert seen[-1] == (archive.size, archive.size)
+    assert [done for done, _ in seen] == sorted(done for done, _ in seen)
+    # Архив не держится в памяти целиком
+    assert peak < archive.size / 4
+
+
+def test_dropped_connection_resumes_with_range(tmp_path, release_server, archive):
+    release_server.reset_counters()
+    release_server.drop_after, release_server.drops = archive.size // 3, 1
+    dest = download(tmp_path, archive, "resumed.zip")
+    assert autoupdate.sha256_file(dest) == archive.sha256
+    assert len(release_server.requests) == 2
+    first, second = release_server.requests
+    assert first[1] is None
+    # Блок, не дописанный на диск к моменту обрыва, запрашивается повторно
+    resumed_from = int(second[1].split("=")[1].rstrip("-"))
+    assert archive.size // 3 - autoupdate.CHUNK_SIZE <= resumed_from <= archive.size // 3
+    assert release_server.sent - archive.size <= autoupdate.CHUNK_SIZE
+
+
+def test_cancelled_download_resumes_from_part_file(tmp_path, release_server, archive):
+    def cancel_at_half(done, total):
+        if done > total // 2:
+            raise autoupdate.DownloadCancelled()
+
+    with pytest.raises(autoupdate.DownloadCancelled):
+        download(tmp_path, archive, "cancelled.zip", progress=cancel_at_half)
+    part = os.path.getsize(os.path.join(str(tmp_path), "cancelled.zip.part"))
+    assert 0 < part < archive.size
+    release_server.reset_counters()
+    dest = download(tmp_path, archive, "cancelled.zip")
+    assert release_server.requests == [(ARCHIVE_NAME, f"bytes={part}-")]
+    assert autoupdate.sha256_file(dest) == archive.sha256
+
+
+def test_wrong_sha256_is_rejected(tmp_path, archive):
+    dest = os.path.join(str(tmp_path), "bad.zip")
+    with pytest.raises(autoupdate.UpdateError):
+        autoupdate.download_file(archive.url, dest, "0" * 64, archive.size)
+    assert not os.path.exists(dest)
+    assert not os.path.exists(dest + ".part")
+
+
+def test_server_without_range_starts_over(tmp_path, release_server, archive):
+    release_server.ignore_range = True
+    release_server.drop_after, release_server.drops = archive.size // 2, 1
+    dest = download(tmp_path, archive, "norange.zip")
+    assert autoupdate.sha256_file(dest) == archive.sha256
+
+
+def test_download_and_replace_installs_release(release_server, archive, app_dir):
+    os.makedirs(os.path.join(app_dir, "lib"))
+    for name, data in (("BotPrinters.exe", b"old exe"), ("analytics.py", b"# v1\n"), ("office.db", b"db")):
+        with open(os.path.join(app_dir, name), "wb") as f:
+            f.write(data)
+    release = release_server.release("v2.1.0", [ARCHIVE_NAME, autoupdate.MANIFEST_NAME])
+    assert autoupdate.download_and_replace(release, target_dir=app_dir)
+    for name, data in archive.payload.items():
+        with open(os.path.join(app_dir, name), "rb") as f:
+            assert f.read() == data
+    with open(os.path.join(app_dir, "office.db"), "rb") as f:
+        assert f.read() == b"db"
+    assert not [name for name in os.listdir(app_dir) if name.startswith(".")]
+    assert not os.listdir(autoupdate.UPDATE_CACHE_DIR)
+
+
+def test_release_without_checksum_is_not_installed(release_server, archive, app_dir):
+    release = release_server.release("v2.1.0", [ARCHIVE_NAME])
+    assert not autoupdate.download_and_replace(release, target_dir=app_dir)
+    assert not os.listdir(app_dir)
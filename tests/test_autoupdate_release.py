@@ -0,0 +1,102 @@
+"""Сравнение версий по semver и кэш ответа GitHub о последнем релизе (TTL, ETag)"""
+
+import json
+import time
+
+import pytest
+
+import autoupdate
+
+
+@pytest.mark.parametrize("older, newer", [
+    ("1.9.0", "1.10.0"),
+    ("v1.10.0", "1.11"),
+    ("2.0.0-rc.1", "2.0.0"),
+    ("2.0.0-rc.2", "2.0.0-rc.10"),
+    ("2.0.0-alpha", "2.0.0-alpha.1"),
+    ("2.0.0-rc.10", "2.0.0-rc.a"),
+    ("2.0.0-beta", "2.0.0-rc"),
+    ("2.0.0", "v2.0.1"),
+])
+def test_version_order(older, newer):
+    assert autoupdate.is_newer(newer, older)
+    assert not autoupdate.is_newer(older, newer)
+
+
+def test_build_metadata_is_ignored():
+    assert autoupdate.parse_version("2.0.0+build.7") == autoupdate.parse_version("v2.0.0")
+
+
+def test_pre_releases_sort_before_release():
+    tags = ["2.0.0", "1.10.0", "v2.0.0-rc.1", "1.9.0", "2.0.0-rc.10", "2.0.0-rc.2", "v2.0.1"]
+    assert sorted(tags, key=autoupdate.parse_version) == [
+        "1.9.0", "1.10.0", "v2.0.0-rc.1", "2.0.0-rc.2", "2.0.0-rc.10", "2.0.0", "v2.0.1",
+    ]
+
+
+def test_invalid_version_is_rejected():
+    with pytest.raises(ValueError):
+        autoupdate.parse_version("latest")
+
+
+@pytest.fixture
+def github(tmp_path, release_server, monkeypatch):
+    """API последнего релиза на локальном сервере; кэш ответа во временном каталоге"""
+    monkeypatch.setattr(autoupdate, "RELEASES_API", release_server.url("latest"))
+    monkeypatch.setattr(autoupdate, "RELEASE_CACHE_FILE", str(tmp_path / "release-cache" / "latest-release.json"))
+    release_server.files["latest"] = json.dumps({"tag_name": "v1.10.0", "assets": []}).encode()
+    release_server.reset_counters()
+    return release_server
+
+
+def age_cache(seconds):
+    """Сдвинуть время последней проверки в кэше на seconds назад"""
+    with open(autoupdate.RELEASE_CACHE_FILE, encoding="utf-8") as f:
+        cache = json.load(f)
+    cache["checked_at"] -= seconds
+    with open(autoupdate.RELEASE_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+
+
+def test_fresh_cache_needs_no_network(github):
+    assert autoupdate.get_latest_release()["tag_name"] == "v1.10.0"
+    assert autoupdate.get_latest_release()["tag_name"] == "v1.10.0"
+    assert len(github.requests) == 1
+
+
+def test_expired_cache_is_revalidated_with_304(github):
+    autoupdate.get_latest_release(ttl=60)
+    age_cache(61)
+    github.reset_counters()
+    assert autoupdate.get_latest_release(ttl=60)["tag_name"] == "v1.10.0"
+    # Условный запрос: 304 без тела, используется сохранённый ответ
+    assert [name for name, _ in github.requests] == ["latest"]
+    assert github.sent == 0
+    # После 304 отсчёт TTL начинается заново
+    github.reset_counters()
+    autoupdate.get_latest_release(ttl=60)
+    assert github.requests == []
+
+
+def test_changed_etag_replaces_cached_release(github):
+    autoupdate.get_latest_release()
+    github.files["latest"] = json.dumps({"tag_name": "v1.11.0", "assets": []}).encode()
+    assert autoupdate.get_latest_release()["tag_name"] == "v1.10.0"
+    age_cache(autoupdate.RELEASE_CACHE_TTL + 1)
+    assert autoupdate.get_latest_release()["tag_name"] == "v1.11.0"
+
+
+def test_slow_github_falls_back_to_cache(github):
+    autoupdate.get_latest_release()
+    github.delay = 2
+    start = time.perf_counter()
+    assert autoupdate.get_latest_release(ttl=0, timeout=(0.3, 0.3))["tag_name"] == "v1.10.0"
+    assert time.perf_counter() - start < 1
+
+
+def test_slow_github_without_cache_raises(github):
+    github.delay = 2
+    start = time.perf_counter()
+    with pytest.raises(autoupdate.requests.RequestException):
+        autoupdate.check_new_version(0, (0.3, 0.3))
+    assert time.perf_counter() - start < 1
@@ -0,0 +1,72 @@
+"""Отчёт по заменам картриджей одним запросом совпадает с прежним построчным (эталон)"""
+
+import os
+
+import pytest
+
+import analytics
+from benchmarks.bench_change_report import legacy_change_report
+from benchmarks.datagen import build_office_db
+from src import database
+
+
+@pytest.fixture
+def report_db(tmp_path, monkeypatch):
+    path = os.path.join(str(tmp_path), "office.db")
+    build_office_db(path, printers=300, writeoffs=20_000)
+    database.close_pool()
+    monkeypatch.setattr(analytics, "DB_FILE", path)
+    return path
+
+
+@pytest.fixture
+def edge_cases_db(db_file, monkeypatch):
+    """Принтер без кабинета, без модели, без замен и со списаниями только драма"""
+    with database.write_transaction() as conn:
+        conn.execute("INSERT INTO cabinets (id, name) VALUES (1, '101'), (2, '102')")
+        conn.executemany("INSERT INTO printers (id, cabinet_id, name, cartridge) VALUES (?, ?, ?, ?)", [
+            (1, 1, "Брат", "TN-1075"), (2, 1, "Брат", "TN-1075"), (3, None, "Без кабинета", "725"),
+            (4, 2, "Без модели", None), (5, 2, "Только драм", "CE285A"), (6, 2, "Без замен", "CE285A"),
+        ])
+        conn.executemany(
+            "INSERT INTO writeoff_history (printer_id, writeoff_cartridge, writeoff_drum, datetime) "
+            "VALUES (?, ?, ?, ?)", [
+                (1, 1, 0, "2025-03-01 10:00:00"), (1, 2, 0, "2025-04-01 10:00:00"),
+                (2, 1, 0, "2025-04-01 10:00:00"), (3, 1, 0, "2025-01-05 08:00:00"),
+                (4, 1, 1, "2025-02-01 12:00:00"), (5, 0, 1, "2025-05-01 12:00:00"),
+            ])
+    monkeypatch.setattr(analytics, "DB_FILE", db_file)
+    return db_file
+
+
+def row_key(row):
+    return tuple(str(value) for value in row.values())
+
+
+def test_matches_legacy_report(report_db):
+    expected = legacy_change_report(report_db)
+    actual = analytics.get_cartridge_change_report()
+    # Принтеры с одинаковыми кабинетом и именем идут по id: сравниваем мультимножества и порядок имён
+    assert sorted(actual, key=row_key) == sorted(expected, key=row_key)
+    assert [row["printer"] for row in actual] == [row["printer"] for row in expected]
+
+
+def test_edge_cases_match_legacy_report(edge_cases_db):
+    expected = legacy_change_report(edge_cases_db)
+    actual = analytics.get_cartridge_change_report()
+    assert sorted(actual, key=row_key) == sorted(expected, key=row_key)
+    by_printer = {row["printer"]: row for row in actual}
+    assert by_printer["Без кабинета"]["cabinet"] == "-"
+    assert by_printer["Без модели"]["cartridge"] == "-"
+    assert by_printer["Только драм"]["total_changes"] == 0
+    assert by_printer["Только драм"]["last_change"] == "-"
+    assert by_printer["Без замен"]["days_since_last"] == "-"
+    assert sorted(row["total_changes"] for row in actual if row["printer"] == "Брат") == [1, 2]
+
+
+def test_cli_report_uses_same_rows(edge_cases_db, capsys):
+    analytics.cartridge_change_report()
+    lines = capsys.readouterr().out.splitlines()[2:]
+    report = analytics.get_cartridge_change_report()
+    assert len(lines) == len(report)
+    assert [line.split("|")[1].strip() for line in lines] == [row["printer"] for row in report]
@@ -0,0 +1,90 @@
+"""Пул соединений: повторное использование, предел размера, замена сломанных соединений"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from src import database
+from src.database import ConnectionPool, DatabaseError
+
+
+@pytest.fixture
+def pool(db_file):
+    pool = ConnectionPool(db_file, size=2, timeout=0.2, health_check_idle=0)
+    yield pool
+    pool.close()
+
+
+def test_connection_is_reused(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.stats["opened"] == 1
+
+
+def test_pool_size_is_bounded(pool):
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(DatabaseError):
+        pool.acquire()
+    assert pool.stats["opened"] == 2
+    # Освобождённое соединение достаётся ждущему потоку
+    threading.Timer(0.05, pool.release, (held.pop(),)).start()
+    assert pool.acquire() is not None
+
+
+def test_broken_connection_is_replaced(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()  # соединение «умерло», пока лежало в пуле
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert fresh.execute("SELECT 1").fetchone()[0] == 1
+    assert pool.stats["opened"] == 1
+
+
+def test_release_rolls_back_open_transaction(pool):
+    conn = pool.acquire()
+    conn.execute("INSERT INTO cabinets (name) VALUES ('черновик')")
+    pool.release(conn)
+    again = pool.acquire()
+    assert again.execute("SELECT COUNT(*) FROM cabinets WHERE name = 'черновик'").fetchone()[0] == 0
+
+
+def test_closed_pool_refuses(pool):
+    pool.close()
+    with pytest.raises(DatabaseError):
+        pool.acquire()
+
+
+def test_pragma_profile_applied(db_file):
+    with database.get_db_connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0].upper() == database.PRAGMA_PROFILE["journal_mode"]
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == database.PRAGMA_PROFILE["busy_timeout"]
+
+
+def test_wal_refused_on_network_share():
+    profile = database.network_safe_profile("//server/share/office.db",
+                                            dict(database.PRAGMA_PROFILE, journal_mode="WAL"))
+    assert profile["journal_mode"] == "DELETE"
+    assert "mmap_size" not in profile
+
+
+def test_write_transaction_rolls_back_on_error(db_file):
+    with pytest.raises(RuntimeError):
+        with database.write_transaction() as conn:
+            conn.execute("INSERT INTO cabinets (name) VALUES ('откат')")
+            raise RuntimeError
+    with database.get_db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM cabinets").fetchone()[0] == 0
+
+
+def test_write_waits_for_lock(db_file):
+    other = sqlite3.connect(db_file, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.1, other.commit).start()
+    with database.write_transaction() as conn:
+        conn.execute("INSERT INTO cabinets (name) VALUES ('после блокировки')")
+    other.close()
+    with database.get_db_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM cabinets").fetchone()[0] == 1
@@ -0,0 +1,120 @@
+"""Частичное обновление: манифест по файлам, загрузка только изменившихся, откат на архив"""
+
+import hashlib
+import json
+import os
+import zipfile
+import zlib
+
+import pytest
+
+import autoupdate
+from benchmarks.bench_delta_update import releases, publish, update
+
+EXE_MB = 2
+
+
+@pytest.fixture
+def payloads():
+    return releases(EXE_MB)
+
+
+@pytest.fixture
+def published(tmp_path, release_server, payloads):
+    """(старый архив, новый архив, релиз, манифест) на локальном сервере"""
+    old, new = payloads
+    old_archive, _ = publish(release_server, str(tmp_path), "v2.0.0", old)
+    previous = [old_archive] if autoupdate.bsdiff4 is not None else []
+    new_archive, release = publish(release_server, str(tmp_path), "v2.1.0", new, previous=previous)
+    manifest = json.loads(release_server.files[autoupdate.MANIFEST_NAME])
+    return old_archive, new_archive, release, manifest
+
+
+def serve_manifest(server, manifest, *keys, **changes):
+    served = {k: manifest[k] for k in keys}
+    served.update(changes)
+    server.files[autoupdate.MANIFEST_NAME] = json.dumps(served).encode()
+    return len(server.files[autoupdate.MANIFEST_NAME])
+
+
+def changed_size(manifest, payloads):
+    old, new = payloads
+    return sum(manifest["files"][name]["compressed_size"] for name in new if old.get(name) != new[name])
+
+
+def test_manifest_describes_every_member(published, payloads):
+    _, new_archive, _, manifest = published
+    _, new = payloads
+    assert set(manifest["files"]) == set(new)
+    assert manifest["archive"]["sha256"] == autoupdate.sha256_file(new_archive)
+    with open(new_archive, "rb") as raw:
+        for name, entry in manifest["files"].items():
+            # По смещению из манифеста лежат сжатые данные именно этого файла
+            raw.seek(entry["offset"])
+            data = raw.read(entry["compressed_size"])
+            if entry["method"] == zipfile.ZIP_DEFLATED:
+                data = zlib.decompress(data, -zlib.MAX_WBITS)
+            assert len(data) == entry["size"]
+            assert hashlib.sha256(data).hexdigest() == entry["sha256"]
+            assert data == new[name]
+
+
+def test_only_changed_files_downloaded(release_server, app_dir, published, payloads):
+    old_archive, _, release, manifest = published
+    manifest_size = serve_manifest(release_server, manifest, "version", "archive", "files")
+    ok, sent = update(release_server, app_dir, old_archive, release, payloads[1])
+    assert ok
+    assert sent == manifest_size + changed_size(manifest, payloads)
+
+
+def test_patches_smaller_than_files(release_server, app_dir, published, payloads):
+    if autoupdate.bsdiff4 is None:
+        pytest.skip("bsdiff4 не установлен")
+    old_archive, _, release, manifest = published
+    manifest_size = serve_manifest(release_server, manifest, *manifest)
+    ok, sent = update(release_server, app_dir, old_archive, release, payloads[1])
+    assert ok
+    assert sent - manifest_size < changed_size(manifest, payloads)
+
+
+def test_wrong_file_hash_falls_back_to_archive(release_server, app_dir, published, payloads):
+    old_archive, new_archive, release, manifest = published
+    files = json.loads(json.dumps(manifest["files"]))
+    files["analytics.py"]["sha256"] = "0" * 64
+    serve_manifest(release_server, manifest, "version", "archive", files=files)
+    ok, sent = update(release_server, app_dir, old_archive, release, payloads[1])
+    # Файл, не совпавший с манифестом, не ставится; проверенный архив ставится целиком
+    assert ok
+    assert sent >= os.path.getsize(new_archive)
+
+
+def test_unsafe_member_name_rejected(app_dir, published):
+    manifest = dict(published[3], files={"../evil.dll": published[3]["files"]["analytics.py"]})
+    with pytest.raises(autoupdate.UpdateError):
+        autoupdate.plan_delta(manifest, app_dir)
+
+
+def test_server_without_range_falls_back_to_archive(release_server, app_dir, published, payloads):
+    old_archive, new_archive, release, manifest = published
+    serve_manifest(release_server, manifest, "version", "archive", "files")
+    release_server.ignore_range = True
+    ok, sent = update(release_server, app_dir, old_archive, release, payloads[1])
+    assert ok
+    assert sent >= os.path.getsize(new_archive)
+
+
+def test_corrupted_installed_file_restored(release_server, app_dir, published, payloads):
+    old_archive, new_archive, release, manifest = published
+    serve_manifest(release_server, manifest, *manifest)
+    ok, sent = update(release_server, app_dir, old_archive, release, payloads[1], corrupt="lib/Qt6Core.dll")
+    assert ok
+    assert sent < os.path.getsize(new_archive)
+
+
+def test_large_change_downloads_archive(release_server, app_dir, published, payloads, monkeypatch):
+    old_archive, new_archive, release, manifest = published
+    serve_manifest(release_server, manifest, "version", "archive", "files")
+    monkeypatch.setattr(autoupdate, "DELTA_MAX_RATIO", 0)
+    ok, sent = update(release_server, app_dir, old_archive, release, payloads[1])
+    assert ok
+    assert sent >= os.path.getsize(new_archive)
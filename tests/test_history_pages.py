@@ -0,0 +1,118 @@
+"""Постраничная история: ключ (datetime, id) при одинаковом времени и фильтры"""
+
+import sqlite3
+
+import pytest
+
+from src.database import CabinetManager, HistoryManager, PrinterManager, StorageManager
+
+
+@pytest.fixture
+def printers(db_file):
+    """{имя: id} двух принтеров в одном кабинете"""
+    CabinetManager.add_cabinet("101")
+    cabinet_id = CabinetManager.get_all_cabinets()[0]["id"]
+    PrinterManager.add_printer(cabinet_id, "HP-1", "CF226A", "CF232A")
+    PrinterManager.add_printer(cabinet_id, "Kyocera-2", "TK-1170", "DK-1150")
+    return {p["name"]: p["id"] for p in PrinterManager.get_all_printers()}
+
+
+@pytest.fixture
+def history(db_file, printers):
+    """Списания и перемещения; по три записи на каждую секунду"""
+    conn = sqlite3.connect(db_file)
+    for n in range(30):
+        stamp = f"2024-0{1 + n // 10}-{10 + n % 10:02d} 12:00:00"
+        name = "HP-1" if n % 2 else "Kyocera-2"
+        cartridge, drum = ("CF226A", "CF232A") if n % 2 else ("TK-1170", "DK-1150")
+        user = "ivanov" if n % 3 else "petrov"
+        for _ in range(3):
+            conn.execute(
+                "INSERT INTO writeoff_history (printer_id, writeoff_cartridge, writeoff_drum,"
+                " datetime, username, cartridge, drum) VALUES (?, 1, 0, ?, ?, ?, ?)",
+                (printers[name], stamp, user, cartridge, drum),
+            )
+            conn.execute(
+                "INSERT INTO storage_transfer_history (datetime, username, model, type, amount,"
+                " from_place, to_place) VALUES (?, ?, ?, 'cartridge', 1, 'Склад', ?)",
+                (stamp, user, cartridge, name),
+            )
+    conn.commit()
+    conn.close()
+
+
+GETTERS = [HistoryManager.get_transfer_history_page, HistoryManager.get_writeoff_history_page]
+
+
+def walk(get_page, page_size, **filters):
+    rows, after = [], None
+    while True:
+        page = get_page(after=after, limit=page_size, **filters)
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        after = (page[-1]["datetime"], page[-1]["id"])
+
+
+def key(row):
+    return row["datetime"], row["id"]
+
+
+@pytest.mark.parametrize("get_page", GETTERS)
+@pytest.mark.parametrize("page_size", [1, 2, 4, 7, 200])
+def test_pages_walk_every_row_once(history, get_page, page_size):
+    # Размер страницы не кратен трём: граница попадает между строками с одним временем
+    rows = walk(get_page, page_size)
+    assert len(rows) == 90
+    assert len({row["id"] for row in rows}) == 90
+    assert [key(row) for row in rows] == sorted((key(row) for row in rows), reverse=True)
+
+
+@pytest.mark.parametrize("get_page", GETTERS)
+def test_new_rows_do_not_shift_pages(db_file, history, get_page):
+    first = get_page(limit=4)
+    conn = sqlite3.connect(db_file)
+    conn.execute("INSERT INTO storage_transfer_history (datetime, username, model, type, amount)"
+                 " VALUES ('2030-01-01 00:00:00', 'ivanov', 'CF226A', 'cartridge', 1)")
+    conn.execute("INSERT INTO writeoff_history (printer_id, datetime, username, cartridge, drum)"
+                 " VALUES (NULL, '2030-01-01 00:00:00', 'ivanov', '', '')")
+    conn.commit()
+    conn.close()
+    second = get_page(after=key(first[-1]), limit=4)
+    assert key(second[0]) < key(first[-1])
+
+
+@pytest.mark.parametrize("get_page", GETTERS)
+@pytest.mark.parametrize("filters, expected", [
+    ({"date_from": "2024-02-01"}, 60),
+    ({"date_to": "2024-01-31"}, 30),
+    ({"date_from": "2024-02-11", "date_to": "2024-02-12"}, 6),
+    ({"username": "petrov"}, 30),
+    ({"model": "CF226A"}, 45),
+    ({"printer": "Kyocera-2"}, 45),
+    ({"username": "ivanov", "printer": "HP-1", "date_to": "2024-02-28"}, 21),
+])
+def test_filters_apply_to_every_page(history, get_page, filters, expected):
+    rows = walk(get_page, 4, **filters)
+    assert len(rows) == expected
+    assert rows == get_page(limit=1000, **filters)
+    for row in rows:
+        if "username" in filters:
+            assert row["username"] == filters["username"]
+        if "date_from" in filters:
+            assert row["datetime"] >= filters["date_from"]
+        if "date_to" in filters:
+            assert row["datetime"][:10] <= filters["date_to"]
+
+
+def test_writeoff_page_shows_models_at_writeoff_time(db_file, printers):
+    hp = printers["HP-1"]
+    assert StorageManager.add_writeoff_record(hp, 1, 1, "ivanov")
+    assert PrinterManager.update_printer(hp, cartridge="CF259A", drum="CF234A")
+    assert StorageManager.add_writeoff_record(hp, 1, 0, "ivanov")
+    newest, oldest = HistoryManager.get_writeoff_history_page()
+    assert (newest["cartridge"], newest["drum"]) == ("CF259A", "CF234A")
+    assert (oldest["cartridge"], oldest["drum"]) == ("CF226A", "CF232A")
+    # Фильтр по модели ищет по моделям из списания, а не по текущим у принтера
+    assert [row["id"] for row in HistoryManager.get_writeoff_history_page(model="CF226A")] == [oldest["id"]]
+    assert [row["id"] for row in HistoryManager.get_writeoff_history_page(model="CF234A")] == [newest["id"]]
@@ -0,0 +1,138 @@
+"""Миграции схемы: перенос старой базы, повторный запуск ничего не меняет, планы горячих запросов"""
+
+import sqlite3
+
+import pytest
+
+from src import database
+from src.migrations import MIGRATIONS, SCHEMA_VERSION, get_schema_version, run_migrations
+
+# Схема office.db до появления миграций (user_version = 0)
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, login TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    role TEXT NOT NULL CHECK(role IN ('admin', 'operator', 'viewer')));
+CREATE TABLE cabinets (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL);
+CREATE TABLE printers (id INTEGER PRIMARY KEY AUTOINCREMENT, cabinet_id INTEGER, name TEXT NOT NULL,
+                       cartridge TEXT, drum TEXT, cartridge_amount INTEGER DEFAULT 0,
+                       drum_amount INTEGER DEFAULT 0, min_cartridge_amount INTEGER DEFAULT 0,
+                       min_drum_amount INTEGER DEFAULT 0);
+CREATE TABLE writeoff_history (id INTEGER PRIMARY KEY AUTOINCREMENT, printer_id INTEGER,
+                               writeoff_cartridge INTEGER DEFAULT 0, writeoff_drum INTEGER DEFAULT 0,
+                               datetime TEXT NOT NULL, username TEXT);
+CREATE TABLE storage (id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT NOT NULL,
+                      type TEXT CHECK(type IN ('cartridge', 'drum')) NOT NULL, amount INTEGER DEFAULT 0);
+CREATE TABLE storage_transfer_history (id INTEGER PRIMARY KEY AUTOINCREMENT, datetime TEXT NOT NULL,
+                                       username TEXT, model TEXT NOT NULL,
+                                       type TEXT CHECK(type IN ('cartridge', 'drum')) NOT NULL,
+                                       amount INTEGER NOT NULL, from_place TEXT, to_place TEXT);
+INSERT INTO cabinets (name) VALUES ('101');
+INSERT INTO printers (cabinet_id, name, cartridge, drum) VALUES (1, 'HP 1', 'CE285A', 'DR-1'), (1, 'Canon 2', '725', '');
+INSERT INTO writeoff_history (printer_id, writeoff_cartridge, writeoff_drum, datetime, username) VALUES
+    (1, 1, 0, '2025-01-10 10:00:00', 'admin'), (1, 2, 1, '2025-01-20 10:00:00', 'admin'),
+    (2, 1, 0, '2025-02-01 09:00:00', 'admin'), (NULL, 1, 0, '2025-02-03 09:00:00', 'admin');
+INSERT INTO storage (model, type, amount) VALUES ('CE285A', 'cartridge', 3), ('CE285A', 'cartridge', 4),
+    ('725', 'cartridge', 1);
+"""
+
+# (описание, запрос, параметры, индекс, который должен быть в плане)
+HOT_QUERIES = [
+    ("последняя замена картриджа по принтеру",
+     "SELECT datetime FROM writeoff_history WHERE printer_id=? AND writeoff_cartridge>0 "
+     "ORDER BY datetime DESC LIMIT 1",
+     (1,), "idx_writeoff_printer_datetime"),
+    ("количество замен по принтеру",
+     "SELECT COUNT(*) FROM writeoff_history WHERE printer_id=? AND writeoff_cartridge>0",
+     (1,), "idx_writeoff_printer_datetime"),
+    ("история списаний по дате",
+     "SELECT datetime, writeoff_cartridge FROM writeoff_history "
+     "WHERE datetime >= ? ORDER BY datetime",
+     ("2025-01-01",), "idx_writeoff_datetime"),
+    ("остаток на складе по модели и типу",
+     "SELECT amount FROM storage WHERE model = ? AND type = ?",
+     ("Canon 725", "cartridge"), "idx_storage_model_type"),
+    ("совместимые принтеры по картриджу",
+     "SELECT id, name FROM printers WHERE cartridge = ?",
+     ("Canon 725",), "idx_printers_cartridge"),
+    ("совместимые принтеры по драму",
+     "SELECT id, name FROM printers WHERE drum = ?",
+     ("DR-1075",), "idx_printers_drum"),
+    ("история перемещений по дате",
+     "SELECT datetime, model FROM storage_transfer_history ORDER BY datetime DESC",
+     (), "idx_transfer_history_datetime"),
+    ("расход по месяцам для модели",
+     "SELECT month, SUM(writeoff_cartridge) FROM writeoff_monthly WHERE cartridge = ? GROUP BY month",
+     ("CE285A",), "idx_writeoff_monthly_cartridge"),
+]
+
+
+def dump(path):
+    """Схема и все данные базы — для сравнения до и после повторного запуска"""
+    conn = sqlite3.connect(path)
+    try:
+        return list(conn.iterdump()), conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "office.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+    monkeypatch.setattr(database, "DB_FILE", path)
+    yield path
+    database.close_pool()
+
+
+def test_legacy_database_upgraded(legacy_db):
+    database.init_db()
+    conn = sqlite3.connect(legacy_db)
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    # Дубли (model, type) сложены в одну строку до создания UNIQUE
+    assert conn.execute("SELECT amount FROM storage WHERE model = 'CE285A'").fetchall() == [(7,)]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO storage (model, type, amount) VALUES ('725', 'cartridge', 1)")
+    # Модели старых списаний взяты у принтеров, агрегат построен по ним
+    assert conn.execute("SELECT cartridge, drum FROM writeoff_history ORDER BY id").fetchall() == \
+        [("CE285A", "DR-1"), ("CE285A", "DR-1"), ("725", ""), ("", "")]
+    assert conn.execute(
+        "SELECT month, printer_id, cartridge, writeoff_cartridge, writeoff_drum "
+        "FROM writeoff_monthly ORDER BY month, printer_id"
+    ).fetchall() == [("2025-01", 1, "CE285A", 3, 1), ("2025-02", 0, "", 1, 0), ("2025-02", 2, "725", 1, 0)]
+    conn.close()
+
+
+def test_init_db_is_idempotent(legacy_db):
+    database.init_db()
+    first = dump(legacy_db)
+    database.close_pool()
+    database.init_db()
+    assert dump(legacy_db) == first
+
+
+def test_each_migration_safe_to_repeat(db_file):
+    before = dump(db_file)
+    conn = sqlite3.connect(db_file)
+    for version, description, migrate in MIGRATIONS:
+        migrate(conn)
+    conn.commit()
+    assert run_migrations(conn) == SCHEMA_VERSION
+    conn.close()
+    assert dump(db_file) == before
+
+
+def test_newer_schema_left_alone(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    assert run_migrations(conn) == SCHEMA_VERSION + 1
+    conn.close()
+
+
+@pytest.mark.parametrize("description, sql, params, index", HOT_QUERIES,
+                         ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_index(db_file, description, sql, params, index):
+    with database.get_db_connection() as conn:
+        plan = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    assert index in plan
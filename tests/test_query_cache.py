@@ -0,0 +1,133 @@
+"""Кэш запросов менеджеров: инвалидация по таблицам, TTL, LRU и записи других клиентов"""
+
+import sqlite3
+import types
+
+import pytest
+
+from src import query_cache as query_cache_module
+from src.database import CabinetManager, UserManager
+from src.query_cache import QueryCache, query_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Управляемые часы вместо time.monotonic внутри кэша"""
+    now = [1000.0]
+    monkeypatch.setattr(query_cache_module, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def put(cache, key, value, *tables):
+    cache.put(key, value, tables, cache.generation)
+
+
+def test_invalidation_drops_only_dependent_tables():
+    cache = QueryCache()
+    put(cache, "printers", [1], "printers", "cabinets")
+    put(cache, "users", [2], "users")
+    cache.invalidate("cabinets")
+    assert cache.get("printers") == (False, None)
+    assert cache.get("users") == (True, [2])
+
+
+def test_results_are_copies():
+    cache = QueryCache()
+    put(cache, "rows", [{"id": 1}], "users")
+    _, rows = cache.get("rows")
+    rows[0]["id"] = 99
+    assert cache.get("rows") == (True, [{"id": 1}])
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryCache(ttl=30)
+    put(cache, "users", [1], "users")
+    clock[0] += 29
+    assert cache.get("users") == (True, [1])
+    clock[0] += 2
+    assert cache.get("users") == (False, None)
+    assert cache.stats["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    put(cache, "a", 1, "t")
+    put(cache, "b", 2, "t")
+    cache.get("a")  # «a» использовался последним, вытесняется «b»
+    put(cache, "c", 3, "t")
+    assert cache.get("a") == (True, 1)
+    assert cache.get("b") == (False, None)
+    assert cache.get("c") == (True, 3)
+
+
+def test_put_skips_result_computed_before_invalidation():
+    cache = QueryCache()
+    generation = cache.generation
+    cache.invalidate("users")  # запись завершилась, пока шёл запрос
+    cache.put("users", ["stale"], ("users",), generation)
+    assert cache.get("users") == (False, None)
+
+
+@pytest.fixture
+def other_client(db_file):
+    """Соединение другого рабочего места с той же office.db"""
+    conn = sqlite3.connect(db_file)
+    yield conn
+    conn.close()
+
+
+def cabinet_names():
+    return [row["name"] for row in CabinetManager.get_all_cabinets()]
+
+
+def external_changes():
+    return query_cache.stats["external_changes"]
+
+
+def test_external_write_is_noticed(db_file, other_client, monkeypatch):
+    monkeypatch.setattr(query_cache, "version_check_interval", 0)
+    before = cabinet_names()
+    seen = external_changes()
+    for n in range(6):
+        other_client.execute("INSERT INTO cabinets (name) VALUES (?)", (f"Внешний {n}",))
+        other_client.commit()
+    assert cabinet_names() == sorted(before + [f"Внешний {n}" for n in range(6)])
+    assert external_changes() == seen + 1
+
+
+def test_own_write_keeps_other_tables_cached(db_file, monkeypatch):
+    monkeypatch.setattr(query_cache, "version_check_interval", 3600)
+    cabinet_names()
+    seen = external_changes()
+    assert UserManager.add_user("operator", "secret", "operator")
+    hits = query_cache.stats["hits"]
+    cabinet_names()
+    assert query_cache.stats["hits"] == hits + 1
+    assert external_changes() == seen
+
+
+def test_write_committed_right_after_ours_is_noticed(db_file, other_client, monkeypatch):
+    # Проверка по интервалу отключена: заметить чужую запись может только after_write
+    monkeypatch.setattr(query_cache, "version_check_interval", 3600)
+    cabinet_names()
+    seen = external_changes()
+    after_write = query_cache.after_write
+
+    def commit_in_between(*args):
+        other_client.execute("INSERT INTO cabinets (name) VALUES ('Чужой')")
+        other_client.commit()
+        return after_write(*args)
+
+    monkeypatch.setattr(query_cache, "after_write", commit_in_between)
+    assert UserManager.add_user("operator", "secret", "operator")
+    assert "Чужой" in cabinet_names()
+    assert external_changes() == seen + 1
+
+
+def test_write_committed_before_ours_is_noticed(db_file, other_client, monkeypatch):
+    monkeypatch.setattr(query_cache, "version_check_interval", 3600)
+    cabinet_names()
+    other_client.execute("INSERT INTO cabinets (name) VALUES ('Чужой')")
+    other_client.commit()
+    assert UserManager.add_user("operator", "secret", "operator")
+    assert "Чужой" in cabinet_names()
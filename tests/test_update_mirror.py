@@ -0,0 +1,137 @@
+"""Зеркало обновлений (UPDATE_MIRROR): общая папка, HTTP-зеркало и откат на GitHub"""
+
+import os
+import random
+
+import pytest
+
+import autoupdate
+from benchmarks.bench_delta_update import publish
+from benchmarks.release_server import ReleaseServer
+
+SIZE_MB = 2
+
+
+@pytest.fixture
+def payloads():
+    rnd = random.Random(3)
+    old = {
+        "BotPrinters.exe": rnd.randbytes(SIZE_MB * 1024 * 1024),
+        "analytics.py": b"# analytics v1\n" * 500,
+        "lib/helper.dll": rnd.randbytes(512 * 1024),
+    }
+    new = dict(old, **{"analytics.py": b"# analytics v2\n" * 500})
+    return old, new
+
+
+@pytest.fixture
+def published(tmp_path, release_server, payloads):
+    """(старый архив, новый архив, релиз) на локальном сервере"""
+    old, new = payloads
+    old_archive, _ = publish(release_server, str(tmp_path), "v2.0.0", old)
+    new_archive, release = publish(release_server, str(tmp_path), "v2.1.0", new)
+    return old_archive, new_archive, release
+
+
+@pytest.fixture
+def share(tmp_path, app_dir, monkeypatch):
+    """Общая папка-зеркало; UPDATE_MIRROR указывает на неё"""
+    path = os.path.join(str(tmp_path), "share")
+    os.makedirs(path)
+    monkeypatch.setattr(autoupdate, "UPDATE_MIRROR", path)
+    return path
+
+
+@pytest.fixture
+def client(tmp_path, app_dir, monkeypatch, payloads):
+    """Обновление рабочего места n со своим каталогом приложения и кэшем загрузок"""
+    _, new = payloads
+
+    def update(n, release, installed=None):
+        app = os.path.join(str(tmp_path), f"client{n}")
+        os.makedirs(app)
+        if installed:
+            autoupdate.install_archive(installed, app)
+        monkeypatch.setattr(autoupdate, "UPDATE_CACHE_DIR", os.path.join(str(tmp_path), f"cache{n}"))
+        if not autoupdate.download_and_replace(release, target_dir=app):
+            return False
+        for name, data in new.items():
+            with open(os.path.join(app, name), "rb") as f:
+                if f.read() != data:
+                    return False
+        return True
+
+    return update
+
+
+def manifest_size(server):
+    return len(server.files[autoupdate.MANIFEST_NAME])
+
+
+def test_first_client_fills_share(release_server, published, share, client):
+    _, new_archive, release = published
+    size = os.path.getsize(new_archive)
+    for n in range(3):
+        release_server.reset_counters()
+        assert client(n, release)
+        # Архив с GitHub скачивает только первый клиент, остальные берут манифест
+        assert release_server.sent == (size + manifest_size(release_server) if n == 0
+                                       else manifest_size(release_server))
+    mirrored = os.path.join(share, "v2.1.0", os.path.basename(new_archive))
+    assert autoupdate.sha256_file(mirrored) == autoupdate.sha256_file(new_archive)
+    assert not [f for f in os.listdir(os.path.dirname(mirrored)) if f.endswith(".part")]
+
+
+def test_corrupted_mirror_file_is_replaced(release_server, published, share, client):
+    _, new_archive, release = published
+    size = os.path.getsize(new_archive)
+    assert client(0, release)
+    mirrored = os.path.join(share, "v2.1.0", os.path.basename(new_archive))
+    with open(mirrored, "r+b") as f:
+        f.seek(size // 2)
+        f.write(b"\0" * 4096)
+    release_server.reset_counters()
+    assert client(1, release)
+    assert release_server.sent == size + manifest_size(release_server)
+    assert autoupdate.sha256_file(mirrored) == autoupdate.sha256_file(new_archive)
+
+
+def test_unreachable_share_falls_back_to_github(tmp_path, release_server, published, client, monkeypatch):
+    _, new_archive, release = published
+    # Папку зеркала нельзя создать: на её пути лежит файл
+    blocker = os.path.join(str(tmp_path), "not-a-dir")
+    with open(blocker, "w") as f:
+        f.write("файл вместо папки")
+    monkeypatch.setattr(autoupdate, "UPDATE_MIRROR", os.path.join(blocker, "share"))
+    release_server.reset_counters()
+    assert client(0, release)
+    assert release_server.sent == os.path.getsize(new_archive) + manifest_size(release_server)
+
+
+def test_delta_update_reads_members_from_share(release_server, published, share, client):
+    old_archive, _, release = published
+    assert client(0, release)
+    release_server.reset_counters()
+    assert client(1, release, installed=old_archive)
+    assert release_server.sent == manifest_size(release_server)
+
+
+def test_http_mirror_serves_archive(release_server, published, client, monkeypatch):
+    _, new_archive, release = published
+    size = os.path.getsize(new_archive)
+    archive_name = os.path.basename(new_archive)
+    with ReleaseServer() as http_mirror:
+        monkeypatch.setattr(autoupdate, "UPDATE_MIRROR", http_mirror.url("").rstrip("/"))
+        http_mirror.files[archive_name] = release_server.files[archive_name]
+        release_server.reset_counters()
+        assert client(0, release)
+        assert release_server.sent == manifest_size(release_server)
+        assert http_mirror.sent == size
+
+        # HTTP-зеркало только читается: нет файла — загрузка с GitHub
+        del http_mirror.files[archive_name]
+        release_server.reset_counters()
+        assert client(1, release)
+        assert release_server.sent == size + manifest_size(release_server)
+        assert archive_name not in http_mirror.files
+